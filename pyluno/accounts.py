@@ -1,8 +1,11 @@
 """Accounts Module."""
 import json
+from time import time
 
 import pandas as pd
 
+from .reference import lookup
+
 
 class Account(object):
     """Class with the account methods."""
@@ -28,9 +31,40 @@ class Account(object):
         }
         return self.main.api_request('accounts', data=data, http_call='post')
 
-    def get_balance(self):
-        """Get balances of all accounts."""
-        return self.main.api_request('balance', None)
+    def get_balance(self, max_age=None):
+        """Get balances of all accounts.
+
+        :param max_age: if given, serve the balances from the client's
+            balance cache when they are at most this many seconds old.
+            Orders, transfers and withdrawals placed through this client
+            are accounted for locally.
+        :return: dict with a list of balances
+        """
+        if max_age is not None:
+            return self.main.balance_cache.get(max_age)
+        fetched_at = time()
+        result = self.main.api_request('balance', None)
+        self.main.balance_cache.store(result, fetched_at)
+        return result
+
+    def get_available(self, account_id=None, asset=None, max_age=None):
+        """Get the available (unreserved) balance of an account.
+
+        :param account_id: the account id, or None to look up by asset
+        :param asset: asset code, e.g. 'XBT', used if account_id is None
+        :param max_age: freshness bound in seconds, defaults to the
+            balanceMaxAge option
+        :return: float
+        """
+        return self.main.balance_cache.available(account_id, asset, max_age)
+
+    def get_accounts(self):
+        """Get the id, asset and name of every account.
+
+        Served from the reference data cache when the client has one.
+        :return: list of dicts
+        """
+        return lookup(self.main, 'accounts')
 
     def get_transactions(self, account_id, min_row=None, max_row=None):
         """Get list of transactions for an account."""
@@ -42,6 +76,22 @@ class Account(object):
         return self.main.api_request(
             'accounts/%s/transactions' % (account_id,), params)
 
+    def iter_transactions(self, account_id, min_row=None, max_row=None,
+                          chunk_size=None):
+        """Stream the transactions of an account as they download.
+
+        :param chunk_size: if given, yield lists of up to this many rows
+        :return: generator of transaction dicts
+        """
+        params = {}
+        if min_row is not None:
+            params['min_row'] = min_row
+        if max_row is not None:
+            params['max_row'] = max_row
+        return self.main.api_request(
+            'accounts/%s/transactions' % (account_id,), params,
+            stream='transactions', chunk_size=chunk_size)
+
     def get_transactions_frame(self, account_id, min_row=None, max_row=None):
         """Get dataframe of transactions for an account."""
         tx = self.get_transactions(
@@ -56,21 +106,30 @@ class Account(object):
         return self.main.api_request(
             'accounts/%s/pending' % (account_id,), None)
 
-    def get_orders(self, state=None, pair=None):
+    def get_orders(self, state=None, pair=None, created_before=None,
+                   limit=None):
         """Get a list of most recently placed orders.
 
         You can specify an optional state='PENDING' parameter to
         restrict the results to only open orders. You can also specify the
             market by using the optional pair parameter.
-        The list is truncated after 100 items.
+        The list is truncated after 100 items; use created_before to page
+        to older orders.
         :param kind: typically 'auth' if you want this to return anything
             useful
         :param state: String optional 'COMPLETE', 'PENDING', or None (default)
+        :param created_before: only orders created before this timestamp
+            in ms
+        :param limit: maximum number of orders returned
         :return:
         """
         params = {'pair': self.main.pair if pair is None else pair}
         if state is not None:
             params['state'] = state
+        if created_before is not None:
+            params['created_before'] = created_before
+        if limit is not None:
+            params['limit'] = limit
         return self.main.api_request('listorders', params)
 
     def get_orders_frame(self, state=None, kind='auth', pair=None):
@@ -83,8 +142,14 @@ class Account(object):
         return df
 
     def create_transfer(self, amount, currency, note,
-                        source_account_id, target_account_id):
-        """Transfer currency between accounts."""
+                        source_account_id, target_account_id,
+                        client_transfer_id=None):
+        """Transfer currency between accounts.
+
+        :param client_transfer_id: optional unique id; the exchange rejects
+            a second transfer with the same id, so a retry cannot transfer
+            twice
+        """
         data = {
             'amount': amount,
             'currency': currency,
@@ -92,13 +157,23 @@ class Account(object):
             'source_account_id': source_account_id,
             'target_account_id': target_account_id,
         }
+        if client_transfer_id is not None:
+            data['client_transfer_id'] = client_transfer_id
         return self.main.api_request('transfers', data=data,
                                      http_call='post')
 
-    def get_transfers(self, tid=None):
-        """Get list of transfers."""
+    def get_transfers(self, tid=None, limit=None, before=None):
+        """Get list of transfers, newest first, or a single transfer.
+
+        :param limit: optional number of transfers listed
+        :param before: optional cursor, list transfers created before this
+            timestamp in ms
+        """
+        params = None
+        if tid is None and (limit is not None or before is not None):
+            params = {'limit': limit, 'before': before}
         return self.main.api_request('transfers/{}'.format(tid or ''),
-                                     http_call='get')
+                                     params, http_call='get')
 
     def confirm_transfer(self, tid):
         """Confirm a pending transfer."""
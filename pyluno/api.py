@@ -2,17 +2,27 @@
 from __future__ import absolute_import
 
 import logging
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from time import time
 
 import requests
 
 from . import meta
 from .accounts import Account
+from .balances import BalanceCache
+from .deadlines import Deadline
+from .hedging import HedgePolicy
 from .market import Market
 from .orders import Orders
 from .quotes import Quotes
 from .receive import Receive
-from .utils import LunoAPIError, LunoAPIRateLimitError, RateLimiter
+from .recording import RecordingAdapter, ReplayAdapter
+from .reference import ReferenceCache
+from .streaming import StreamError, iter_json_items
+from .utils import (LunoAPIError, LunoAPIRateLimitError, RateLimiter,
+                    SharedRateLimiter, TokenBucket)
 from .withdrawal import withdrawal
 
 __version__ = meta.__version__
@@ -32,11 +42,19 @@ class Luno(object):
         else:
             self.hostname = 'api.mybitx.com'
         self.port = options['port'] if 'port' in options else 443
+        self.scheme = options['scheme'] if 'scheme' in options else 'https'
         self.pair = options['pair'] if 'pair' in options else 'XBTZAR'
         self.ca = options['ca'] if 'ca' in options else None
         self.timeout = options['timeout'] if 'timeout' in options else 30
         self.maxRate = options['maxRate'] if 'maxRate' in options else 0.1
         self.maxBurst = options['maxBurst'] if 'maxBurst' in options else 5
+        self.balanceMaxAge = options['balanceMaxAge'] \
+            if 'balanceMaxAge' in options else 1.0
+        self.streamReadSize = options['streamReadSize'] \
+            if 'streamReadSize' in options else 65536
+        self.rate_limiter = self._make_rate_limiter(
+            options.get('rateLimiter'), options.get('rateLimitPath'))
+        self.hedge_policy = self._make_hedge_policy(options.get('hedge'))
         self.headers = {
             'Accept': 'application/json',
             'Accept-Charset': 'utf-8',
@@ -46,7 +64,19 @@ class Luno(object):
         # across API requests
         self._requests_session = requests.Session()
         self._requests_session.headers.update(self.headers)
+        # Mounted on the configured scheme so plain http hosts are covered
+        prefix = '%s://' % (self.scheme,)
+        if 'replay' in options:
+            self._requests_session.mount(prefix, ReplayAdapter(
+                options['replay'], options.get('replaySpeed')))
+        elif 'record' in options:
+            self._requests_session.mount(
+                prefix, RecordingAdapter(options['record']))
         self._executor = ThreadPoolExecutor(max_workers=5)
+        # Requests under a deadline run here so the caller can give up on
+        # them when the deadline passes or is cancelled
+        self._deadline_executor = ThreadPoolExecutor(max_workers=10)
+        self._local = threading.local()
 
         self.account = Account(self)
         self.market = Market(self)
@@ -54,23 +84,109 @@ class Luno(object):
         self.quotes = Quotes(self)
         self.receive = Receive(self)
         self.withdrawal = withdrawal(self)
+        self.balance_cache = BalanceCache(self, self.balanceMaxAge)
+        self.reference = None
+        if options.get('referenceCache') is not None:
+            self.reference = ReferenceCache(
+                self, options['referenceCache'], options.get('referenceTTL'))
+            self.reference.start(options['referenceRefresh']
+                                 if 'referenceRefresh' in options else 60.0)
+
+    def _make_rate_limiter(self, kind, path):
+        """Build the rate limiter selected in the options.
+
+        None keeps the in-process limiter of the RateLimiter decorator.
+        'local' gives this instance a token bucket of its own. 'shared'
+        shares one token bucket between all processes on the host
+        that use the same API key (or the same rateLimitPath). An object
+        with an acquire() method is used as is.
+        """
+        if kind is None or self.maxRate is None or self.maxBurst is None:
+            return None
+        if kind == 'local':
+            return TokenBucket(self.maxRate, self.maxBurst)
+        if kind == 'shared':
+            if path is None:
+                path = SharedRateLimiter.default_path(self.auth[0] or '')
+            return SharedRateLimiter(path, self.maxRate, self.maxBurst)
+        if hasattr(kind, 'acquire'):
+            return kind
+        raise ValueError('Unknown rateLimiter option %r' % (kind,))
+
+    @staticmethod
+    def _make_hedge_policy(hedge):
+        """Build the hedging policy selected in the options.
+
+        None or False disables hedging, True uses the defaults, a dict is
+        passed to HedgePolicy as keyword arguments and a HedgePolicy is
+        used as is.
+        """
+        if not hedge:
+            return None
+        if hedge is True:
+            return HedgePolicy()
+        if isinstance(hedge, dict):
+            return HedgePolicy(**hedge)
+        return hedge
+
+    @contextmanager
+    def deadline(self, timeout=None, at=None):
+        """Bound the total time of every call made in the block.
+
+        The budget covers waiting on the rate limiter, connecting and
+        reading. Calls that cannot finish in time are rejected before they
+        are sent. Calling cancel() on the yielded Deadline from another
+        thread aborts the call in progress; a write that was already sent
+        may still be carried out by the exchange.
+
+            with api.deadline(2.0) as d:
+                api.market.get_ticker()
+
+        :param timeout: seconds from now
+        :param at: absolute epoch time in seconds, instead of timeout
+        :return: context manager yielding the Deadline
+        """
+        previous = getattr(self._local, 'deadline', None)
+        self._local.deadline = Deadline(timeout, at)
+        try:
+            yield self._local.deadline
+        finally:
+            self._local.deadline = previous
+
+    def current_deadline(self, deadline=None):
+        """Get the deadline for a call: the given one or the active block's.
+
+        :param deadline: a Deadline, a timeout in seconds, or None
+        """
+        if deadline is not None:
+            return Deadline.coerce(deadline)
+        return getattr(self._local, 'deadline', None)
 
     def close(self):
         """Close connection."""
+        if self.reference is not None:
+            self.reference.stop()
         log.info('Asking MultiThreadPool to shutdown')
         self._executor.shutdown(wait=True)
         log.info('MultiThreadPool has shutdown')
+        self._deadline_executor.shutdown(wait=False)
+        self._requests_session.close()
+        if isinstance(self.rate_limiter, SharedRateLimiter):
+            self.rate_limiter.close()
+        if self.hedge_policy is not None:
+            self.hedge_policy.shutdown()
 
     def construct_url(self, call):
         """Construc API Url."""
         base = self.hostname
         if self.port != 443:
             base += ':%d' % (self.port,)
-        return "https://%s/api/1/%s" % (base, call)
+        return "%s://%s/api/1/%s" % (self.scheme, base, call)
 
     @RateLimiter
     def api_request(self, call, params=None, data=None,
-                    kind='auth', http_call='get'):
+                    kind='auth', http_call='get', stream=None,
+                    chunk_size=None, hedge=True, deadline=None, raw=False):
         """General API request.
 
         Generally, use the convenience functions below
@@ -78,26 +194,90 @@ class Luno(object):
             authenticated call; 'basic' is unauthenticated
         :param call: the API call to make
         :param params: a dict of query parameters
+        :param stream: optional name, or tuple of names, of the list
+            members of the response to stream. The body is then parsed
+            as it downloads and a generator of items is returned, see
+            streaming.iter_json_items
+        :param chunk_size: when streaming, yield lists of this many items
+        :param hedge: allow the hedge option to duplicate a slow request
+        :param deadline: a Deadline or timeout in seconds bounding the
+            whole call, defaults to the one of an active deadline() block
+        :param raw: return the body of a successful response as bytes,
+            without parsing it
         :return: a json response, a LunoAPIError is thrown if
             the api returns with an error
         """
+        policy = self.hedge_policy
+        if hedge and stream is None and policy is not None and \
+                policy.applies(call, http_call):
+            return policy.run(
+                lambda: self._send(call, params, data, kind, http_call,
+                                   deadline=deadline, raw=raw),
+                lambda: self.api_request(call, params, data, kind,
+                                         http_call, hedge=False,
+                                         deadline=deadline, raw=raw),
+                policy.delay(call))
+        return self._send(call, params, data, kind, http_call, stream,
+                          chunk_size, deadline, raw)
+
+    def _send(self, call, params=None, data=None, kind='auth',
+              http_call='get', stream=None, chunk_size=None, deadline=None,
+              raw=False):
+        """Make a request and check its response, see api_request."""
         url = self.construct_url(call)
         auth = self.auth if kind == 'auth' else None
-        response = self._requests_session.request(
-            http_call.upper(),
-            url, params=params, data=data, auth=auth, timeout=self.timeout)
+        timeout = self.timeout
+        start = time()
+        if deadline is None:
+            response = self._requests_session.request(
+                http_call.upper(),
+                url, params=params, data=data, auth=auth, timeout=timeout,
+                stream=stream is not None)
+        else:
+            deadline.check(call)
+            remaining = deadline.remaining()
+            if remaining is not None:
+                timeout = min(timeout, remaining)
+            response = deadline.wait(self._deadline_executor.submit(
+                self._requests_session.request, http_call.upper(),
+                url, params=params, data=data, auth=auth, timeout=timeout,
+                stream=stream is not None), call)
+        if stream is not None and response.status_code == 200:
+            return self._stream_items(response, stream, chunk_size)
+        if raw and response.status_code == 200:
+            return response.content
         try:
             result = response.json()
         except ValueError:
             result = {'error': 'No JSON content returned'}
+        if self.hedge_policy is not None and \
+                self.hedge_policy.applies(call, http_call):
+            self.hedge_policy.record(call, time() - start)
         if response.status_code in [429, 503]:
             log.error('Rate Limit Exceeded')
             raise LunoAPIRateLimitError(response)
         elif response.status_code != 200 or 'error' in result:
             raise LunoAPIError(response)
         else:
+            if http_call.lower() != 'get':
+                self.balance_cache.on_write(call, params, data, result,
+                                            http_call)
+                if self.reference is not None:
+                    self.reference.on_write(call)
             return result
 
+    def _stream_items(self, response, keys, chunk_size):
+        """Yield list items from a streamed response, then close it."""
+        try:
+            for item in iter_json_items(
+                    response.iter_content(self.streamReadSize), keys,
+                    chunk_size):
+                yield item
+        except StreamError as e:
+            raise LunoAPIError(response, str(e))
+        finally:
+            response.close()
+
     def send_bitcoin(self, amount, currency, address,
                      description=None, message=None):
         """Send currency to account."""
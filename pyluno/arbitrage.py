@@ -0,0 +1,253 @@
+"""Arbitrage module.
+
+Turns the tickers response into dense matrices indexed by currency and
+searches them for profitable cycles and the best conversion paths.
+
+Rates are converted to weights -log(rate), so chaining conversions adds
+weights and a profitable cycle is a negative cycle. Only the top of book
+is used: an opportunity says nothing about the volume available.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# Currency codes tried when splitting a pair name, longest first
+CURRENCIES = ('USDC', 'USDT', 'XBT', 'ETH', 'LTC', 'XRP', 'BCH', 'ZAR',
+              'NGN', 'MYR', 'IDR', 'UGX', 'EUR', 'GBP', 'USD', 'AUD')
+
+_EPS = 1e-12
+
+
+def split_pair(pair, currencies=CURRENCIES):
+    """Split a pair name such as XBTZAR or USDCZAR into (base, counter)."""
+    codes = sorted(currencies, key=len, reverse=True)
+    for code in codes:
+        if pair.endswith(code) and len(pair) > len(code) + 1:
+            return pair[:-len(code)], code
+    for code in codes:
+        if pair.startswith(code) and len(pair) > len(code) + 1:
+            return code, pair[len(code):]
+    return pair[:3], pair[3:]
+
+
+def floyd_warshall(weights):
+    """All pairs shortest paths, vectorized over the two outer loops.
+
+    :param weights: n x n array, inf where there is no edge
+    :return: tuple (dist, next_hop); next_hop[i, j] is the node after i on
+        the best path to j, or -1 if j cannot be reached
+    """
+    n = len(weights)
+    dist = weights.copy()
+    np.fill_diagonal(dist, np.minimum(np.diag(dist), 0.0))
+    hop = np.where(np.isfinite(weights), np.arange(n)[None, :], -1)
+    np.fill_diagonal(hop, np.arange(n))
+    for k in range(n):
+        via = dist[:, k, None] + dist[None, k, :]
+        better = via < dist - _EPS
+        dist = np.where(better, via, dist)
+        hop = np.where(better, hop[:, k, None], hop)
+    return dist, hop
+
+
+class ArbitrageScanner(object):
+    """Conversion graph of all the pairs, refreshed from tickers."""
+
+    def __init__(self, fee=0.0, currencies=CURRENCIES):
+        """Initialise an empty graph.
+
+        :param fee: taker fee charged on every conversion, as a fraction
+        :param currencies: codes used to split pair names
+        """
+        self.fee = fee
+        self.currencies = currencies
+        self.names = []
+        self.index = {}
+        self.pairs = {}
+        self.quotes = {}
+        self.bid = np.zeros((0, 0))
+        self.ask = np.zeros((0, 0))
+        self.weights = np.zeros((0, 0))
+        self._dist = None
+        self._hop = None
+        self.full_updates = 0
+        self.incremental_updates = 0
+
+    def _rebuild(self):
+        """Reindex the currencies and rebuild every matrix."""
+        names = set()
+        for base, counter in self.pairs.values():
+            names.update((base, counter))
+        self.names = sorted(names)
+        self.index = dict((c, i) for i, c in enumerate(self.names))
+        n = len(self.names)
+        self.bid = np.full((n, n), np.nan)
+        self.ask = np.full((n, n), np.nan)
+        self.weights = np.full((n, n), np.inf)
+        for pair, (bid, ask) in self.quotes.items():
+            self._set(pair, bid, ask)
+        self._dist = None
+
+    def _set(self, pair, bid, ask):
+        """Write one pair's quotes into the matrices.
+
+        :return: list of (from, to, old weight, new weight) changes
+        """
+        base, counter = self.pairs[pair]
+        i, j = self.index[base], self.index[counter]
+        self.bid[i, j], self.ask[i, j] = bid, ask
+        keep = 1.0 - self.fee
+        # Selling base at the bid, buying base at the ask
+        sell = -np.log(bid * keep) if bid > 0 else np.inf
+        buy = np.log(ask / keep) if ask > 0 else np.inf
+        changes = [(i, j, self.weights[i, j], sell),
+                   (j, i, self.weights[j, i], buy)]
+        self.weights[i, j], self.weights[j, i] = sell, buy
+        return changes
+
+    def update(self, tickers):
+        """Apply a tickers response.
+
+        Pairs whose bid and ask did not change are skipped. When every
+        changed rate improved, the shortest paths are updated in place,
+        otherwise they are recomputed on the next query.
+
+        :param tickers: the response of Market.get_all_tickers, or its
+            list of tickers
+        :return: list of the pairs that changed
+        """
+        if isinstance(tickers, dict):
+            tickers = tickers.get('tickers') or []
+        changed = []
+        new_pairs = False
+        for t in tickers:
+            pair = t['pair']
+            quote = (float(t.get('bid') or 0), float(t.get('ask') or 0))
+            if self.quotes.get(pair) == quote:
+                continue
+            if pair not in self.pairs:
+                self.pairs[pair] = split_pair(pair, self.currencies)
+                new_pairs = True
+            self.quotes[pair] = quote
+            changed.append(pair)
+        if new_pairs:
+            self._rebuild()
+            return changed
+        edges = []
+        for pair in changed:
+            edges.extend(self._set(pair, *self.quotes[pair]))
+        if self._dist is not None:
+            if all(new <= old for _, _, old, new in edges):
+                for i, j, _, new in edges:
+                    self._relax(i, j, new)
+                self.incremental_updates += 1
+            else:
+                self._dist = None
+        return changed
+
+    def poll(self, market, kind='auth'):
+        """Fetch all tickers and apply them.
+
+        :param market: the Market instance, e.g. api.market
+        :return: list of the pairs that changed
+        """
+        return self.update(market.get_all_tickers(kind=kind))
+
+    def _relax(self, u, v, weight):
+        """Update the shortest paths for an edge u -> v that got cheaper."""
+        dist, hop = self._dist, self._hop
+        via = dist[:, u, None] + weight + dist[None, v, :]
+        better = via < dist - _EPS
+        if not better.any():
+            return
+        first = hop[:, u].copy()
+        first[u] = v
+        self._dist = np.where(better, via, dist)
+        self._hop = np.where(better, first[:, None], hop)
+
+    def _paths(self):
+        if self._dist is None:
+            self._dist, self._hop = floyd_warshall(self.weights)
+            self.full_updates += 1
+        return self._dist, self._hop
+
+    def rates(self):
+        """Direct conversion rates as a dataframe, from rows to columns."""
+        return pd.DataFrame(np.exp(-self.weights), index=self.names,
+                            columns=self.names)
+
+    def best_rates(self):
+        """Best conversion rates over any number of hops.
+
+        Rates involving a currency on a profitable cycle are unbounded in
+        theory; the values returned then depend on the search order.
+        """
+        dist, _ = self._paths()
+        return pd.DataFrame(np.exp(-dist), index=self.names,
+                            columns=self.names)
+
+    def best_path(self, source, target):
+        """Best way to convert source into target.
+
+        :return: tuple (rate, list of currencies from source to target),
+            (0.0, []) if target cannot be reached
+        """
+        dist, hop = self._paths()
+        i, j = self.index[source], self.index[target]
+        if hop[i, j] < 0:
+            return 0.0, []
+        path = [i]
+        while path[-1] != j and len(path) <= len(self.names):
+            path.append(hop[path[-1], j])
+        rate = np.exp(-sum(self.weights[a, b]
+                           for a, b in zip(path, path[1:])))
+        return float(rate), [self.names[k] for k in path]
+
+    def triangles(self, min_profit=0.0):
+        """Profitable three-currency cycles.
+
+        :return: dataframe of the cycles a -> b -> c -> a with their
+            profit as a fraction, best first. Each cycle appears once
+        """
+        w = self.weights
+        total = w[:, :, None] + w[None, :, :] + w.T[:, None, :]
+        a, b, c = np.nonzero(total < -np.log1p(min_profit) - _EPS)
+        # Keep one rotation of each cycle and drop degenerate ones
+        keep = (a < b) & (a < c) & (b != c)
+        a, b, c = a[keep], b[keep], c[keep]
+        names = np.array(self.names, dtype=object)
+        df = pd.DataFrame({'a': names[a], 'b': names[b], 'c': names[c],
+                           'profit': np.expm1(-total[a, b, c])})
+        return df.sort_values('profit', ascending=False) \
+            .reset_index(drop=True)
+
+    def negative_cycles(self):
+        """Profitable cycles of any length.
+
+        :return: list of (profit, list of currencies starting and ending
+            with the same one), best first
+        """
+        dist, hop = self._paths()
+        cycles = {}
+        for i in np.nonzero(np.diag(dist) < -_EPS)[0]:
+            # Follow the best path from i back to itself until it repeats
+            seen = {}
+            node = i
+            while node not in seen and node >= 0:
+                seen[node] = len(seen)
+                node = hop[node, i]
+            if node < 0:
+                continue
+            order = sorted(seen, key=seen.get)
+            cycle = order[seen[node]:]
+            start = cycle.index(min(cycle))
+            cycle = tuple(cycle[start:] + cycle[:start])
+            total = sum(self.weights[a, b]
+                        for a, b in zip(cycle, cycle[1:] + cycle[:1]))
+            if total < -_EPS:
+                cycles[cycle] = float(np.expm1(-total))
+        return sorted(((p, [self.names[k] for k in c + c[:1]])
+                       for c, p in cycles.items()), reverse=True)
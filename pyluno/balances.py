@@ -0,0 +1,140 @@
+"""Balance cache module.
+
+Keeps the last balance response around for a bounded time and keeps it
+honest by reacting to the writes this client makes itself.
+"""
+import copy
+import logging
+import threading
+from time import time
+
+log = logging.getLogger(__name__)
+
+# Calls after which the cached balances can no longer be trusted
+INVALIDATING_CALLS = ('marketorder', 'stoporder', 'transfers', 'send',
+                      'withdrawals')
+
+
+class BalanceCache(object):
+    """Cache of Account.get_balance with a freshness bound."""
+
+    def __init__(self, main, max_age=1.0):
+        """Initialise with super's main and the default freshness in s."""
+        self.main = main
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._response = None
+        self._fetched_at = None
+        self._invalidated_at = None
+        self._reservations = []
+
+    def store(self, response, fetched_at=None):
+        """Store a balance response fetched at the given time.
+
+        Local reservations made before the fetch started are dropped, the
+        exchange's reserved figures already include them. Responses
+        fetched before the cache was last invalidated are ignored.
+        """
+        fetched_at = time() if fetched_at is None else fetched_at
+        with self._lock:
+            if self._fetched_at is not None and \
+                    fetched_at < self._fetched_at:
+                return
+            if self._invalidated_at is not None and \
+                    fetched_at <= self._invalidated_at:
+                return
+            self._response = response
+            self._fetched_at = fetched_at
+            self._reservations = [r for r in self._reservations
+                                  if r[0] >= fetched_at]
+
+    def invalidate(self):
+        """Forget the cached balances and any fetch still in flight."""
+        with self._lock:
+            self._response = None
+            self._fetched_at = None
+            self._invalidated_at = time()
+            self._reservations = []
+
+    def reserve(self, account_id, amount):
+        """Locally reserve an amount on an account, e.g. for a new order."""
+        with self._lock:
+            self._reservations.append((time(), str(account_id),
+                                       float(amount)))
+
+    def age(self):
+        """Seconds since the cached balances were fetched, or None."""
+        with self._lock:
+            fetched_at = self._fetched_at
+        if fetched_at is None:
+            return None
+        return time() - fetched_at
+
+    def get(self, max_age=None):
+        """Get balances, fetching them if the cache is older than max_age.
+
+        :param max_age: freshness bound in seconds, defaults to the
+            cache's max_age
+        :return: dict as returned by Account.get_balance with local
+            reservations added to the reserved amounts
+        """
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            response, fetched_at = self._response, self._fetched_at
+            if response is not None and time() - fetched_at <= max_age:
+                response = copy.deepcopy(response)
+            else:
+                response = None
+        if response is None:
+            fetched_at = time()
+            response = self.main.api_request('balance', None)
+            self.store(response, fetched_at)
+            response = copy.deepcopy(response)
+        with self._lock:
+            reserved = {}
+            for made_at, account_id, amount in self._reservations:
+                if made_at >= fetched_at:
+                    reserved[account_id] = reserved.get(account_id, 0) + \
+                        amount
+        for b in response.get('balance', []):
+            extra = reserved.get(str(b['account_id']))
+            if extra:
+                b['reserved'] = str(float(b['reserved']) + extra)
+        return response
+
+    def available(self, account_id=None, asset=None, max_age=None):
+        """Get the available amount (balance less reserved) of an account.
+
+        :param account_id: the account id, or None to match on asset
+        :param asset: the asset, used if account_id is None
+        :return: float available amount
+        """
+        for b in self.get(max_age).get('balance', []):
+            if (account_id is not None and
+                    str(b['account_id']) == str(account_id)) or \
+                    (account_id is None and b['asset'] == asset):
+                return float(b['balance']) - float(b['reserved'])
+        raise KeyError(account_id if account_id is not None else asset)
+
+    def on_write(self, call, params=None, data=None, result=None,
+                 http_call='post'):
+        """Update the cache after a successful write made by this client."""
+        endpoint = call.split('/')[0]
+        if endpoint == 'postorder' and data is not None:
+            try:
+                volume = float(data['volume'])
+                if data['type'] == 'BID':
+                    self.reserve(data['counter_account_id'],
+                                 volume * float(data['price']))
+                else:
+                    self.reserve(data['base_account_id'], volume)
+            except (KeyError, TypeError, ValueError):
+                self.invalidate()
+        elif endpoint == 'quotes':
+            # Only executing a quote (PUT) moves funds
+            if http_call.lower() == 'put':
+                log.debug('Invalidating balance cache after %s', call)
+                self.invalidate()
+        elif endpoint in INVALIDATING_CALLS:
+            log.debug('Invalidating balance cache after %s', call)
+            self.invalidate()
@@ -0,0 +1,289 @@
+"""Batch module.
+
+Runs a list of transfers and withdrawals as concurrent pipelines: a
+transfer is created, confirmed and then checked until it settles, a
+withdrawal is created and checked. Every call goes through the client, so
+the pipelines share its rate budget.
+
+Each item carries an idempotency key, sent as client_transfer_id or
+external_id. When a create call fails without a clear answer (a timeout,
+a dropped connection or a 5xx), the executor first looks for an item
+already created with that key before trying again. The exchange rejects a
+second create with the same key, and the executor then carries on with
+the item created before, so running a batch twice, or retrying part of
+it, never moves funds twice.
+"""
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
+
+import pandas as pd
+import requests
+
+from .utils import LunoAPIError, LunoAPIRateLimitError
+
+log = logging.getLogger(__name__)
+
+# States after which an item no longer changes
+FINAL_STATES = ('COMPLETE', 'COMPLETED', 'CONFIRMED', 'CANCELLED',
+                'FAILED', 'REJECTED')
+
+
+def idempotency_key(batch_id, index, item):
+    """Key of an item, stable across runs of the same batch."""
+    fields = json.dumps(dict((k, v) for k, v in item.items() if k != 'key'),
+                        sort_keys=True, default=str)
+    digest = hashlib.sha256(
+        ('%s/%d/%s' % (batch_id, index, fields)).encode('utf-8'))
+    return '%s-%d-%s' % (batch_id, index, digest.hexdigest()[:12])
+
+
+def _retryable(error):
+    """Whether a failed call is worth trying again."""
+    return isinstance(error, LunoAPIRateLimitError) or _ambiguous(error)
+
+
+def _ambiguous(error):
+    """Whether a failed call may still have been carried out."""
+    if isinstance(error, requests.exceptions.RequestException):
+        return True
+    return isinstance(error, LunoAPIError) and error.code >= 500
+
+
+def _duplicate(error):
+    """Whether a create was rejected for reusing an idempotency key."""
+    if not isinstance(error, LunoAPIError):
+        return False
+    return error.code == 409 or 'duplicate' in str(error.message).lower()
+
+
+def _state(response):
+    return response.get('state') or response.get('status')
+
+
+class BatchExecutor(object):
+    """Runs transfers and withdrawals concurrently with safe retries."""
+
+    def __init__(self, main, max_workers=8, retries=3, backoff=0.5,
+                 poll_interval=1.0, settle_timeout=60.0, page_size=100,
+                 max_pages=10, lookback=86400.0):
+        """Initialise with super's main.
+
+        :param max_workers: items in flight at once
+        :param retries: attempts after the first for a failed call
+        :param backoff: seconds before the first retry, doubling after
+        :param poll_interval: seconds between status checks
+        :param settle_timeout: seconds to wait for an item to reach a
+            final state before reporting it as still pending
+        :param page_size: items per page when looking items up by key
+        :param max_pages: pages read at most when looking an item up
+        :param lookback: seconds before a run started in which items of
+            the batch are looked for, to find the ones created by an
+            earlier run of it
+        """
+        self.main = main
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.settle_timeout = settle_timeout
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.lookback = lookback
+
+    def _call(self, fn, *args):
+        """Call fn, retrying errors that may be transient."""
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return fn(*args)
+            except (LunoAPIError, LunoAPIRateLimitError,
+                    requests.exceptions.RequestException) as e:
+                if attempt == self.retries or not _retryable(e):
+                    raise
+                log.warning('Retrying after %s', e)
+                sleep(delay)
+                delay *= 2
+
+    def _create(self, create, find, key):
+        """Create an item once, finding it by key after unclear failures.
+
+        :return: tuple (response, attempts)
+        """
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return create(), attempt + 1
+            except (LunoAPIError, LunoAPIRateLimitError,
+                    requests.exceptions.RequestException) as e:
+                if _duplicate(e):
+                    # Created by an earlier attempt or run
+                    return self._existing(find, key, e), attempt + 1
+                if attempt == self.retries or not _retryable(e):
+                    raise
+                log.warning('Create of %s failed: %s', key, e)
+                sleep(delay)
+                delay *= 2
+                if _ambiguous(e):
+                    existing = self._call(find, key)
+                    if existing is not None:
+                        return existing, attempt + 1
+
+    def _existing(self, find, key, error):
+        """Find an item the exchange says exists, waiting for it to list."""
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            existing = self._call(find, key)
+            if existing is not None:
+                return existing
+            if attempt < self.retries:
+                sleep(delay)
+                delay *= 2
+        raise error
+
+    def _find(self, fetch, field, key, cursor, since=None):
+        """Look an item up by key, paging through a listing newest first.
+
+        :param fetch: returns the items of the page at a cursor, the first
+            page for None
+        :param field: item field holding the key
+        :param cursor: returns the cursor of the page after some items
+        :param since: time in ms; paging stops after a page reaching
+            items created before it
+        :return: the item, or None if it is not listed in the pages read
+        """
+        seen = set()
+        position = None
+        for _ in range(self.max_pages):
+            items = fetch(position)
+            for item in items:
+                if item.get(field) == key:
+                    return item
+            ids = set(item.get('id') for item in items)
+            if len(items) < self.page_size or ids <= seen:
+                return None
+            created = [int(item['created_at']) for item in items
+                       if item.get('created_at') is not None]
+            if since is not None and created and min(created) < since:
+                return None
+            seen |= ids
+            position = cursor(items)
+        log.warning('%s not found in the last %d pages', key,
+                    self.max_pages)
+        return None
+
+    def _find_transfer(self, key, since=None):
+        account = self.main.account
+        # before is exclusive, so pages overlap by a ms to not skip
+        # transfers sharing the oldest timestamp of a page
+        return self._find(
+            lambda before: account.get_transfers(
+                limit=self.page_size, before=before).get('transfers') or [],
+            'client_transfer_id', key,
+            lambda items: min(int(t['created_at']) for t in items) + 1,
+            since)
+
+    def _find_withdrawal(self, key, since=None):
+        withdrawal = self.main.withdrawal
+        return self._find(
+            lambda before_id: withdrawal.list_withdrawal_requests(
+                limit=self.page_size, before_id=before_id)
+            .get('withdrawals') or [],
+            'external_id', key, lambda items: items[-1]['id'], since)
+
+    def _settle(self, status, item_id, state):
+        """Poll the status of an item until it reaches a final state."""
+        end = time() + self.settle_timeout
+        while state not in FINAL_STATES and time() < end:
+            sleep(self.poll_interval)
+            state = _state(self._call(status, item_id)) or state
+        return state
+
+    def _transfer(self, item, key, since):
+        account = self.main.account
+        created, attempts = self._create(
+            lambda: account.create_transfer(
+                item['amount'], item['currency'], item.get('note', ''),
+                item['source_account_id'], item['target_account_id'],
+                client_transfer_id=key),
+            lambda k: self._find_transfer(k, since), key)
+        item_id = created['id']
+        state = _state(created)
+        if state not in FINAL_STATES:
+            state = _state(self._call(account.confirm_transfer, item_id)) \
+                or state
+        return item_id, self._settle(account.get_transfers, item_id,
+                                     state), attempts
+
+    def _withdrawal(self, item, key, since):
+        withdrawal = self.main.withdrawal
+        created, attempts = self._create(
+            lambda: withdrawal.create_withdrawal_request(
+                item['wtype'], item['amount'], item.get('beneficiary_id'),
+                external_id=key),
+            lambda k: self._find_withdrawal(k, since), key)
+        item_id = created['id']
+        return item_id, self._settle(withdrawal.get_withdrawals_status,
+                                     item_id, _state(created)), attempts
+
+    def _run_item(self, batch_id, index, item, submitted):
+        key = item.get('key') or idempotency_key(batch_id, index, item)
+        result = {'index': index, 'type': item['type'], 'key': key,
+                  'id': None, 'state': None, 'status': 'failed',
+                  'error': None, 'attempts': 0, 'started': time()}
+        try:
+            if item['type'] == 'transfer':
+                run = self._transfer
+            elif item['type'] == 'withdrawal':
+                run = self._withdrawal
+            else:
+                raise ValueError('Unknown item type %r' % (item['type'],))
+            since = int((submitted - self.lookback) * 1000)
+            item_id, state, attempts = run(item, key, since)
+            result.update(id=item_id, state=state, attempts=attempts,
+                          status='done' if state in FINAL_STATES
+                          else 'pending')
+        except (LunoAPIError, LunoAPIRateLimitError, ValueError, KeyError,
+                requests.exceptions.RequestException) as e:
+            log.error('Batch item %d (%s) failed: %s', index, key, e)
+            result['error'] = str(e)
+        result['finished'] = time()
+        result['elapsed'] = result['finished'] - submitted
+        return result
+
+    def run(self, items, batch_id=None):
+        """Run a batch.
+
+        :param items: list of dicts. Transfers have type 'transfer',
+            amount, currency, source_account_id, target_account_id and
+            optionally note; withdrawals have type 'withdrawal', wtype,
+            amount and optionally beneficiary_id. An item may set its own
+            idempotency key under 'key'
+        :param batch_id: names the batch in the generated keys. Reuse it
+            to resume a batch safely, items created by an earlier run are
+            carried on from where they are; defaults to a hash of the
+            items
+        :return: list of result dicts in item order, with the id, final
+            state, status ('done', 'pending' or 'failed'), error, number
+            of create attempts and elapsed seconds of each item
+        """
+        if batch_id is None:
+            batch_id = hashlib.sha256(json.dumps(
+                items, sort_keys=True, default=str).encode('utf-8')) \
+                .hexdigest()[:12]
+        submitted = time()
+        executor = ThreadPoolExecutor(self.max_workers)
+        try:
+            futures = [executor.submit(self._run_item, batch_id, i, item,
+                                       submitted)
+                       for i, item in enumerate(items)]
+            return [f.result() for f in futures]
+        finally:
+            executor.shutdown()
+
+    @staticmethod
+    def frame(results):
+        """Get batch results as a dataframe indexed by item."""
+        return pd.DataFrame(results).set_index('index')
@@ -0,0 +1,144 @@
+"""Order book diff module.
+
+Compares successive order book snapshots side by side without looping
+over levels: both sides are aggregated by price into sorted arrays, laid
+out on the union of their prices and compared element-wise.
+"""
+import logging
+
+import numpy as np
+
+from .impact import book_side_arrays
+
+log = logging.getLogger(__name__)
+
+ADDED, REMOVED, RESIZED = 1, 2, 3
+
+
+def aggregate(price, volume):
+    """Sum the volume of levels sharing a price.
+
+    :return: tuple of arrays (price ascending, volume)
+    """
+    prices, inverse = np.unique(price, return_inverse=True)
+    return prices, np.bincount(inverse, weights=volume,
+                               minlength=len(prices))
+
+
+def diff_side(old_price, old_volume, new_price, new_volume):
+    """Diff one side of two books.
+
+    :param old_price: ascending unique prices of the old book, see
+        aggregate; likewise for the other arrays
+    :return: dict of arrays over the levels that changed: price, old and
+        new volume, change (new - old) and kind (ADDED, REMOVED or
+        RESIZED)
+    """
+    prices = np.union1d(old_price, new_price)
+    old = np.zeros(len(prices))
+    new = np.zeros(len(prices))
+    old[np.searchsorted(prices, old_price)] = old_volume
+    new[np.searchsorted(prices, new_price)] = new_volume
+    changed = old != new
+    prices, old, new = prices[changed], old[changed], new[changed]
+    kind = np.full(len(prices), RESIZED, dtype=np.int8)
+    kind[old == 0] = ADDED
+    kind[new == 0] = REMOVED
+    return {'price': prices, 'old': old, 'new': new, 'change': new - old,
+            'kind': kind}
+
+
+def side_stats(diff, touches, near_bps=10.0):
+    """Summarise the changes of one side.
+
+    :param diff: result of diff_side
+    :param touches: best prices of the side before and after, None for an
+        empty side
+    :param near_bps: width of the band around the touch, in basis points
+    :return: dict of level counts and the volume added and removed, in
+        total and within near_bps of either touch
+    """
+    change = diff['change']
+    kind = diff['kind']
+    near = np.zeros(len(change), dtype=bool)
+    for touch in touches:
+        if touch:
+            near |= np.abs(diff['price'] - touch) <= touch * near_bps / 1e4
+    up, down = change > 0, change < 0
+    return {
+        'added': int((kind == ADDED).sum()),
+        'removed': int((kind == REMOVED).sum()),
+        'resized': int((kind == RESIZED).sum()),
+        'volume_added': float(change[up].sum()),
+        'volume_removed': float(-change[down].sum()),
+        'near_volume_added': float(change[up & near].sum()),
+        'near_volume_removed': float(-change[down & near].sum()),
+    }
+
+
+class BookDiffer(object):
+    """Diffs each order book snapshot against the previous one."""
+
+    def __init__(self, near_bps=10.0):
+        """Initialise without a previous book.
+
+        :param near_bps: width in basis points of the band around the
+            touch used for the near_* stats
+        """
+        self.near_bps = near_bps
+        self.sides = None
+        self.timestamp = None
+
+    @staticmethod
+    def arrays(book):
+        """Aggregate a book from Market.get_order_book into side arrays."""
+        return dict((side, aggregate(*book_side_arrays(book.get(side) or [])))
+                    for side in ('bids', 'asks'))
+
+    def update(self, book):
+        """Diff a snapshot against the previous one and keep it.
+
+        :param book: dict from Market.get_order_book
+        :return: dict with the timestamps, the changed levels of each side
+            as arrays of price and new volume (0 for a removed level), the
+            stats of each side from side_stats and the best bid and ask
+            before and after. None for the first snapshot
+        """
+        sides = self.arrays(book)
+        previous, self.sides = self.sides, sides
+        since, self.timestamp = self.timestamp, book.get('timestamp')
+        if previous is None:
+            return None
+        delta = {'since': since, 'timestamp': self.timestamp}
+        for side in ('bids', 'asks'):
+            diff = diff_side(*(previous[side] + sides[side]))
+            delta[side] = np.column_stack((diff['price'], diff['new']))
+            touches = (self._touch(side, previous), self._touch(side, sides))
+            delta[side + '_stats'] = side_stats(diff, touches, self.near_bps)
+            delta['best_' + side[:-1]] = touches
+        return delta
+
+    @staticmethod
+    def _touch(side, sides):
+        prices = sides[side][0]
+        if not len(prices):
+            return None
+        return float(prices[-1] if side == 'bids' else prices[0])
+
+    @staticmethod
+    def apply(sides, delta):
+        """Apply a delta from update to side arrays from arrays.
+
+        :return: the side arrays of the newer book
+        """
+        result = {}
+        for side in ('bids', 'asks'):
+            price, volume = sides[side]
+            changes = delta[side]
+            prices = np.union1d(price, changes[:, 0])
+            volumes = np.zeros(len(prices))
+            volumes[np.searchsorted(prices, price)] = volume
+            volumes[np.searchsorted(prices, changes[:, 0])] = changes[:, 1]
+            keep = volumes != 0
+            result[side] = (prices[keep], volumes[keep])
+        return result
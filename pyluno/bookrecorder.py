@@ -0,0 +1,381 @@
+"""Order book recorder module.
+
+Archives order book snapshots in a compact binary file per pair. The first
+snapshot, and every keyframe_every-th one after it, is stored in full;
+the others only store the levels that changed, a volume of 0 removing a
+level. Prices and volumes are stored as integers in units of 1e-8.
+
+A file is a magic header followed by frames:
+
+    kind (B), timestamp ms (q), bid levels (I), ask levels (I),
+    payload length (I), payload
+
+The payload is the zlib-compressed int64 prices, delta-encoded, followed
+by the int64 volumes, bids then asks. A sidecar index file holds the
+(timestamp, offset) of every keyframe so a reader can seek to the last
+keyframe before a time and replay only the deltas after it.
+"""
+import bisect
+import logging
+import os
+import struct
+import threading
+import zlib
+from time import time
+
+import numpy as np
+import requests
+
+from .utils import LunoAPIError, LunoAPIRateLimitError
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'PLOB1\n'
+KEYFRAME, DELTA = 0, 1
+SCALE = 10 ** 8
+_FRAME = struct.Struct('<BqIII')
+_INDEX = struct.Struct('<qQ')
+
+
+def to_units(levels):
+    """Aggregate API levels into a dict of price units to volume units."""
+    book = {}
+    for level in levels:
+        price = int(round(float(level['price']) * SCALE))
+        volume = int(round(float(level['volume']) * SCALE))
+        book[price] = book.get(price, 0) + volume
+    return book
+
+
+def _diff(old, new):
+    """Levels of new that differ from old, with 0 for removed levels."""
+    changes = dict((p, v) for p, v in new.items() if old.get(p) != v)
+    changes.update((p, 0) for p in old if p not in new)
+    return changes
+
+
+def _encode(bids, asks):
+    parts = []
+    for side in (bids, asks):
+        prices = np.array(sorted(side), dtype='<i8')
+        volumes = np.array([side[p] for p in prices.tolist()], dtype='<i8')
+        parts.append((prices, volumes))
+    prices = np.concatenate([p for p, _ in parts])
+    volumes = np.concatenate([v for _, v in parts])
+    if not len(prices):
+        return b''
+    deltas = np.diff(np.concatenate(([0], prices))).astype('<i8')
+    return zlib.compress(deltas.tobytes() + volumes.tobytes())
+
+
+def _decode(payload, nbids, nasks):
+    n = nbids + nasks
+    if not n:
+        return {}, {}
+    raw = np.frombuffer(zlib.decompress(payload), dtype='<i8')
+    prices = np.cumsum(raw[:n]).tolist()
+    volumes = raw[n:].tolist()
+    return (dict(zip(prices[:nbids], volumes[:nbids])),
+            dict(zip(prices[nbids:], volumes[nbids:])))
+
+
+def _recover(path):
+    """Cut a frame left incomplete by a crash off the end of a recording.
+
+    Scans the frame headers from the last indexed keyframe and truncates
+    the file, and its index, after the last complete frame.
+    """
+    size = os.path.getsize(path)
+    index_path = path + '.idx'
+    entries = []
+    if os.path.exists(index_path):
+        with open(index_path, 'rb') as f:
+            data = f.read()
+        entries = [_INDEX.unpack_from(data, i) for i in
+                   range(0, len(data) - _INDEX.size + 1, _INDEX.size)]
+    entries = [e for e in entries if e[1] < size]
+    offset = entries[-1][1] if entries else len(MAGIC)
+    with open(path, 'rb') as f:
+        while True:
+            f.seek(offset)
+            header = f.read(_FRAME.size)
+            if len(header) < _FRAME.size:
+                break
+            length = _FRAME.unpack(header)[4]
+            if offset + _FRAME.size + length > size:
+                break
+            offset += _FRAME.size + length
+    if offset < size:
+        log.warning('Dropping %d bytes of an incomplete frame from %s',
+                    size - offset, path)
+        with open(path, 'r+b') as f:
+            f.truncate(offset)
+    entries = [e for e in entries if e[1] < offset]
+    with open(index_path, 'wb') as f:
+        f.write(b''.join(_INDEX.pack(*e) for e in entries))
+
+
+class BookWriter(object):
+    """Appends snapshots of one pair's order book to a file."""
+
+    def __init__(self, path, keyframe_every=300):
+        """Open the file, appending to it if it exists.
+
+        :param path: book file; the index is written to path + '.idx'
+        :param keyframe_every: store every n-th snapshot in full
+        """
+        self.path = path
+        self.keyframe_every = keyframe_every
+        if os.path.exists(path) and os.path.getsize(path) > len(MAGIC):
+            _recover(path)
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._index = open(path + '.idx', 'ab')
+        self.bids = None
+        self.asks = None
+        self.count = 0
+        self.bytes = 0
+
+    def write(self, timestamp, bids, asks):
+        """Store a snapshot.
+
+        :param timestamp: snapshot time in ms
+        :param bids: list of levels as returned by Market.get_order_book
+        :param asks: list of levels as returned by Market.get_order_book
+        """
+        bids, asks = to_units(bids), to_units(asks)
+        # A new writer always starts with a keyframe, so a file appended
+        # to after a restart never depends on the book of a previous run
+        if self.bids is None or self.count % self.keyframe_every == 0:
+            kind, frame_bids, frame_asks = KEYFRAME, bids, asks
+        else:
+            kind = DELTA
+            frame_bids = _diff(self.bids, bids)
+            frame_asks = _diff(self.asks, asks)
+        payload = _encode(frame_bids, frame_asks)
+        offset = self._file.tell()
+        self._file.write(_FRAME.pack(kind, int(timestamp), len(frame_bids),
+                                     len(frame_asks), len(payload)))
+        self._file.write(payload)
+        self._file.flush()
+        if kind == KEYFRAME:
+            self._index.write(_INDEX.pack(int(timestamp), offset))
+            self._index.flush()
+        self.bids, self.asks = bids, asks
+        self.count += 1
+        self.bytes += _FRAME.size + len(payload)
+
+    def close(self):
+        """Close the files."""
+        self._file.close()
+        self._index.close()
+
+
+class BookReader(object):
+    """Reconstructs the order book of a recording at any time."""
+
+    def __init__(self, path):
+        """Open a file written by BookWriter and load its keyframe index."""
+        self.path = path
+        self._file = open(path, 'rb')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('%s is not an order book recording' % (path,))
+        self.keyframe_times, self.keyframe_offsets = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.path + '.idx', 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return self._scan_index()
+        size = len(data) // _INDEX.size * _INDEX.size
+        if not size:
+            return self._scan_index()
+        index = np.frombuffer(data[:size], dtype=[('t', '<i8'),
+                                                  ('o', '<u8')])
+        return index['t'].tolist(), index['o'].tolist()
+
+    def _scan_index(self):
+        """Build the keyframe index from the frame headers."""
+        times, offsets = [], []
+        for offset, kind, timestamp, _, _, _ in self._headers(len(MAGIC)):
+            if kind == KEYFRAME:
+                times.append(timestamp)
+                offsets.append(offset)
+        return times, offsets
+
+    def _headers(self, offset):
+        """Yield (offset, kind, timestamp, bids, asks, length) per frame."""
+        f = self._file
+        while True:
+            f.seek(offset)
+            header = f.read(_FRAME.size)
+            if len(header) < _FRAME.size:
+                return
+            kind, timestamp, nbids, nasks, length = _FRAME.unpack(header)
+            yield offset, kind, timestamp, nbids, nasks, length
+            offset += _FRAME.size + length
+
+    def _replay(self, offset, until=None):
+        """Yield (timestamp, bids, asks) books from a keyframe on.
+
+        The dicts yielded are updated in place by the following frames.
+
+        :param until: stop before the first frame after this time in ms
+        """
+        bids, asks = {}, {}
+        f = self._file
+        while True:
+            f.seek(offset)
+            header = f.read(_FRAME.size)
+            if len(header) < _FRAME.size:
+                return
+            kind, timestamp, nbids, nasks, length = _FRAME.unpack(header)
+            if until is not None and timestamp > until:
+                return
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            offset += _FRAME.size + length
+            frame_bids, frame_asks = _decode(payload, nbids, nasks)
+            if kind == KEYFRAME:
+                bids, asks = frame_bids, frame_asks
+            else:
+                for book, changes in ((bids, frame_bids),
+                                      (asks, frame_asks)):
+                    for price, volume in changes.items():
+                        if volume:
+                            book[price] = volume
+                        else:
+                            book.pop(price, None)
+            yield timestamp, bids, asks
+
+    @staticmethod
+    def _arrays(book, descending):
+        prices = np.array(sorted(book, reverse=descending), dtype=np.int64)
+        volumes = np.array([book[p] for p in prices.tolist()],
+                           dtype=np.int64)
+        return np.column_stack((prices / float(SCALE),
+                                volumes / float(SCALE)))
+
+    def book_at(self, timestamp):
+        """Get the last book recorded at or before a time.
+
+        :param timestamp: time in ms
+        :return: tuple (timestamp, bids, asks) with bids and asks as n x 2
+            arrays of price and volume, best first; None if the recording
+            starts after timestamp or holds no complete frame before it
+        """
+        i = bisect.bisect_right(self.keyframe_times, timestamp) - 1
+        if i < 0:
+            return None
+        found = None
+        for found in self._replay(self.keyframe_offsets[i], timestamp):
+            pass
+        if found is None:
+            return None
+        ts, bids, asks = found
+        return ts, self._arrays(bids, True), self._arrays(asks, False)
+
+    def books(self, start=None, end=None):
+        """Yield (timestamp, bids, asks) for every snapshot in a range.
+
+        :param start: first time in ms, from the start if None
+        :param end: time in ms excluded, to the end if None
+        """
+        if not self.keyframe_offsets:
+            return
+        i = 0
+        if start is not None:
+            i = max(bisect.bisect_right(self.keyframe_times, start) - 1, 0)
+        until = None if end is None else end - 1
+        for ts, bids, asks in self._replay(self.keyframe_offsets[i], until):
+            if start is None or ts >= start:
+                yield ts, self._arrays(bids, True), self._arrays(asks, False)
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+
+class BookRecorder(object):
+    """Polls the order books of several pairs and records them."""
+
+    def __init__(self, main, directory, pairs, keyframe_every=300,
+                 kind='auth'):
+        """Initialise with super's main.
+
+        :param directory: where the <pair>.books files are written
+        :param pairs: list of pairs to record
+        :param keyframe_every: store every n-th snapshot of a pair in full
+        :param kind: 'basic' to poll without authentication
+        """
+        self.main = main
+        self.directory = directory
+        self.pairs = list(pairs)
+        self.kind = kind
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.writers = dict(
+            (pair, BookWriter(os.path.join(directory, pair + '.books'),
+                              keyframe_every)) for pair in self.pairs)
+        self.stats = {'polls': 0, 'snapshots': 0, 'errors': 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _fetch(self, pair):
+        return self.main.market.get_order_book(kind=self.kind, pair=pair)
+
+    def poll(self):
+        """Fetch every pair's book concurrently and record it.
+
+        :return: number of snapshots recorded
+        """
+        futures = [(pair, self.main._executor.submit(self._fetch, pair))
+                   for pair in self.pairs]
+        recorded = 0
+        for pair, f in futures:
+            try:
+                book = f.result()
+            except (LunoAPIError, LunoAPIRateLimitError,
+                    requests.exceptions.RequestException) as e:
+                self.stats['errors'] += 1
+                log.warning('Order book of %s not recorded: %s', pair, e)
+                continue
+            timestamp = book.get('timestamp') or int(time() * 1000)
+            self.writers[pair].write(timestamp, book.get('bids') or [],
+                                     book.get('asks') or [])
+            recorded += 1
+        self.stats['polls'] += 1
+        self.stats['snapshots'] += recorded
+        return recorded
+
+    def run(self, interval=5.0, duration=None):
+        """Poll every interval seconds until stopped or duration passes."""
+        end = None if duration is None else time() + duration
+        while end is None or time() < end:
+            started = time()
+            try:
+                self.poll()
+            except Exception:
+                log.exception('Order book poll failed')
+            wait = max(interval - (time() - started), 0)
+            if self._stop.wait(wait):
+                return
+
+    def start(self, interval=5.0):
+        """Record in a background thread every interval seconds."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, args=(interval,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop recording and close the files."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for writer in self.writers.values():
+            writer.close()
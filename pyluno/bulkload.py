@@ -0,0 +1,217 @@
+"""Bulk load module.
+
+Loads long histories of transactions and trades into dataframes. Pages
+are downloaded by threads as raw bytes and decoded into typed numpy column
+buffers by a process pool, so JSON parsing runs on every core while the
+next pages download. The buffers of all pages are then concatenated once,
+column by column.
+"""
+import json
+import logging
+import re
+from collections import deque
+from concurrent.futures import (Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+
+import numpy as np
+import pandas as pd
+
+from .utils import next_trade_page, skip_trade_overlap
+
+log = logging.getLogger(__name__)
+
+TRANSACTION_INTS = ('row_index', 'timestamp')
+TRANSACTION_FLOATS = ('balance', 'available', 'balance_delta',
+                      'available_delta')
+TRANSACTION_STRINGS = ('currency', 'description')
+TRADE_INTS = ('timestamp',)
+TRADE_FLOATS = ('price', 'volume', 'base', 'counter', 'fee_base',
+                'fee_counter')
+TRADE_STRINGS = ('pair', 'order_id', 'type')
+
+_TIMESTAMP = re.compile(br'"timestamp"\s*:\s*(\d+)')
+
+
+def _columns(rows, ints, floats, strings, bools=()):
+    """Build typed column buffers from a list of dicts."""
+    columns = {}
+    for name in ints:
+        columns[name] = np.array([int(r[name]) for r in rows],
+                                 dtype=np.int64)
+    for name in floats:
+        columns[name] = np.array([float(r.get(name) or 0) for r in rows],
+                                 dtype=np.float64)
+    for name in strings:
+        columns[name] = np.array([r.get(name) for r in rows], dtype=object)
+    for name in bools:
+        columns[name] = np.array([bool(r.get(name)) for r in rows],
+                                 dtype=bool)
+    return columns
+
+
+def decode_transactions(content):
+    """Decode a transactions page into column buffers.
+
+    Runs in the worker processes, so it only takes and returns picklable
+    values.
+    """
+    rows = json.loads(content.decode('utf-8')).get('transactions') or []
+    return _columns(rows, TRANSACTION_INTS, TRANSACTION_FLOATS,
+                    TRANSACTION_STRINGS)
+
+
+def decode_trades(content, since=0, skip=0):
+    """Decode a listtrades page into column buffers.
+
+    :param since: timestamp the page was requested from
+    :param skip: number of trades at since already in the previous page
+    """
+    rows = json.loads(content.decode('utf-8')).get('trades') or []
+    rows = skip_trade_overlap(sorted(rows, key=lambda t: t['timestamp']),
+                              since, skip)
+    return _columns(rows, TRADE_INTS, TRADE_FLOATS, TRADE_STRINGS,
+                    ('is_buy',))
+
+
+def concat_columns(buffers, names):
+    """Concatenate the column buffers of all pages, one copy per column."""
+    return dict((name, np.concatenate([b[name] for b in buffers]))
+                for name in names)
+
+
+class _InlineExecutor(object):
+    """Executor running tasks in the calling thread."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def _decoder(processes):
+    """Executor decoding pages: a new process pool, or inline if 0."""
+    if processes == 0:
+        return _InlineExecutor()
+    return ProcessPoolExecutor(processes)
+
+
+def load_transactions(main, account_id, min_row=1, max_row=None,
+                      page_size=1000, threads=4, processes=None):
+    """Load the transactions of an account into a dataframe.
+
+    Row windows are downloaded concurrently, up to threads at a time,
+    until a window comes back short.
+
+    :param main: the Luno instance
+    :param max_row: last row to load, up to the newest if None
+    :param page_size: rows requested per call, at most 1000
+    :param threads: concurrent downloads
+    :param processes: decoding processes, the number of cores if None
+        and 0 to decode in this process
+    :return: dataframe like Account.get_transactions_frame, with typed
+        columns
+    """
+    call = 'accounts/%s/transactions' % (account_id,)
+    downloads = ThreadPoolExecutor(threads)
+    decoder = _decoder(processes)
+    try:
+        pending = deque()
+        decoded = []
+        next_row = min_row
+        end = False
+        while True:
+            while not end and len(pending) < threads and \
+                    (max_row is None or next_row <= max_row):
+                # The API's max_row is exclusive, unlike ours
+                stop = next_row + page_size
+                if max_row is not None:
+                    stop = min(stop, max_row + 1)
+                pending.append((stop - next_row, downloads.submit(
+                    main.api_request, call,
+                    {'min_row': next_row, 'max_row': stop}, raw=True)))
+                next_row = stop
+            if not pending:
+                break
+            size, page = pending.popleft()
+            content = page.result()
+            decoded.append(decoder.submit(decode_transactions, content))
+            if content.count(b'"row_index"') < size:
+                end = True
+                for _, later in pending:
+                    later.cancel()
+                pending.clear()
+        buffers = [f.result() for f in decoded]
+    finally:
+        downloads.shutdown()
+        decoder.shutdown()
+    names = TRANSACTION_INTS + TRANSACTION_FLOATS + TRANSACTION_STRINGS
+    if not buffers:
+        buffers = [decode_transactions(b'{}')]
+    columns = concat_columns(buffers, names)
+    df = pd.DataFrame(columns, columns=list(names), copy=False)
+    df.index = pd.to_datetime(df.timestamp, unit='ms')
+    df.drop('timestamp', axis=1, inplace=True)
+    log.info('Loaded %d transactions of account %s', len(df), account_id)
+    return df
+
+
+def _trade_pages(main, pair, since, page_size, decoder):
+    """Download the trades of a pair from since, submitting each page.
+
+    :return: list of futures of decoded pages
+    """
+    decoded = []
+    skip = 0
+    while True:
+        content = main.api_request(
+            'listtrades', {'pair': pair, 'since': since, 'limit': page_size},
+            raw=True)
+        decoded.append(decoder.submit(decode_trades, content, since, skip))
+        # The next cursor only needs the timestamps, which are found
+        # without parsing the page
+        stamps = sorted(int(t) for t in _TIMESTAMP.findall(content))
+        cursor = next_trade_page(stamps, since, page_size)
+        if cursor is None:
+            return decoded
+        since, skip = cursor
+
+
+def load_trades(main, pairs=None, since=0, page_size=1000, threads=4,
+                processes=None):
+    """Load the account's trades into a dataframe.
+
+    Each pair is paged by its own download thread, pages being chained by
+    timestamp. Pages overlap on the boundary timestamp and the trades
+    repeated from the previous page are skipped by count.
+
+    :param main: the Luno instance
+    :param pairs: list of pairs, the client's pair if None
+    :param since: first timestamp in ms to load
+    :param page_size: trades requested per call
+    :param threads: concurrent downloads
+    :param processes: decoding processes, the number of cores if None
+        and 0 to decode in this process
+    :return: dataframe like Orders.list_trades_frame, sorted by time
+    """
+    pairs = [main.pair] if pairs is None else list(pairs)
+    downloads = ThreadPoolExecutor(threads)
+    decoder = _decoder(processes)
+    try:
+        pagers = [downloads.submit(_trade_pages, main, pair, since,
+                                   page_size, decoder) for pair in pairs]
+        buffers = [f.result() for pager in pagers for f in pager.result()]
+    finally:
+        downloads.shutdown()
+        decoder.shutdown()
+    names = TRADE_INTS + TRADE_FLOATS + TRADE_STRINGS + ('is_buy',)
+    if not buffers:
+        buffers = [decode_trades(b'{}')]
+    columns = concat_columns(buffers, names)
+    df = pd.DataFrame(columns, columns=list(names), copy=False)
+    df.sort_values('timestamp', kind='stable', inplace=True)
+    df.index = pd.to_datetime(df.timestamp, unit='ms')
+    log.info('Loaded %d trades of %s', len(df), ', '.join(pairs))
+    return df
@@ -0,0 +1,198 @@
+"""Candles module.
+
+Builds OHLCV candles incrementally from trades, so that new trades only
+touch the candle they fall into instead of resampling the whole window.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume', 'value', 'vwap',
+          'count')
+
+
+class CandleSeries(object):
+    """Fixed size ring buffer of candles for one interval.
+
+    Every candle is written twice, at slot i and i + size, so the latest
+    n candles are always a contiguous slice of the backing arrays and can
+    be handed out as views without copying.
+    """
+
+    def __init__(self, interval, size=1000):
+        """Initialise with the interval in seconds and number of candles.
+
+        :param interval: candle length in seconds
+        :param size: number of candles kept
+        """
+        self.interval = int(interval * 1000)
+        self.size = size
+        self.start = np.zeros(2 * size, dtype=np.int64)
+        self.data = {}
+        for field in FIELDS:
+            dtype = np.int64 if field == 'count' else np.float64
+            self.data[field] = np.zeros(2 * size, dtype=dtype)
+        self.head = -1
+        self.length = 0
+
+    @property
+    def last_start(self):
+        """Start timestamp in ms of the current candle, or None."""
+        if self.length == 0:
+            return None
+        return int(self.start[self.head])
+
+    def _set(self, slot, field, value):
+        self.data[field][slot] = value
+        self.data[field][slot + self.size] = value
+
+    def _open(self, start, price):
+        slot = (self.head + 1) % self.size
+        self.start[slot] = self.start[slot + self.size] = start
+        for field in ('open', 'high', 'low', 'close'):
+            self._set(slot, field, price)
+        for field in ('volume', 'value', 'count'):
+            self._set(slot, field, 0)
+        self._set(slot, 'vwap', np.nan)
+        self.head = slot
+        self.length = min(self.length + 1, self.size)
+        return slot
+
+    def _apply(self, slot, price, volume):
+        d = self.data
+        if price > d['high'][slot]:
+            self._set(slot, 'high', price)
+        if price < d['low'][slot]:
+            self._set(slot, 'low', price)
+        self._set(slot, 'volume', d['volume'][slot] + volume)
+        self._set(slot, 'value', d['value'][slot] + price * volume)
+        self._set(slot, 'count', d['count'][slot] + 1)
+        if d['volume'][slot] > 0:
+            self._set(slot, 'vwap', d['value'][slot] / d['volume'][slot])
+
+    def update(self, timestamp, price, volume):
+        """Add a single trade.
+
+        Trades must arrive roughly in time order. A trade for an earlier
+        candle still in the buffer updates that candle's high, low and
+        volume but not its close. Older trades are dropped.
+
+        :param timestamp: trade time in ms
+        :param price: trade price
+        :param volume: trade volume
+        :return: True if the trade was applied
+        """
+        start = timestamp - timestamp % self.interval
+        last = self.last_start
+        if last is None or start > last:
+            if last is not None:
+                close = self.data['close'][self.head]
+                gap = min((start - last) // self.interval - 1, self.size)
+                for i in range(gap, 0, -1):
+                    self._open(start - i * self.interval, close)
+            slot = self._open(start, price)
+        elif start == last:
+            slot = self.head
+            self._set(slot, 'close', price)
+        else:
+            back = (last - start) // self.interval
+            if back >= self.length:
+                log.debug('Dropping trade older than the candle buffer')
+                return False
+            slot = (self.head - back) % self.size
+        self._apply(slot, price, volume)
+        return True
+
+    def latest(self, n=None):
+        """Get the latest n candles as views on the ring buffer.
+
+        :param n: number of candles, defaults to all that are held
+        :return: dict of numpy views keyed by 'start' and the OHLCV fields,
+            oldest first
+        """
+        n = self.length if n is None else min(n, self.length)
+        end = self.head + self.size + 1
+        view = {'start': self.start[end - n:end]}
+        for field in FIELDS:
+            view[field] = self.data[field][end - n:end]
+        return view
+
+    def frame(self, n=None):
+        """Get the latest n candles as a dataframe indexed by start time."""
+        view = self.latest(n)
+        index = pd.to_datetime(view.pop('start'), unit='ms')
+        return pd.DataFrame(view, index=index, columns=list(FIELDS))
+
+
+class CandleAggregator(object):
+    """Maintains candles for several intervals from a stream of trades."""
+
+    def __init__(self, intervals=(60,), size=1000):
+        """Initialise with the candle intervals in seconds.
+
+        :param intervals: iterable of candle lengths in seconds
+        :param size: number of candles kept per interval
+        """
+        self.series = dict((i, CandleSeries(i, size)) for i in intervals)
+        self.last_timestamp = None
+        # Trades applied at last_timestamp
+        self._last_count = 0
+
+    def add_trade(self, timestamp, price, volume):
+        """Add a single trade to every interval."""
+        timestamp = int(timestamp)
+        price = float(price)
+        volume = float(volume)
+        for series in self.series.values():
+            series.update(timestamp, price, volume)
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self.last_timestamp = timestamp
+            self._last_count = 1
+        elif timestamp == self.last_timestamp:
+            self._last_count += 1
+
+    def add_trades(self, trades):
+        """Add trades as returned in Market.get_trades()['trades'].
+
+        Trades are applied oldest first. A poll with `since` returns again
+        the trades at the last seen timestamp, so as many trades at that
+        timestamp as were already applied are skipped, and older ones are
+        dropped. Distinct trades with identical values are all counted.
+
+        :return: number of trades applied
+        """
+        trades = sorted(trades, key=lambda t: int(t['timestamp']))
+        last, skip = self.last_timestamp, self._last_count
+        applied = 0
+        for t in trades:
+            ts = int(t['timestamp'])
+            if last is not None:
+                if ts < last:
+                    continue
+                if ts == last and skip:
+                    skip -= 1
+                    continue
+            self.add_trade(ts, t['price'], t['volume'])
+            applied += 1
+        return applied
+
+    def poll(self, market, pair=None, kind='auth'):
+        """Fetch trades since the last one seen and apply them.
+
+        :param market: the Market instance, e.g. api.market
+        :return: number of trades applied
+        """
+        trades = market.get_trades(kind=kind, since=self.last_timestamp,
+                                   pair=pair)
+        return self.add_trades(trades['trades'])
+
+    def latest(self, interval, n=None):
+        """Get the latest n candles of an interval as numpy views."""
+        return self.series[interval].latest(n)
+
+    def frame(self, interval, n=None):
+        """Get the latest n candles of an interval as a dataframe."""
+        return self.series[interval].frame(n)
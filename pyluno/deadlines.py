@@ -0,0 +1,90 @@
+"""Deadlines module.
+
+A Deadline bounds the total time of a call, including waiting on the rate
+limiter, connecting and reading, and lets another thread cancel it.
+"""
+import threading
+from time import time
+
+from .utils import LunoCancelledError, LunoDeadlineError
+
+
+class Deadline(object):
+    """Time budget for one or more calls that can be cancelled."""
+
+    def __init__(self, timeout=None, at=None):
+        """Initialise with a timeout in seconds or an absolute time.
+
+        :param timeout: seconds from now, or None
+        :param at: epoch time in seconds, or None. If both are None the
+            deadline never expires but can still be cancelled
+        """
+        if timeout is not None:
+            at = time() + timeout
+        self.at = at
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    @classmethod
+    def coerce(cls, deadline):
+        """Return deadline as a Deadline; numbers are timeouts in seconds."""
+        if deadline is None or isinstance(deadline, Deadline):
+            return deadline
+        return cls(timeout=deadline)
+
+    @property
+    def cancelled(self):
+        """Whether cancel() was called."""
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Cancel every call using this deadline, from any thread."""
+        self._cancelled.set()
+        with self._lock:
+            waiters = list(self._waiters)
+        for event in waiters:
+            event.set()
+
+    def remaining(self):
+        """Seconds left, or None if the deadline has no time limit."""
+        if self.at is None:
+            return None
+        return max(0.0, self.at - time())
+
+    def check(self, call='', needed=0.0):
+        """Raise if cancelled or if less than needed seconds remain."""
+        if self.cancelled:
+            raise LunoCancelledError(call)
+        remaining = self.remaining()
+        if remaining is not None and (remaining <= 0 or
+                                      remaining < needed):
+            raise LunoDeadlineError(call, needed, remaining)
+
+    def sleep(self, seconds, call=''):
+        """Sleep, waking early and raising if cancelled."""
+        self.check(call, seconds)
+        if self._cancelled.wait(seconds):
+            raise LunoCancelledError(call)
+
+    def wait(self, future, call=''):
+        """Wait for a future until it completes, expires or is cancelled.
+
+        :return: the future's result
+        """
+        event = threading.Event()
+        future.add_done_callback(lambda f: event.set())
+        with self._lock:
+            self._waiters.add(event)
+        try:
+            if self.cancelled:
+                event.set()
+            event.wait(self.remaining())
+        finally:
+            with self._lock:
+                self._waiters.discard(event)
+        if future.done():
+            return future.result()
+        future.cancel()
+        self.check(call)
+        raise LunoDeadlineError(call, 0.0, self.remaining())
@@ -0,0 +1,196 @@
+"""Deposit watcher module.
+
+Polls many funding addresses concurrently and reports changes in the
+amounts received. Addresses that saw activity recently are polled more
+often than dormant ones.
+"""
+import heapq
+import logging
+import threading
+from decimal import Decimal
+from time import time
+
+import requests
+
+from .utils import (LunoAPIError, LunoAPIRateLimitError, atomic_write_json,
+                    read_json)
+
+log = logging.getLogger(__name__)
+
+
+class DepositWatcher(object):
+    """Watch funding addresses for incoming deposits."""
+
+    def __init__(self, main, path=None, callback=None, active_interval=30.0,
+                 dormant_interval=600.0, active_window=3600.0, budget=None):
+        """Initialise with super's main and the polling schedule.
+
+        :param path: JSON checkpoint file, or None to keep state in memory
+        :param callback: called with each credit event dict
+        :param active_interval: seconds between polls of active addresses
+        :param dormant_interval: seconds between polls of dormant addresses
+        :param active_window: an address is active for this many seconds
+            after its amounts last changed
+        :param budget: maximum polls per cycle, defaults to maxBurst
+        """
+        self.main = main
+        self.path = path
+        self.callback = callback
+        self.active_interval = active_interval
+        self.dormant_interval = dormant_interval
+        self.active_window = active_window
+        self.budget = budget if budget is not None else main.maxBurst
+        self.addresses = read_json(path, {})
+        self._queue = [(s['next_poll'], a) for a, s in self.addresses.items()]
+        heapq.heapify(self._queue)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, address, asset='XBT'):
+        """Start watching an address; it is polled on the next cycle."""
+        with self._lock:
+            if address in self.addresses:
+                return
+            self.addresses[address] = {
+                'asset': asset,
+                'total_received': None,
+                'total_unconfirmed': None,
+                'last_change': None,
+                'next_poll': 0.0,
+            }
+            heapq.heappush(self._queue, (0.0, address))
+
+    def remove(self, address):
+        """Stop watching an address."""
+        with self._lock:
+            self.addresses.pop(address, None)
+
+    def save(self):
+        """Write the checkpoint."""
+        if self.path is not None:
+            with self._lock:
+                atomic_write_json(self.path, self.addresses)
+
+    def _due(self, now, limit):
+        due = []
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now and \
+                    (limit is None or len(due) < limit):
+                next_poll, address = heapq.heappop(self._queue)
+                state = self.addresses.get(address)
+                # Skip removed addresses and entries superseded by a reschedule
+                if state is None or state['next_poll'] != next_poll:
+                    continue
+                due.append((address, state['asset']))
+        return due
+
+    def _schedule(self, address, now):
+        """Queue the next poll of an address; call with the lock held."""
+        state = self.addresses.get(address)
+        if state is None:
+            return
+        last = state['last_change']
+        if last is not None and now - last < self.active_window:
+            state['next_poll'] = now + self.active_interval
+        else:
+            state['next_poll'] = now + self.dormant_interval
+        heapq.heappush(self._queue, (state['next_poll'], address))
+
+    def _check(self, address, result, now):
+        """Record a poll result; call with the lock held."""
+        state = self.addresses.get(address)
+        if state is None:
+            return None
+        received = result.get('total_received', '0')
+        unconfirmed = result.get('total_unconfirmed', '0')
+        old_received = state['total_received']
+        old_unconfirmed = state['total_unconfirmed']
+        state['total_received'] = received
+        state['total_unconfirmed'] = unconfirmed
+        if old_received is None:
+            return None
+        if Decimal(received) == Decimal(old_received) and \
+                Decimal(unconfirmed) == Decimal(old_unconfirmed):
+            return None
+        state['last_change'] = now
+        return {
+            'address': address,
+            'asset': state['asset'],
+            'total_received': received,
+            'total_unconfirmed': unconfirmed,
+            'received_delta': str(Decimal(received) - Decimal(old_received)),
+            'unconfirmed_delta': str(
+                Decimal(unconfirmed) - Decimal(old_unconfirmed)),
+            'timestamp': now,
+        }
+
+    def poll(self, now=None):
+        """Poll the addresses that are due, concurrently.
+
+        The first poll of an address only records its amounts.
+
+        :return: list of credit event dicts
+        """
+        now = time() if now is None else now
+        due = self._due(now, self.budget)
+        futures = []
+        for address, asset in due:
+            futures.append((address, self.main._executor.submit(
+                self.main.receive.get_receive_address, asset, address)))
+        events = []
+        for address, future in futures:
+            try:
+                result = future.result()
+            except LunoAPIRateLimitError:
+                log.warning('Rate limited while polling %s', address)
+                with self._lock:
+                    # Skip addresses removed while they were polled
+                    state = self.addresses.get(address)
+                    if state is not None:
+                        state['next_poll'] = now
+                        heapq.heappush(self._queue, (now, address))
+                continue
+            except (LunoAPIError,
+                    requests.exceptions.RequestException) as e:
+                log.warning('Failed to poll %s: %s', address, e)
+                result = None
+            with self._lock:
+                event = None
+                if result is not None:
+                    event = self._check(address, result, now)
+                self._schedule(address, now)
+            if event is not None:
+                events.append(event)
+                if self.callback is not None:
+                    try:
+                        self.callback(event)
+                    except Exception:
+                        log.exception('Deposit callback failed for %s',
+                                      address)
+        if futures:
+            self.save()
+        return events
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.poll()
+            except Exception:
+                # Keep watching, a dead thread would miss every deposit
+                log.exception('Deposit poll failed')
+
+    def start(self, interval=1.0):
+        """Poll in a background thread every interval seconds."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background polling and write the checkpoint."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.save()
@@ -0,0 +1,268 @@
+"""Export module.
+
+Pages through the transaction and trade history endpoints and writes
+typed record batches to Parquet or Arrow IPC files as it goes, so memory
+use is bounded by the batch size rather than the size of the history.
+
+Each export target is a directory of part files. Every run appends a new
+part, and resuming starts after the last row already exported. Requires
+pyarrow.
+"""
+import calendar
+import glob
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+
+from .utils import next_trade_page, skip_trade_overlap
+
+log = logging.getLogger(__name__)
+
+EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow is required for exports, '
+                          'install it with "pip install pyarrow"')
+
+
+def transaction_schema():
+    """Arrow schema of exported account transactions."""
+    _require_pyarrow()
+    return pa.schema([
+        ('row_index', pa.int64()),
+        ('timestamp', pa.timestamp('ms')),
+        ('balance', pa.float64()),
+        ('available', pa.float64()),
+        ('balance_delta', pa.float64()),
+        ('available_delta', pa.float64()),
+        ('currency', pa.string()),
+        ('description', pa.string()),
+    ])
+
+
+def trade_schema():
+    """Arrow schema of exported trades."""
+    _require_pyarrow()
+    return pa.schema([
+        ('timestamp', pa.timestamp('ms')),
+        ('order_id', pa.string()),
+        ('pair', pa.string()),
+        ('type', pa.string()),
+        ('is_buy', pa.bool_()),
+        ('price', pa.float64()),
+        ('volume', pa.float64()),
+        ('base', pa.float64()),
+        ('counter', pa.float64()),
+        ('fee_base', pa.float64()),
+        ('fee_counter', pa.float64()),
+    ])
+
+
+class BatchWriter(object):
+    """Buffers records and writes them as typed record batches."""
+
+    def __init__(self, path, schema, fmt='parquet', batch_size=10000,
+                 row_group_size=None):
+        """Open a new part file in the export directory at path.
+
+        :param path: export directory, created if missing
+        :param schema: arrow schema of the records
+        :param fmt: 'parquet' or 'arrow' (Arrow IPC file)
+        :param batch_size: number of records buffered before a write
+        :param row_group_size: Parquet row group size, defaults to
+            batch_size
+        """
+        _require_pyarrow()
+        if fmt not in EXTENSIONS:
+            raise ValueError("fmt must be 'parquet' or 'arrow'")
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.schema = schema
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.row_group_size = row_group_size or batch_size
+        self.filename = os.path.join(path, 'part-%05d.%s' % (
+            len(part_files(path, fmt)), EXTENSIONS[fmt]))
+        self.rows = 0
+        self._writer = None
+        self._columns = dict((name, []) for name in schema.names)
+
+    def _open(self):
+        if self.fmt == 'parquet':
+            self._writer = pq.ParquetWriter(self.filename, self.schema)
+        else:
+            self._writer = pa.ipc.new_file(self.filename, self.schema)
+
+    def write(self, record):
+        """Add a record, writing a batch once batch_size are buffered."""
+        for name, column in self._columns.items():
+            column.append(record.get(name))
+        if len(self._columns[self.schema.names[0]]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records as one record batch."""
+        n = len(self._columns[self.schema.names[0]])
+        if n == 0:
+            return
+        arrays = [pa.array(self._columns[f.name], type=f.type)
+                  for f in self.schema]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        if self._writer is None:
+            self._open()
+        if self.fmt == 'parquet':
+            self._writer.write_table(pa.Table.from_batches([batch]),
+                                     row_group_size=self.row_group_size)
+        else:
+            self._writer.write_batch(batch)
+        self.rows += n
+        for column in self._columns.values():
+            del column[:]
+
+    def close(self):
+        """Flush and close the part file."""
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def part_files(path, fmt='parquet'):
+    """List the part files of an export directory in write order."""
+    return sorted(glob.glob(os.path.join(path, 'part-*.%s' % (
+        EXTENSIONS[fmt],))))
+
+
+def _last_value(path, fmt, column):
+    """Largest value of a column over the part files, or None."""
+    _require_pyarrow()
+    last = None
+    for filename in part_files(path, fmt):
+        if fmt == 'parquet':
+            meta = pq.ParquetFile(filename).metadata
+            index = meta.schema.to_arrow_schema().get_field_index(column)
+            for i in range(meta.num_row_groups):
+                stats = meta.row_group(i).column(index).statistics
+                if stats is not None and stats.has_min_max:
+                    value = stats.max
+                    if hasattr(value, 'utctimetuple'):
+                        # Naive datetimes of timestamp columns are UTC
+                        value = calendar.timegm(value.utctimetuple()) * \
+                            1000 + value.microsecond // 1000
+                    last = value if last is None else max(last, value)
+        else:
+            reader = pa.ipc.open_file(filename)
+            for i in range(reader.num_record_batches):
+                values = reader.get_batch(i).column(column).cast(pa.int64())
+                if len(values):
+                    value = max(v for v in values.to_pylist()
+                                if v is not None)
+                    last = value if last is None else max(last, value)
+    return last
+
+
+def _number(value):
+    return None if value is None else float(value)
+
+
+def export_transactions(main, account_id, path, fmt='parquet',
+                        page_size=1000, batch_size=10000,
+                        row_group_size=None, min_row=None):
+    """Export the transactions of an account.
+
+    :param main: the Luno instance
+    :param path: export directory
+    :param fmt: 'parquet' or 'arrow'
+    :param page_size: rows requested per call, at most 1000
+    :param batch_size: rows per record batch written
+    :param row_group_size: Parquet row group size
+    :param min_row: first row to export, defaults to the row after the
+        last one already in the export
+    :return: number of rows written
+    """
+    if min_row is None:
+        last = _last_value(path, fmt, 'row_index')
+        min_row = 1 if last is None else last + 1
+    writer = BatchWriter(path, transaction_schema(), fmt, batch_size,
+                         row_group_size)
+    try:
+        while True:
+            page = main.account.get_transactions(
+                account_id, min_row, min_row + page_size)
+            rows = sorted(page.get('transactions') or [],
+                          key=lambda r: r['row_index'])
+            for r in rows:
+                writer.write({
+                    'row_index': int(r['row_index']),
+                    'timestamp': int(r['timestamp']),
+                    'balance': _number(r.get('balance')),
+                    'available': _number(r.get('available')),
+                    'balance_delta': _number(r.get('balance_delta')),
+                    'available_delta': _number(r.get('available_delta')),
+                    'currency': r.get('currency'),
+                    'description': r.get('description'),
+                })
+            if len(rows) < page_size:
+                break
+            min_row = rows[-1]['row_index'] + 1
+    finally:
+        writer.close()
+    log.info('Exported %d transactions to %s', writer.rows, writer.filename)
+    return writer.rows
+
+
+def export_trades(main, path, pair=None, fmt='parquet', page_size=1000,
+                  batch_size=10000, row_group_size=None, since=None):
+    """Export the account's trades for a pair.
+
+    :param main: the Luno instance
+    :param path: export directory
+    :param fmt: 'parquet' or 'arrow'
+    :param page_size: trades requested per call
+    :param batch_size: rows per record batch written
+    :param row_group_size: Parquet row group size
+    :param since: first timestamp in ms to export, defaults to just after
+        the last trade already in the export
+    :return: number of rows written
+    """
+    if since is None:
+        last = _last_value(path, fmt, 'timestamp')
+        since = 0 if last is None else last + 1
+    writer = BatchWriter(path, trade_schema(), fmt, batch_size,
+                         row_group_size)
+    skip = 0
+    try:
+        while True:
+            page = main.orders.list_trades(page_size, since, pair)
+            trades = sorted(page.get('trades') or [],
+                            key=lambda t: t['timestamp'])
+            for t in skip_trade_overlap(trades, since, skip):
+                writer.write({
+                    'timestamp': int(t['timestamp']),
+                    'order_id': t.get('order_id'),
+                    'pair': t.get('pair'),
+                    'type': t.get('type'),
+                    'is_buy': t.get('is_buy'),
+                    'price': _number(t.get('price')),
+                    'volume': _number(t.get('volume')),
+                    'base': _number(t.get('base')),
+                    'counter': _number(t.get('counter')),
+                    'fee_base': _number(t.get('fee_base')),
+                    'fee_counter': _number(t.get('fee_counter')),
+                })
+            cursor = next_trade_page([t['timestamp'] for t in trades],
+                                     since, page_size)
+            if cursor is None:
+                break
+            since, skip = cursor
+    finally:
+        writer.close()
+    log.info('Exported %d trades to %s', writer.rows, writer.filename)
+    return writer.rows
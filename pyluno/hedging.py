@@ -0,0 +1,117 @@
+"""Hedged requests module.
+
+If an idempotent read has not answered within a high percentile of the
+latencies recently seen for that call, a second identical request is sent
+and whichever answers first is used.
+"""
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+log = logging.getLogger(__name__)
+
+# Read-only market data calls that are safe to send twice
+HEDGED_CALLS = ('ticker', 'tickers', 'orderbook', 'orderbook_top', 'trades')
+
+
+class HedgePolicy(object):
+    """Decides when to hedge a call and keeps the hedging metrics."""
+
+    def __init__(self, percentile=95, window=200, min_samples=20,
+                 min_delay=0.05, initial_delay=1.0, calls=HEDGED_CALLS,
+                 max_workers=10):
+        """Initialise the policy.
+
+        :param percentile: hedge after this percentile of recent latency
+        :param window: number of recent latencies kept per call
+        :param min_samples: samples needed before the percentile is used,
+            initial_delay is used until then
+        :param min_delay: lower bound on the hedge delay in seconds
+        :param initial_delay: hedge delay in seconds while warming up
+        :param calls: API calls that may be hedged, GETs only
+        :param max_workers: threads used to run hedged requests
+        """
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.calls = frozenset(calls)
+        self.max_workers = max_workers
+        self.latencies = {}
+        self.stats = {'requests': 0, 'hedged': 0, 'hedge_wins': 0,
+                      'primary_wins': 0}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self):
+        """Thread pool running the requests of hedged calls."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers)
+            return self._executor
+
+    def applies(self, call, http_call):
+        """Check whether a call may be hedged."""
+        return http_call.lower() == 'get' and \
+            call.split('/')[0] in self.calls
+
+    def record(self, call, latency):
+        """Record the latency in seconds of a completed request."""
+        key = call.split('/')[0]
+        with self._lock:
+            if key not in self.latencies:
+                self.latencies[key] = deque(maxlen=self.window)
+            self.latencies[key].append(latency)
+
+    def delay(self, call):
+        """Seconds to wait for the primary request before hedging."""
+        with self._lock:
+            samples = sorted(self.latencies.get(call.split('/')[0], ()))
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        i = min(len(samples) - 1,
+                int(len(samples) * self.percentile / 100.0))
+        return max(self.min_delay, samples[i])
+
+    def run(self, primary, hedge, delay):
+        """Run primary, starting hedge if it takes longer than delay.
+
+        :param primary: callable making the request
+        :param hedge: callable making the duplicate request, it should
+            take from the rate budget
+        :return: the first successful result
+        """
+        self.stats['requests'] += 1
+        first = self.executor.submit(primary)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        self.stats['hedged'] += 1
+        second = self.executor.submit(hedge)
+        pending = set([first, second])
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is not None:
+                    error = error or f.exception()
+                    continue
+                # The slower request cannot be interrupted once it is on
+                # the wire; it is cancelled if not started and otherwise
+                # left to finish and be discarded
+                for other in pending:
+                    other.cancel()
+                if f is second:
+                    self.stats['hedge_wins'] += 1
+                else:
+                    self.stats['primary_wins'] += 1
+                return f.result()
+        raise error
+
+    def shutdown(self):
+        """Stop the hedging threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,126 @@
+"""Market impact module.
+
+Estimates the fill of market orders against an order book for a whole
+vector of sizes at once, instead of walking the book level by level for
+every candidate size.
+"""
+import numpy as np
+import pandas as pd
+
+
+def book_side_arrays(levels):
+    """Convert a list of order book levels into price and volume arrays.
+
+    :param levels: list of dicts with 'price' and 'volume' keys, as
+        returned in the 'bids' or 'asks' of Market.get_order_book
+    :return: tuple of float64 arrays (price, volume)
+    """
+    n = len(levels)
+    price = np.empty(n, dtype=np.float64)
+    volume = np.empty(n, dtype=np.float64)
+    for i, level in enumerate(levels):
+        price[i] = level['price']
+        volume[i] = level['volume']
+    return price, volume
+
+
+def impact_arrays(price, volume, sizes, size_in='base'):
+    """Walk one side of the book for a vector of sizes in a single pass.
+
+    The levels must be ordered from the touch outwards, i.e. asks
+    ascending for a buy and bids descending for a sell, which is how
+    the exchange returns them.
+
+    :param price: array of level prices
+    :param volume: array of level volumes in base currency
+    :param sizes: array of order sizes
+    :param size_in: 'base' if the sizes are base amounts, 'counter' if
+        they are counter amounts
+    :return: dict of arrays with keys base, counter, avg_price,
+        worst_price, levels and filled
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    if size_in not in ('base', 'counter'):
+        raise ValueError("size_in must be 'base' or 'counter'")
+    cum_base = np.cumsum(volume)
+    cum_counter = np.cumsum(price * volume)
+    prev_base = np.concatenate(([0.0], cum_base[:-1]))
+    prev_counter = np.concatenate(([0.0], cum_counter[:-1]))
+    depth = cum_base if size_in == 'base' else cum_counter
+    total = depth[-1] if len(depth) else 0.0
+
+    filled = sizes <= total
+    target = np.minimum(sizes, total)
+    idx = np.searchsorted(depth, target, side='left')
+    if len(price):
+        idx = np.minimum(idx, len(price) - 1)
+        level_price = price[idx]
+        if size_in == 'base':
+            base = target
+            counter = prev_counter[idx] + (target - prev_base[idx]) * \
+                level_price
+        else:
+            counter = target
+            base = prev_base[idx] + (target - prev_counter[idx]) / \
+                level_price
+        levels = np.where(target > 0, idx + 1, 0)
+        worst = np.where(target > 0, level_price, np.nan)
+    else:
+        base = np.zeros_like(sizes)
+        counter = np.zeros_like(sizes)
+        levels = np.zeros(sizes.shape, dtype=np.intp)
+        worst = np.full(sizes.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg = np.where(base > 0, counter / base, np.nan)
+    return {
+        'base': base,
+        'counter': counter,
+        'avg_price': avg,
+        'worst_price': worst,
+        'levels': levels,
+        'filled': filled,
+    }
+
+
+def market_impact(book, sizes, order_type='buy', size_in='base', fee=0.0):
+    """Estimate the fill of market orders of several sizes.
+
+    A buy consumes the asks and pays the fee in base currency, a sell
+    consumes the bids and pays the fee in counter currency.
+
+    :param book: dict as returned by Market.get_order_book
+    :param sizes: iterable of order sizes
+    :param order_type: 'buy' or 'sell'
+    :param size_in: 'base' or 'counter', the currency the sizes are in
+    :param fee: taker fee as a fraction, e.g. 0.001
+    :return: dataframe indexed by size with the expected average and
+        worst prices, levels consumed, amounts and fees
+    """
+    side = 'asks' if order_type == 'buy' else 'bids'
+    price, volume = book_side_arrays(book[side])
+    r = impact_arrays(price, volume, sizes, size_in)
+    fee = float(fee)
+    if order_type == 'buy':
+        fee_base = r['base'] * fee
+        fee_counter = np.zeros_like(fee_base)
+        net_base = r['base'] - fee_base
+        net_counter = r['counter']
+    else:
+        fee_counter = r['counter'] * fee
+        fee_base = np.zeros_like(fee_counter)
+        net_base = r['base']
+        net_counter = r['counter'] - fee_counter
+    with np.errstate(divide='ignore', invalid='ignore'):
+        effective = np.where(net_base > 0, net_counter / net_base, np.nan)
+    df = pd.DataFrame({
+        'avg_price': r['avg_price'],
+        'worst_price': r['worst_price'],
+        'effective_price': effective,
+        'levels': r['levels'],
+        'base': r['base'],
+        'counter': r['counter'],
+        'fee_base': fee_base,
+        'fee_counter': fee_counter,
+        'filled': r['filled'],
+    }, index=pd.Index(np.asarray(sizes, dtype=np.float64), name='size'))
+    return df
@@ -0,0 +1,260 @@
+"""Ledger module.
+
+Keeps account transactions and trades in a local SQLite database. History
+is append-only, so each sync only asks the API for rows after the highest
+row_index stored for the account, or for trades from the newest timestamp
+stored for the pair, and reports query the database instead.
+"""
+import logging
+import numbers
+import sqlite3
+import threading
+
+import pandas as pd
+
+from .utils import next_trade_page, skip_trade_overlap
+
+log = logging.getLogger(__name__)
+
+TRANSACTION_COLUMNS = ('account_id', 'row_index', 'timestamp', 'balance',
+                       'available', 'balance_delta', 'available_delta',
+                       'currency', 'description')
+TRADE_COLUMNS = ('pair', 'timestamp', 'order_id', 'type', 'is_buy', 'price',
+                 'volume', 'base', 'counter', 'fee_base', 'fee_counter')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    account_id TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    balance REAL,
+    available REAL,
+    balance_delta REAL,
+    available_delta REAL,
+    currency TEXT,
+    description TEXT,
+    PRIMARY KEY (account_id, row_index)
+);
+CREATE INDEX IF NOT EXISTS transactions_time
+    ON transactions (account_id, timestamp);
+CREATE TABLE IF NOT EXISTS trades (
+    pair TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    order_id TEXT,
+    type TEXT,
+    is_buy INTEGER,
+    price REAL,
+    volume REAL,
+    base REAL,
+    counter REAL,
+    fee_base REAL,
+    fee_counter REAL
+);
+CREATE INDEX IF NOT EXISTS trades_time ON trades (pair, timestamp);
+CREATE INDEX IF NOT EXISTS trades_order ON trades (order_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+
+def _number(value):
+    return None if value is None else float(value)
+
+
+def _ms(value):
+    """Convert a time bound to epoch milliseconds."""
+    if value is None:
+        return None
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    return int(pd.Timestamp(value).value // 10 ** 6)
+
+
+class Ledger(object):
+    """Local copy of the account's transactions and trades."""
+
+    def __init__(self, main, path, page_size=1000):
+        """Open or create the database.
+
+        :param main: the Luno instance used to sync
+        :param path: SQLite database file, ':memory:' for a throwaway one
+        :param page_size: rows requested per call, at most 1000
+        """
+        self.main = main
+        self.path = path
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._db.close()
+
+    def _state(self, kind, key):
+        row = self._db.execute(
+            'SELECT value FROM sync_state WHERE kind = ? AND key = ?',
+            (kind, key)).fetchone()
+        return None if row is None else row[0]
+
+    def _insert(self, table, columns, rows, kind, key, value):
+        """Insert rows and move the sync state in one transaction.
+
+        :return: number of rows actually inserted
+        """
+        sql = 'INSERT OR IGNORE INTO %s (%s) VALUES (%s)' % (
+            table, ', '.join(columns), ', '.join('?' * len(columns)))
+        with self._lock, self._db:
+            before = self._db.total_changes
+            self._db.executemany(sql, rows)
+            inserted = self._db.total_changes - before
+            self._db.execute(
+                'INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)',
+                (kind, key, value))
+        return inserted
+
+    def last_row(self, account_id):
+        """Highest row_index stored for an account, or None."""
+        with self._lock:
+            return self._state('transactions', str(account_id))
+
+    def last_trade(self, pair=None):
+        """Newest trade timestamp in ms stored for a pair, or None."""
+        pair = self.main.pair if pair is None else pair
+        with self._lock:
+            return self._state('trades', pair)
+
+    def sync_transactions(self, account_id):
+        """Fetch the transactions after the last stored row.
+
+        :return: number of rows added
+        """
+        account_id = str(account_id)
+        last = self.last_row(account_id)
+        min_row = 1 if last is None else last + 1
+        added = 0
+        while True:
+            page = self.main.account.get_transactions(
+                account_id, min_row, min_row + self.page_size)
+            rows = sorted(page.get('transactions') or [],
+                          key=lambda r: r['row_index'])
+            if not rows:
+                break
+            added += self._insert(
+                'transactions', TRANSACTION_COLUMNS,
+                [(account_id, int(r['row_index']), int(r['timestamp']),
+                  _number(r.get('balance')), _number(r.get('available')),
+                  _number(r.get('balance_delta')),
+                  _number(r.get('available_delta')), r.get('currency'),
+                  r.get('description')) for r in rows],
+                'transactions', account_id, int(rows[-1]['row_index']))
+            if len(rows) < self.page_size:
+                break
+            min_row = int(rows[-1]['row_index']) + 1
+        log.debug('Synced %d transactions of account %s', added, account_id)
+        return added
+
+    def sync_trades(self, pair=None):
+        """Fetch the trades from the newest stored one on.
+
+        Pages start at the newest timestamp already stored, so trades
+        sharing it are fetched again and skipped by count.
+
+        :return: number of trades added
+        :raises LunoPagingError: if more than page_size trades share a
+            timestamp
+        """
+        pair = self.main.pair if pair is None else pair
+        since = self.last_trade(pair) or 0
+        with self._lock:
+            skip = self._db.execute(
+                'SELECT COUNT(*) FROM trades WHERE pair = ? AND '
+                'timestamp = ?', (pair, since)).fetchone()[0]
+        added = 0
+        while True:
+            page = self.main.orders.list_trades(self.page_size, since, pair)
+            trades = sorted(page.get('trades') or [],
+                            key=lambda t: t['timestamp'])
+            new = skip_trade_overlap(trades, since, skip)
+            if new:
+                added += self._insert(
+                    'trades', TRADE_COLUMNS,
+                    [(t.get('pair') or pair, int(t['timestamp']),
+                      t.get('order_id'), t.get('type'),
+                      int(bool(t.get('is_buy'))), _number(t.get('price')),
+                      _number(t.get('volume')), _number(t.get('base')),
+                      _number(t.get('counter')), _number(t.get('fee_base')),
+                      _number(t.get('fee_counter'))) for t in new],
+                    'trades', pair, int(new[-1]['timestamp']))
+            cursor = next_trade_page([t['timestamp'] for t in trades],
+                                     since, self.page_size)
+            if cursor is None:
+                break
+            since, skip = cursor
+        log.debug('Synced %d trades of %s', added, pair)
+        return added
+
+    def sync(self, account_ids=(), pairs=()):
+        """Sync several accounts and pairs.
+
+        :return: dict of rows added by account id and by pair
+        """
+        added = {}
+        for account_id in account_ids:
+            added[str(account_id)] = self.sync_transactions(account_id)
+        for pair in pairs:
+            added[pair] = self.sync_trades(pair)
+        return added
+
+    def _query(self, table, conditions, params, order):
+        sql = 'SELECT * FROM %s' % (table,)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY ' + order
+        with self._lock:
+            df = pd.read_sql_query(sql, self._db, params=params)
+        df.index = pd.to_datetime(df.timestamp, unit='ms')
+        return df
+
+    def transactions(self, account_id=None, start=None, end=None,
+                     currency=None):
+        """Get stored transactions as a dataframe indexed by time.
+
+        :param start: first time included, in ms or anything pandas parses
+        :param end: time excluded, in ms or anything pandas parses
+        """
+        conditions, params = [], []
+        for column, op, value in (('account_id', '=', account_id),
+                                  ('timestamp', '>=', _ms(start)),
+                                  ('timestamp', '<', _ms(end)),
+                                  ('currency', '=', currency)):
+            if value is not None:
+                conditions.append('%s %s ?' % (column, op))
+                params.append(str(value) if column == 'account_id'
+                              else value)
+        return self._query('transactions', conditions, params,
+                           'account_id, row_index')
+
+    def trades(self, pair=None, start=None, end=None):
+        """Get stored trades as a dataframe indexed by time.
+
+        :param pair: only this pair, all pairs if None
+        :param start: first time included, in ms or anything pandas parses
+        :param end: time excluded, in ms or anything pandas parses
+        """
+        conditions, params = [], []
+        for column, op, value in (('pair', '=', pair),
+                                  ('timestamp', '>=', _ms(start)),
+                                  ('timestamp', '<', _ms(end))):
+            if value is not None:
+                conditions.append('%s %s ?' % (column, op))
+                params.append(value)
+        df = self._query('trades', conditions, params, 'timestamp, rowid')
+        df.is_buy = df.is_buy.astype(bool)
+        return df
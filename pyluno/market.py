@@ -3,6 +3,9 @@ import logging
 
 import pandas as pd
 
+from .impact import market_impact
+from .reference import lookup
+
 log = logging.getLogger(__name__)
 
 
@@ -22,6 +25,13 @@ class Market(object):
         """Get all the latest ticker indicators."""
         return self.main.api_request('tickers', None, kind=kind)
 
+    def get_pairs(self):
+        """Get the names of all the currency pairs.
+
+        Served from the reference data cache when the client has one.
+        """
+        return lookup(self.main, 'pairs')
+
     def get_order_book(self, limit=None, kind='auth', pair=None):
         """Get a list of bids and asks in the order book."""
         params = {'pair': self.main.pair if pair is None else pair}
@@ -31,6 +41,17 @@ class Market(object):
             orders['asks'] = orders['asks'][:limit]
         return orders
 
+    def iter_order_book(self, chunk_size=None, kind='auth', pair=None):
+        """Stream the order book as it downloads.
+
+        :param chunk_size: if given, yield lists of up to this many levels
+        :return: generator of ('bids' or 'asks', level) pairs
+        """
+        params = {'pair': self.main.pair if pair is None else pair}
+        return self.main.api_request('orderbook', params, kind=kind,
+                                     stream=('bids', 'asks'),
+                                     chunk_size=chunk_size)
+
     def get_order_book_frame(self, limit=None, kind='auth', pair=None):
         """Get orderbook as a dataframe."""
         q = self.get_order_book(limit, kind, pair)
@@ -42,6 +63,23 @@ class Market(object):
             pd.concat([asks, bids], axis=1).values, columns=index)
         return df
 
+    def get_market_impact(self, sizes, order_type='buy', size_in='base',
+                          include_fees=False, kind='auth', pair=None):
+        """Estimate market order fills for a vector of sizes.
+
+        :param sizes: iterable of order sizes
+        :param order_type: 'buy' or 'sell'
+        :param size_in: 'base' or 'counter', the currency the sizes are in
+        :param include_fees: apply the account's taker fee from
+            Orders.get_fee_info
+        :return: dataframe indexed by size, see impact.market_impact
+        """
+        book = self.get_order_book(kind=kind, pair=pair)
+        fee = 0.0
+        if include_fees:
+            fee = self.main.orders.get_fee_info(pair=pair)['taker_fee']
+        return market_impact(book, sizes, order_type, size_in, fee)
+
     def get_trades(self, limit=None, kind='auth', since=None, pair=None):
         """Get a list of the most recent trades."""
         params = {'pair': self.main.pair if pair is None else pair}
@@ -52,6 +90,19 @@ class Market(object):
             trades['trades'] = trades['trades'][:limit]
         return trades
 
+    def iter_trades(self, chunk_size=None, kind='auth', since=None,
+                    pair=None):
+        """Stream the most recent trades as they download.
+
+        :param chunk_size: if given, yield lists of up to this many trades
+        :return: generator of trade dicts
+        """
+        params = {'pair': self.main.pair if pair is None else pair}
+        if since is not None:
+            params['since'] = since
+        return self.main.api_request('trades', params, kind=kind,
+                                     stream='trades', chunk_size=chunk_size)
+
     def get_trades_frame(self, limit=None, kind='auth', since=None, pair=None):
         """Get a dataframe of the most recent trades."""
         trades = self.get_trades(limit, kind, since, pair)
@@ -0,0 +1,253 @@
+"""Microstructure metrics module.
+
+Maintains market microstructure metrics for many pairs as book snapshots
+and trades arrive, instead of recomputing them from full frames on every
+tick. The state of all pairs lives in a few arrays with one row per pair:
+
+* the latest mid, spread and top-of-book depth imbalance, overwritten by
+  each snapshot;
+* a ring buffer of mid log returns and one of signed trade volume, each
+  with running sums over the rolling window. An update adds its entry to
+  the sums and evicts the entries that fell out of the window, so updates
+  are amortised O(1) and reading a metric never scans the window.
+"""
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+from .impact import book_side_arrays
+
+log = logging.getLogger(__name__)
+
+METRICS = ('timestamp', 'bid', 'ask', 'mid', 'spread', 'spread_bps',
+           'imbalance', 'volatility', 'returns', 'buy_volume', 'sell_volume',
+           'flow_imbalance', 'vwap', 'trades')
+
+
+class RollingRings(object):
+    """Ring buffers of timestamped values, one ring per row.
+
+    Keeps the sum of every value column over the entries held, so window
+    totals are read without touching the entries.
+    """
+
+    def __init__(self, rows, columns, capacity):
+        """Initialise empty rings.
+
+        :param rows: number of rings, e.g. one per pair
+        :param columns: number of values per entry
+        :param capacity: entries held per ring; when a ring is full its
+            oldest entry is evicted even if it is still in the window
+        """
+        self.capacity = capacity
+        self.timestamp = np.zeros((rows, capacity), dtype=np.int64)
+        self.values = np.zeros((rows, capacity, columns), dtype=np.float64)
+        self.sums = np.zeros((rows, columns), dtype=np.float64)
+        self.head = np.zeros(rows, dtype=np.int64)
+        self.count = np.zeros(rows, dtype=np.int64)
+
+    def _evict(self, row):
+        tail = (self.head[row] - self.count[row]) % self.capacity
+        self.sums[row] -= self.values[row, tail]
+        self.count[row] -= 1
+        if not self.count[row]:
+            # Reset so rounding errors cannot accumulate across windows
+            self.sums[row] = 0
+
+    def push(self, row, timestamp, values):
+        """Append an entry to a ring."""
+        if self.count[row] == self.capacity:
+            self._evict(row)
+        head = self.head[row]
+        self.timestamp[row, head] = timestamp
+        self.values[row, head] = values
+        self.sums[row] += values
+        self.head[row] = (head + 1) % self.capacity
+        self.count[row] += 1
+
+    def expire(self, row, cutoff):
+        """Evict the entries of a ring older than cutoff."""
+        while self.count[row]:
+            tail = (self.head[row] - self.count[row]) % self.capacity
+            if self.timestamp[row, tail] >= cutoff:
+                break
+            self._evict(row)
+
+    def latest(self, row):
+        """Get the entries of a ring, oldest first.
+
+        :return: tuple (timestamps, values) of copies
+        """
+        n = self.count[row]
+        order = (self.head[row] - n + np.arange(n)) % self.capacity
+        return self.timestamp[row, order], self.values[row, order]
+
+
+class MetricsEngine(object):
+    """Rolling microstructure metrics for several pairs."""
+
+    def __init__(self, pairs, window=60.0, depth=5, capacity=4096):
+        """Initialise with no data.
+
+        :param pairs: list of pairs tracked
+        :param window: length of the rolling window in seconds
+        :param depth: levels per side counted in the depth imbalance
+        :param capacity: book updates and trades held per pair and window
+        """
+        self.pairs = list(pairs)
+        self.rows = dict((pair, i) for i, pair in enumerate(self.pairs))
+        self.window = int(window * 1000)
+        self.depth = depth
+        n = len(self.pairs)
+        self.timestamp = np.zeros(n, dtype=np.int64)
+        self.bid = np.full(n, np.nan)
+        self.ask = np.full(n, np.nan)
+        self.mid = np.full(n, np.nan)
+        self.imbalance = np.full(n, np.nan)
+        # Returns hold (log return, squared log return)
+        self.returns = RollingRings(n, 2, capacity)
+        # Trades hold (buy volume, sell volume, value)
+        self.flow = RollingRings(n, 3, capacity)
+
+    def _expire(self, row, timestamp):
+        if timestamp > self.timestamp[row]:
+            self.timestamp[row] = timestamp
+        cutoff = self.timestamp[row] - self.window
+        self.returns.expire(row, cutoff)
+        self.flow.expire(row, cutoff)
+
+    def update_top(self, pair, timestamp, bid, ask, bid_depth, ask_depth):
+        """Apply the top of a book snapshot.
+
+        :param timestamp: snapshot time in ms
+        :param bid: best bid, NaN if there are no bids
+        :param ask: best ask, NaN if there are no asks
+        :param bid_depth: bid volume of the levels counted in the imbalance
+        :param ask_depth: ask volume of the levels counted in the imbalance
+        """
+        row = self.rows[pair]
+        timestamp = int(timestamp)
+        self._expire(row, timestamp)
+        mid = (bid + ask) / 2
+        last = self.mid[row]
+        if mid > 0 and last > 0:
+            r = math.log(mid / last)
+            self.returns.push(row, timestamp, (r, r * r))
+        if mid > 0:
+            self.mid[row] = mid
+        self.bid[row] = bid
+        self.ask[row] = ask
+        total = bid_depth + ask_depth
+        self.imbalance[row] = (bid_depth - ask_depth) / total if total \
+            else np.nan
+
+    def update_book(self, pair, book):
+        """Apply an order book snapshot.
+
+        :param book: dict from Market.get_order_book, bids best first and
+            asks best first
+        """
+        bid_price, bid_volume = book_side_arrays(
+            (book.get('bids') or [])[:self.depth])
+        ask_price, ask_volume = book_side_arrays(
+            (book.get('asks') or [])[:self.depth])
+        bid = bid_price[0] if len(bid_price) else np.nan
+        ask = ask_price[0] if len(ask_price) else np.nan
+        timestamp = book.get('timestamp') or self.timestamp[self.rows[pair]]
+        self.update_top(pair, timestamp, bid, ask, bid_volume.sum(),
+                        ask_volume.sum())
+
+    def update_trade(self, pair, timestamp, price, volume, is_buy):
+        """Apply a single trade.
+
+        :param is_buy: True if the taker bought
+        """
+        row = self.rows[pair]
+        timestamp = int(timestamp)
+        self._expire(row, timestamp)
+        volume = float(volume)
+        if is_buy:
+            entry = (volume, 0.0, volume * float(price))
+        else:
+            entry = (0.0, volume, volume * float(price))
+        self.flow.push(row, timestamp, entry)
+
+    def add_trades(self, pair, trades):
+        """Apply trades as returned in Market.get_trades()['trades'].
+
+        :return: number of trades applied
+        """
+        trades = sorted(trades, key=lambda t: t['timestamp'])
+        for t in trades:
+            self.update_trade(pair, t['timestamp'], t['price'], t['volume'],
+                              t.get('is_buy'))
+        return len(trades)
+
+    def advance(self, timestamp):
+        """Expire every pair's window up to a time in ms."""
+        for row in range(len(self.pairs)):
+            self._expire(row, int(timestamp))
+
+    def metrics(self, pair):
+        """Get the current metrics of a pair.
+
+        Volatility is the realised volatility of the mid over the window,
+        the square root of the summed squared log returns, not annualised.
+        Flow imbalance is (buy - sell) / (buy + sell) taker volume over the
+        window.
+
+        :return: dict keyed by METRICS
+        """
+        row = self.rows[pair]
+        bid, ask, mid = self.bid[row], self.ask[row], self.mid[row]
+        r = self.returns.sums[row]
+        buy, sell, value = self.flow.sums[row]
+        volume = buy + sell
+        return {
+            'timestamp': int(self.timestamp[row]),
+            'bid': float(bid),
+            'ask': float(ask),
+            'mid': float(mid),
+            'spread': float(ask - bid),
+            'spread_bps': float((ask - bid) / mid * 1e4) if mid > 0
+            else np.nan,
+            'imbalance': float(self.imbalance[row]),
+            'volatility': math.sqrt(max(r[1], 0.0)),
+            'returns': int(self.returns.count[row]),
+            'buy_volume': float(buy),
+            'sell_volume': float(sell),
+            'flow_imbalance': float((buy - sell) / volume) if volume > 0
+            else np.nan,
+            'vwap': float(value / volume) if volume > 0 else np.nan,
+            'trades': int(self.flow.count[row]),
+        }
+
+    def frame(self):
+        """Get the current metrics of every pair as a dataframe."""
+        spread = self.ask - self.bid
+        r = self.returns.sums
+        buy, sell, value = self.flow.sums.T
+        volume = buy + sell
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df = pd.DataFrame({
+                'timestamp': self.timestamp.copy(),
+                'bid': self.bid.copy(),
+                'ask': self.ask.copy(),
+                'mid': self.mid.copy(),
+                'spread': spread,
+                'spread_bps': np.where(self.mid > 0,
+                                       spread / self.mid * 1e4, np.nan),
+                'imbalance': self.imbalance.copy(),
+                'volatility': np.sqrt(np.maximum(r[:, 1], 0)),
+                'returns': self.returns.count.copy(),
+                'buy_volume': buy,
+                'sell_volume': sell,
+                'flow_imbalance': np.where(volume > 0,
+                                           (buy - sell) / volume, np.nan),
+                'vwap': np.where(volume > 0, value / volume, np.nan),
+                'trades': self.flow.count.copy(),
+            }, index=pd.Index(self.pairs, name='pair'),
+                columns=list(METRICS))
+        return df
@@ -0,0 +1,168 @@
+"""Order table module.
+
+Keeps a local table of the account's orders that is merged by order_id
+from listorders pages, so that repeated refreshes only parse what changed
+and callers can ask for the orders changed since a version.
+"""
+import bisect
+import logging
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+STRING_COLUMNS = ('order_id', 'pair', 'type', 'state')
+FLOAT_COLUMNS = ('limit_price', 'limit_volume', 'base', 'counter',
+                 'fee_base', 'fee_counter')
+TIME_COLUMNS = ('creation_timestamp', 'expiration_timestamp',
+                'completed_timestamp')
+COLUMNS = STRING_COLUMNS + FLOAT_COLUMNS + TIME_COLUMNS
+
+
+def _parse(order):
+    """Convert an order dict from the API into a typed row tuple."""
+    row = [order.get(c) for c in STRING_COLUMNS]
+    row.extend(float(order.get(c) or 0) for c in FLOAT_COLUMNS)
+    row.extend(int(order.get(c) or 0) for c in TIME_COLUMNS)
+    return tuple(row)
+
+
+class OrderTable(object):
+    """Incrementally maintained table of orders keyed by order_id.
+
+    Every change to an order bumps the table version and stamps the order
+    with it, so changed_since(n) is cheap however large the table is.
+    """
+
+    def __init__(self, main, pair=None, page_size=100):
+        """Initialise with super's main.
+
+        :param pair: the pair to track, defaults to the client's pair
+        :param page_size: orders requested per listorders call
+        """
+        self.main = main
+        self.pair = pair
+        self.page_size = page_size
+        self.version = 0
+        self.rows = {}
+        self.versions = {}
+        self._log_versions = []
+        self._log_ids = []
+        self._frame = None
+        self._frame_version = -1
+        self._last_merge = 0
+
+    def merge(self, orders):
+        """Merge a list of order dicts into the table.
+
+        :return: number of orders added or changed
+        """
+        changed = 0
+        for order in orders:
+            row = _parse(order)
+            order_id = row[0]
+            if self.rows.get(order_id) == row:
+                continue
+            self.version += 1
+            self.rows[order_id] = row
+            self.versions[order_id] = self.version
+            self._log_versions.append(self.version)
+            self._log_ids.append(order_id)
+            changed += 1
+        if len(self._log_ids) > 4 * max(len(self.rows), 1000):
+            self._compact()
+        return changed
+
+    def _compact(self):
+        """Drop superseded entries from the change log."""
+        pairs = sorted((v, i) for i, v in self.versions.items())
+        self._log_versions = [v for v, _ in pairs]
+        self._log_ids = [i for _, i in pairs]
+
+    def _pages(self, state=None, stop=None):
+        """Page through listorders from the newest order backwards."""
+        before = None
+        while True:
+            page = self.main.account.get_orders(
+                state, self.pair, created_before=before,
+                limit=self.page_size)['orders'] or []
+            yield page
+            if len(page) < self.page_size:
+                return
+            oldest = min(o['creation_timestamp'] for o in page)
+            # Orders sharing the boundary timestamp are fetched twice and
+            # deduplicated by the merge
+            following = oldest + 1
+            if before is not None and following >= before:
+                following = oldest
+            before = following
+            if stop is not None and stop(page):
+                return
+
+    def sync(self, full=False):
+        """Bring the table up to date.
+
+        Open orders are always fetched in full. Older history is paged
+        only until a page brings no changes, unless full is set. Orders
+        still open in the table that the exchange no longer lists as open
+        are fetched individually.
+
+        :return: number of orders added or changed
+        """
+        full = full or not self.rows
+        changed = 0
+        pending = set()
+        for page in self._pages('PENDING'):
+            pending.update(o['order_id'] for o in page)
+            changed += self.merge(page)
+        stop = None if full else (lambda page: self._last_merge == 0)
+        for page in self._pages(None, stop):
+            self._last_merge = self.merge(page)
+            changed += self._last_merge
+        state = STRING_COLUMNS.index('state')
+        for order_id, row in list(self.rows.items()):
+            if row[state] == 'PENDING' and order_id not in pending:
+                changed += self.merge([self.main.orders.get_order(order_id)])
+        return changed
+
+    def changed_since(self, version):
+        """Get the ids of orders added or changed after a version.
+
+        :return: list of order ids, oldest change first
+        """
+        i = bisect.bisect_right(self._log_versions, version)
+        # A log entry is current only if it carries the order's version
+        return [order_id for v, order_id in zip(self._log_versions[i:],
+                                                self._log_ids[i:])
+                if self.versions[order_id] == v]
+
+    def frame(self, since=None):
+        """Get the orders as a typed dataframe indexed by creation time.
+
+        :param since: if given, only orders changed after this version
+        """
+        if since is None and self._frame_version == self.version:
+            return self._frame
+        ids = self.changed_since(since) if since is not None else \
+            list(self.rows)
+        rows = [self.rows[i] for i in ids]
+        columns = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+        data = {}
+        for name, values in zip(COLUMNS, columns):
+            if name in FLOAT_COLUMNS:
+                data[name] = np.array(values, dtype=np.float64)
+            elif name in TIME_COLUMNS:
+                data[name] = pd.to_datetime(
+                    np.array(values, dtype=np.int64), unit='ms')
+            else:
+                data[name] = np.array(values, dtype=object)
+        data['version'] = np.array([self.versions[i] for i in ids],
+                                   dtype=np.int64)
+        df = pd.DataFrame(data, columns=list(COLUMNS) + ['version'])
+        df.index = df.creation_timestamp
+        df.sort_index(inplace=True)
+        if since is None:
+            self._frame = df
+            self._frame_version = self.version
+        return df
@@ -49,8 +49,8 @@ class Orders(object):
             'base_account_id': base_account_id,
             'counter_account_id': counter_account_id,
         }
-        if order_type is 'buy':
-            data['couter_volume'] = volume
+        if order_type == 'buy':
+            data['counter_volume'] = volume
         else:
             data['base_volume'] = volume
         result = self.main.api_request('marketorder', data=data,
@@ -93,14 +93,24 @@ class Orders(object):
 
     def list_trades(self, limit=None, since=None, pair=None):
         """Get list of all trades."""
-        params = {
-            'since': since,
-            'limit': limit,
-        }
         params = {'pair': self.main.pair if pair is None else pair}
+        if since is not None:
+            params['since'] = since
+        if limit is not None:
+            params['limit'] = limit
         trades = self.main.api_request('listtrades', params)
         return trades
 
+    def iter_list_trades(self, chunk_size=None, pair=None):
+        """Stream the list of trades as it downloads.
+
+        :param chunk_size: if given, yield lists of up to this many trades
+        :return: generator of trade dicts
+        """
+        params = {'pair': self.main.pair if pair is None else pair}
+        return self.main.api_request('listtrades', params, stream='trades',
+                                     chunk_size=chunk_size)
+
     def list_trades_frame(self, limit=None, since=None, pair=None):
         """Get dataframe of all trades."""
         trades = self.list_trades(limit, since, pair)
@@ -118,6 +128,11 @@ class Orders(object):
         return df
 
     def get_fee_info(self, kind='auth', pair=None):
-        """Get the fee info for the account."""
-        params = {'pair': self.main.pair if pair is None else pair}
-        return self.main.api_request('fee_info', params, kind=kind)
+        """Get the fee info for the account.
+
+        Served from the reference data cache when the client has one.
+        """
+        pair = self.main.pair if pair is None else pair
+        if getattr(self.main, 'reference', None) is not None:
+            return self.main.reference.get('fee_info', pair)
+        return self.main.api_request('fee_info', {'pair': pair}, kind=kind)
@@ -0,0 +1,157 @@
+"""Client pool module.
+
+A LunoPool is a Luno client holding several API keys. Each key has its own
+connection pool and token bucket; read-only calls go to the key with the
+most budget left and writes stay on one designated key, so the read
+throughput grows with the number of keys.
+
+Account reads (balances, history) are served by any key, so every key in
+a pool should belong to the same Luno user.
+"""
+from __future__ import absolute_import
+
+import logging
+import threading
+from time import time
+
+from .api import Luno
+from .recording import RecordingAdapter, ReplayAdapter
+from .utils import LunoAPIRateLimitError
+
+log = logging.getLogger(__name__)
+
+
+def _member_options(options):
+    """Options of one key, with a token bucket of its own by default."""
+    options = dict(options)
+    options.setdefault('rateLimiter', 'local')
+    return options
+
+
+class LunoPool(Luno):
+    """Luno client spreading its calls across several API keys."""
+
+    def __init__(self, credentials, options={}, write_key=0,
+                 write_reads=True):
+        """Instantiate with the keys of the pool.
+
+        :param credentials: list of (key, secret) tuples
+        :param options: the Luno options, applied to every key. maxRate and
+            maxBurst are per key
+        :param write_key: index in credentials of the key used for writes
+        :param write_reads: also route reads to the write key
+        """
+        if not credentials:
+            raise ValueError('LunoPool needs at least one key')
+        options = _member_options(options)
+        key, secret = credentials[write_key]
+        super(LunoPool, self).__init__(key, secret, options)
+        self.write_key = write_key
+        self.members = []
+        # Reference data is kept once, by the write key, and every key
+        # records to or replays from the write key's adapter
+        reader_options = dict(options)
+        for option in ('referenceCache', 'record', 'replay'):
+            reader_options.pop(option, None)
+        adapters = [(prefix, adapter) for prefix, adapter
+                    in self._requests_session.adapters.items()
+                    if isinstance(adapter, (RecordingAdapter, ReplayAdapter))]
+        for i, (key, secret) in enumerate(credentials):
+            member = self if i == write_key else \
+                Luno(key, secret, reader_options)
+            if member is not self:
+                for prefix, adapter in adapters:
+                    member._requests_session.mount(prefix, adapter)
+            # Writes through the write key must reach the shared cache
+            member.balance_cache = self.balance_cache
+            self.members.append(member)
+        self.readers = [m for i, m in enumerate(self.members)
+                        if write_reads or i != write_key] or [self]
+        self.stats = [{'requests': 0, 'reads': 0, 'writes': 0, 'errors': 0,
+                       'rate_limited': 0} for _ in self.members]
+        self._in_flight = [0] * len(self.members)
+        self._pool_lock = threading.Lock()
+        self._started = time()
+
+    def _budget(self, i):
+        """Calls member i can make now, less the ones already routed to it."""
+        limiter = self.members[i].rate_limiter
+        tokens = getattr(limiter, 'tokens', None)
+        budget = float('inf') if tokens is None else tokens()
+        return budget - self._in_flight[i]
+
+    def _pick(self, http_call):
+        """Index of the member that should make a call, under _pool_lock."""
+        if http_call.lower() != 'get':
+            return self.write_key
+        candidates = [self.members.index(m) for m in self.readers]
+        return max(candidates, key=lambda i: (
+            self._budget(i), -self.stats[i]['requests']))
+
+    def pick(self, http_call='get'):
+        """Index of the member that should make a call."""
+        with self._pool_lock:
+            return self._pick(http_call)
+
+    def api_request(self, call, params=None, data=None, kind='auth',
+                    http_call='get', deadline=None, **kwargs):
+        """Make the request with the member chosen by pick.
+
+        Takes the arguments of Luno.api_request.
+        """
+        deadline = self.current_deadline(deadline)
+        # Choose and count the call at once so concurrent calls see it
+        with self._pool_lock:
+            i = self._pick(http_call)
+            member, stats = self.members[i], self.stats[i]
+            self._in_flight[i] += 1
+            stats['requests'] += 1
+            stats['reads' if http_call.lower() == 'get' else 'writes'] += 1
+        try:
+            if member is self:
+                return Luno.api_request(self, call, params, data, kind,
+                                        http_call, deadline=deadline,
+                                        **kwargs)
+            return member.api_request(call, params, data, kind, http_call,
+                                      deadline=deadline, **kwargs)
+        except LunoAPIRateLimitError:
+            with self._pool_lock:
+                stats['rate_limited'] += 1
+            raise
+        except Exception:
+            with self._pool_lock:
+                stats['errors'] += 1
+            raise
+        finally:
+            with self._pool_lock:
+                self._in_flight[i] -= 1
+
+    def utilization(self):
+        """Report the use of each key.
+
+        :return: list of dicts, one per key in credentials order, with the
+            request counts, the tokens left and the rate used as a fraction
+            of maxRate
+        """
+        elapsed = max(time() - self._started, 1e-9)
+        report = []
+        for i, member in enumerate(self.members):
+            limiter = member.rate_limiter
+            tokens = getattr(limiter, 'tokens', None)
+            row = dict(self.stats[i])
+            row['key'] = member.auth[0]
+            row['write'] = i == self.write_key
+            row['tokens'] = tokens() if tokens is not None else None
+            rate = row['requests'] / elapsed
+            row['rate'] = rate
+            row['utilization'] = rate / member.maxRate \
+                if member.maxRate else None
+            report.append(row)
+        return report
+
+    def close(self):
+        """Close the connections of every key."""
+        for member in self.members:
+            if member is not self:
+                member.close()
+        super(LunoPool, self).close()
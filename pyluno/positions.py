@@ -0,0 +1,216 @@
+"""Positions module.
+
+Computes the position, cost basis and realized/unrealized PnL of a pair
+from the account's trades, as returned by Orders.list_trades_frame.
+
+FIFO lot matching is done on whole arrays: consuming units in purchase
+order is the same as reading the cumulative cost curve of the buys at the
+cumulative amount matched, which is a single np.interp. Fees are taken
+from fee_base and fee_counter: a buy receives base - fee_base for
+counter + fee_counter, a sell gives up base + fee_base for
+counter - fee_counter.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+_EMPTY = np.zeros(0, dtype=np.float64)
+
+
+def trade_arrays(trades):
+    """Extract typed arrays from trades.
+
+    :param trades: dataframe from Orders.list_trades_frame or a list of
+        trade dicts from Orders.list_trades
+    :return: dict of arrays timestamp (ms), is_buy, base, counter
+        with the fees applied as described in the module docstring
+    """
+    if not isinstance(trades, pd.DataFrame):
+        trades = pd.DataFrame(list(trades))
+    if trades.empty:
+        return {'timestamp': np.zeros(0, dtype=np.int64),
+                'is_buy': np.zeros(0, dtype=bool),
+                'base': _EMPTY, 'counter': _EMPTY}
+    if 'timestamp' in trades:
+        ts = pd.to_numeric(trades['timestamp']).values.astype(np.int64)
+    else:
+        ts = (trades.index.values.astype('datetime64[ms]')
+              .astype(np.int64))
+
+    def column(name):
+        if name not in trades:
+            return np.zeros(len(trades))
+        return pd.to_numeric(trades[name]).values.astype(np.float64)
+
+    is_buy = (trades['type'] == 'BID').values
+    base, counter = column('base'), column('counter')
+    fee_base, fee_counter = column('fee_base'), column('fee_counter')
+    order = np.argsort(ts, kind='stable')
+    base = np.where(is_buy, base - fee_base, base + fee_base)
+    counter = np.where(is_buy, counter + fee_counter, counter - fee_counter)
+    return {'timestamp': ts[order], 'is_buy': is_buy[order],
+            'base': base[order], 'counter': counter[order]}
+
+
+def fifo(is_buy, base, counter, lots_base=_EMPTY, lots_cost=_EMPTY):
+    """FIFO lot matching over arrays of trades in time order.
+
+    :param is_buy: bool array
+    :param base: base amount received by buys / given up by sells
+    :param counter: counter amount paid by buys / received by sells
+    :param lots_base: base amounts of lots held before these trades,
+        oldest first
+    :param lots_cost: counter cost of those lots
+    :return: tuple (realized, unmatched, lots_base, lots_cost): realized
+        PnL and unmatched base of each trade (0 for buys), and the lots
+        left open afterwards
+    """
+    buy_base = np.concatenate((lots_base, base[is_buy]))
+    buy_cost = np.concatenate((lots_cost, counter[is_buy]))
+    curve_base = np.concatenate(([0.0], np.cumsum(buy_base)))
+    curve_cost = np.concatenate(([0.0], np.cumsum(buy_cost)))
+
+    # Matched base after each trade follows M = min(M_prev + sold, bought),
+    # which unrolls to a running minimum. Units sold beyond what was held
+    # are unmatched and carry no cost.
+    bought = curve_base[len(lots_base) + np.cumsum(is_buy)]
+    sold = np.cumsum(np.where(is_buy, 0.0, base))
+    held_to = sold + np.minimum(np.minimum.accumulate(bought - sold), 0.0)
+    held_from = np.concatenate(([0.0], held_to[:-1]))
+    cost = np.interp(held_to, curve_base, curve_cost) - \
+        np.interp(held_from, curve_base, curve_cost)
+    matched = held_to - held_from
+    unmatched = np.where(is_buy, 0.0, base - matched)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proceeds = np.where(base > 0, counter * matched / base, 0.0)
+    realized = np.where(is_buy, 0.0, proceeds - cost)
+
+    # Open lots are the part of the buy curve not yet sold
+    consumed = held_to[-1] if len(held_to) else 0.0
+    first = np.searchsorted(curve_base[1:], consumed, side='right')
+    lots_base = buy_base[first:].copy()
+    lots_cost = buy_cost[first:].copy()
+    if len(lots_base):
+        used = consumed - curve_base[first]
+        unit = lots_cost[0] / lots_base[0] if lots_base[0] else 0.0
+        lots_base[0] -= used
+        lots_cost[0] -= used * unit
+    return realized, unmatched, lots_base, lots_cost
+
+
+def average_cost(is_buy, base, counter, position=0.0, cost=0.0):
+    """Average cost accounting over arrays of trades in time order.
+
+    The cost basis follows a linear recurrence that loses precision when
+    vectorized with cumulative products, so it runs as a tight loop over
+    the extracted arrays instead of over dataframe rows.
+
+    :return: tuple (realized, unmatched, position, cost)
+    """
+    n = len(base)
+    realized = np.zeros(n)
+    unmatched = np.zeros(n)
+    flags = is_buy.tolist()
+    bases = base.tolist()
+    counters = counter.tolist()
+    for i in range(n):
+        if flags[i]:
+            position += bases[i]
+            cost += counters[i]
+            continue
+        q = min(bases[i], position)
+        unmatched[i] = bases[i] - q
+        if q > 0:
+            unit = cost / position
+            realized[i] = counters[i] * q / bases[i] - unit * q
+            cost -= unit * q
+            position -= q
+    return realized, unmatched, position, cost
+
+
+class PositionEngine(object):
+    """Running position and PnL of one pair, updated as trades arrive."""
+
+    def __init__(self, method='fifo'):
+        """Initialise with the accounting method, 'fifo' or 'average'."""
+        if method not in ('fifo', 'average'):
+            raise ValueError("method must be 'fifo' or 'average'")
+        self.method = method
+        self.realized = 0.0
+        self.unmatched = 0.0
+        self.lots_base = _EMPTY
+        self.lots_cost = _EMPTY
+        self.last_timestamp = None
+        # Trades applied at last_timestamp
+        self._last_count = 0
+        self.trade_count = 0
+
+    @property
+    def position(self):
+        """Base currently held."""
+        return float(self.lots_base.sum())
+
+    @property
+    def cost(self):
+        """Counter cost of the base currently held."""
+        return float(self.lots_cost.sum())
+
+    @property
+    def avg_cost(self):
+        """Average cost per unit of the base held, or nan if flat."""
+        position = self.position
+        return self.cost / position if position > 0 else float('nan')
+
+    def unrealized(self, mark):
+        """Unrealized PnL of the position at a mark price."""
+        return self.position * mark - self.cost
+
+    def update(self, trades):
+        """Apply trades newer than the ones already applied.
+
+        :param trades: dataframe from Orders.list_trades_frame or a list of
+            trade dicts. Trades before the last applied timestamp are
+            skipped, and so are as many trades at it as were already
+            applied, so pages polled with `since` can be passed as they
+            are
+        :return: dataframe indexed by trade time with the realized PnL,
+            unmatched base and position after each trade
+        """
+        a = trade_arrays(trades)
+        if self.last_timestamp is not None:
+            ts = a['timestamp']
+            at_last = ts == self.last_timestamp
+            keep = (ts > self.last_timestamp) | \
+                (at_last & (np.cumsum(at_last) > self._last_count))
+            a = dict((k, v[keep]) for k, v in a.items())
+        is_buy, base, counter = a['is_buy'], a['base'], a['counter']
+        if self.method == 'fifo':
+            realized, unmatched, self.lots_base, self.lots_cost = fifo(
+                is_buy, base, counter, self.lots_base, self.lots_cost)
+        else:
+            realized, unmatched, position, cost = average_cost(
+                is_buy, base, counter, self.position, self.cost)
+            self.lots_base = np.array([position]) if position else _EMPTY
+            self.lots_cost = np.array([cost]) if position else _EMPTY
+        held = np.cumsum(np.where(is_buy, base, -(base - unmatched)))
+        before = float(held[-1]) if len(held) else 0.0
+        position = held + (self.position - before)
+        self.realized += float(realized.sum())
+        self.unmatched += float(unmatched.sum())
+        self.trade_count += len(base)
+        if len(base):
+            last = int(a['timestamp'][-1])
+            count = int((a['timestamp'] == last).sum())
+            if last == self.last_timestamp:
+                self._last_count += count
+            else:
+                self.last_timestamp = last
+                self._last_count = count
+        return pd.DataFrame({
+            'realized_pnl': realized,
+            'unmatched': unmatched,
+            'position': position,
+        }, index=pd.to_datetime(a['timestamp'], unit='ms'))
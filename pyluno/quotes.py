@@ -1,4 +1,14 @@
 """Quotes module."""
+import logging
+import threading
+from decimal import Decimal
+from time import time
+
+import requests
+
+from .utils import LunoAPIError, LunoAPIRateLimitError
+
+log = logging.getLogger(__name__)
 
 
 class Quotes(object):
@@ -37,3 +47,159 @@ class Quotes(object):
         result = self.main.api_request('quotes', params=data,
                                        http_call='delete')
         return result
+
+
+class QuoteManager(object):
+    """Keeps fresh quotes pre-fetched so execution needs one round-trip.
+
+    Quotes are kept per (type, base_amount, pair) target. A quote is reused
+    while it has at least `margin` seconds left before it expires, and is
+    deleted on the exchange once it goes stale or is replaced. A quote is
+    taken out of the manager before it is executed, so it is never handed
+    out twice nor deleted while being executed.
+    """
+
+    def __init__(self, main, targets=(), margin=2.0):
+        """Initialise with super's main and the targets to keep quoted.
+
+        :param targets: iterable of (type, base_amount, pair) tuples, e.g.
+            ('BUY', '0.1', 'XBTZAR')
+        :param margin: seconds of validity a quote needs to be reused
+        """
+        self.main = main
+        self.margin = margin
+        self.targets = set(self._key(*t) for t in targets)
+        self.quotes = {}
+        self.latency = {}
+        self.stats = {'hits': 0, 'misses': 0, 'deleted': 0,
+                      'time_saved': 0.0}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _key(ttype, base_amount, pair):
+        # 0.1, '0.1' and '0.10' are the same target
+        amount = '{0:f}'.format(Decimal(str(base_amount)).normalize())
+        return (ttype.upper(), amount, pair)
+
+    def is_valid(self, quote, now=None):
+        """Check whether a quote can still be executed safely."""
+        now = time() if now is None else now
+        if quote.get('exercised') or quote.get('discarded'):
+            return False
+        return quote['expires_at'] / 1000.0 - self.margin > now
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _cached(self, key, take=False):
+        """Get the held quote of a key if valid, under self._lock."""
+        quote = self.quotes.get(key)
+        if quote is None or not self.is_valid(quote):
+            return None
+        if take:
+            del self.quotes[key]
+        return quote
+
+    def _fetch(self, key, take=False):
+        """Fetch a quote for a key unless another thread just did.
+
+        :param take: hand the quote to the caller instead of holding it
+        :return: tuple (quote, True if it was fetched by this call)
+        """
+        with self._key_lock(key):
+            with self._lock:
+                quote = self._cached(key, take)
+            if quote is not None:
+                return quote, False
+            start = time()
+            quote = self.main.quotes.get_quote(key[0], key[1], key[2])
+            elapsed = time() - start
+            with self._lock:
+                old = self.quotes.pop(key, None)
+                if not take:
+                    self.quotes[key] = quote
+                self.latency[key] = elapsed
+        if old is not None:
+            self._delete(old)
+        return quote, True
+
+    def _delete(self, quote):
+        try:
+            self.main.quotes.delete_quote(quote['id'])
+            with self._lock:
+                self.stats['deleted'] += 1
+        except LunoAPIError as e:
+            log.debug('Could not delete quote %s: %s', quote['id'], e)
+
+    def refresh(self):
+        """Fetch quotes for targets without a valid one, concurrently.
+
+        :return: number of quotes fetched
+        """
+        now = time()
+        with self._lock:
+            stale = [k for k in self.targets
+                     if k not in self.quotes or
+                     not self.is_valid(self.quotes[k], now)]
+        futures = [self.main._executor.submit(self._fetch, k) for k in stale]
+        return sum(1 for f in futures if f.result()[1])
+
+    def _get(self, key, take=False):
+        with self._lock:
+            quote = self._cached(key, take)
+            if quote is not None:
+                self.stats['hits'] += 1
+                self.stats['time_saved'] += self.latency.get(key, 0.0)
+                return quote
+            self.stats['misses'] += 1
+        return self._fetch(key, take)[0]
+
+    def get(self, ttype, base_amount, pair):
+        """Get a valid quote, reusing a pre-fetched one when possible."""
+        return self._get(self._key(ttype, base_amount, pair))
+
+    def execute(self, ttype, base_amount, pair):
+        """Execute a conversion using a pre-fetched quote if one is valid.
+
+        :return: the result of Quotes.execute_quote
+        """
+        quote = self._get(self._key(ttype, base_amount, pair), take=True)
+        return self.main.quotes.execute_quote(quote['id'])
+
+    def discard_all(self):
+        """Delete every held quote on the exchange."""
+        with self._lock:
+            quotes = list(self.quotes.values())
+            self.quotes = {}
+        for quote in quotes:
+            self._delete(quote)
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except (LunoAPIError, LunoAPIRateLimitError,
+                    requests.exceptions.RequestException) as e:
+                log.warning('Quote refresh failed: %s', e)
+            except Exception:
+                log.exception('Quote refresh failed')
+
+    def start(self, interval=1.0):
+        """Refresh quotes in a background thread every interval seconds."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, discard=True):
+        """Stop the background refresh and optionally delete held quotes."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if discard:
+            self.discard_all()
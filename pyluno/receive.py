@@ -1,4 +1,13 @@
 """Receive Module."""
+import logging
+import threading
+from collections import deque
+from time import time
+
+from .utils import (AddressPoolEmptyError, LunoAPIError,
+                    LunoAPIRateLimitError, atomic_write_json, read_json)
+
+log = logging.getLogger(__name__)
 
 
 class Receive(object):
@@ -36,3 +45,154 @@ class Receive(object):
         result = self.main.api_request('funding_address',
                                        data=data, http_call='post')
         return result
+
+
+class AddressPool(object):
+    """Pool of pre-allocated receive addresses.
+
+    Addresses are created ahead of time whenever the exchange's address
+    budget (1 per hour, bursts of 10) allows, so handing one out is a
+    local operation. The pool is persisted as JSON if a path is given.
+    """
+
+    def __init__(self, main, path=None, assets=('XBT',), target=10,
+                 rate=1 / 3600.0, burst=10):
+        """Initialise with super's main and the pool settings.
+
+        :param path: JSON file to persist the pool in, or None
+        :param assets: assets to keep addresses for
+        :param target: number of unused addresses to keep per asset
+        :param rate: address creation budget, per second
+        :param burst: maximum addresses that can be created in a burst
+        """
+        self.main = main
+        self.path = path
+        self.target = target
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        state = read_json(path, {})
+        self.free = {}
+        self.assigned = {}
+        self.retired = {}
+        for asset in set(assets) | set(state.get('free', {})):
+            self.free[asset] = deque(state.get('free', {}).get(asset, []))
+            self.assigned[asset] = state.get('assigned', {}).get(asset, {})
+            self.retired[asset] = state.get('retired', {}).get(asset, {})
+        self.tokens = state.get('tokens', float(burst))
+        self.updated = state.get('updated', time())
+
+    def save(self):
+        """Persist the pool to its path.
+
+        The state is copied and written under the lock, so the file never
+        goes back to an older state.
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            state = {
+                'free': dict((a, list(q)) for a, q in self.free.items()),
+                'assigned': dict((a, dict(d))
+                                 for a, d in self.assigned.items()),
+                'retired': dict((a, dict(d))
+                                for a, d in self.retired.items()),
+                'tokens': self.tokens,
+                'updated': self.updated,
+            }
+            atomic_write_json(self.path, state)
+
+    def level(self, asset=None):
+        """Number of unused addresses, for one asset or as a dict."""
+        if asset is not None:
+            return len(self.free.get(asset, ()))
+        return dict((a, len(q)) for a, q in self.free.items())
+
+    def acquire(self, asset='XBT', owner=None):
+        """Hand out an unused address.
+
+        :param owner: optional reference stored against the address
+        :return: the address string
+        """
+        with self._lock:
+            try:
+                address = self.free[asset].popleft()
+            except (KeyError, IndexError):
+                raise AddressPoolEmptyError(asset)
+            self.assigned[asset][address] = owner
+        self.save()
+        return address
+
+    def retire(self, asset, address):
+        """Stop using an assigned address.
+
+        Addresses are never handed out twice, as a later deposit to one
+        would be credited to its first owner, so a retired address keeps
+        its owner and does not return to the pool.
+        """
+        with self._lock:
+            owner = self.assigned[asset].pop(address)
+            self.retired[asset][address] = owner
+        self.save()
+
+    def _refill_tokens(self):
+        now = time()
+        self.tokens = min(float(self.burst),
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def top_up(self):
+        """Create addresses for assets below target while budget remains.
+
+        :return: number of addresses created
+        """
+        created = 0
+        for asset in sorted(self.free, key=self.level):
+            while self.level(asset) < self.target:
+                with self._lock:
+                    self._refill_tokens()
+                    if self.tokens < 1:
+                        break
+                    self.tokens -= 1
+                try:
+                    result = self.main.receive.create_receive_address(asset)
+                except LunoAPIRateLimitError:
+                    log.warning('Address creation rate limited')
+                    with self._lock:
+                        self.tokens = 0.0
+                    break
+                with self._lock:
+                    self.free[asset].append(result['address'])
+                created += 1
+                # Save each address as it is created, so a failure later in
+                # the top up does not lose it
+                self.save()
+        return created
+
+    def _run(self, interval):
+        while True:
+            try:
+                self.top_up()
+            except LunoAPIError as e:
+                log.warning('Address pool top up failed: %s', e)
+            except Exception:
+                # Keep topping up, a dead thread would drain the pool
+                log.exception('Address pool top up failed')
+            if self._stop.wait(interval):
+                break
+
+    def start(self, interval=60.0):
+        """Top up the pool in a background thread every interval seconds."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background top up."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,265 @@
+"""Reconciliation module.
+
+Matches the account's trades to their orders and to the balance movements
+in its transactions:
+
+* trades to orders on order_id, comparing the summed fills with the
+  order's base, counter and fees, with a hash groupby and join on
+  order_id;
+* each trade's expected base and counter movements to transactions with
+  the same currency and amount in 1e-8 units within a time window.
+  Movements left over are then paired with a transaction left over in the
+  same currency and window and reported as mismatched, or as unmatched if
+  there is none.
+
+Movements and transactions are paired by coding their keys as integers,
+sorting both sides by key and time (np.lexsort) and walking them once
+with two pointers. The sort makes this O(n log n) in the number of rows,
+and dense bursts of identical fills cost no more than spread out ones.
+
+Expected movements follow the fee convention of the positions module: a
+buy receives base - fee_base for counter + fee_counter, a sell gives up
+base + fee_base for counter - fee_counter.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .arbitrage import split_pair
+
+log = logging.getLogger(__name__)
+
+SCALE = 10 ** 8
+AMOUNTS = ('base', 'counter', 'fee_base', 'fee_counter')
+
+
+def _frame(records):
+    if isinstance(records, pd.DataFrame):
+        return records
+    return pd.DataFrame(list(records))
+
+
+def _timestamps(df, column='timestamp'):
+    """Epoch ms of each row, from a column or the datetime index."""
+    if column in df:
+        values = df[column]
+        if np.issubdtype(values.dtype, np.datetime64):
+            return values.values.astype('datetime64[ms]').astype(np.int64)
+        return pd.to_numeric(values).values.astype(np.int64)
+    return df.index.values.astype('datetime64[ms]').astype(np.int64)
+
+
+def _numbers(df, columns):
+    return dict((c, pd.to_numeric(df[c]).values.astype(np.float64)
+                 if c in df else np.zeros(len(df))) for c in columns)
+
+
+def match_orders(trades, orders, tolerance=1e-8):
+    """Compare the fills of each order with the order.
+
+    :param trades: dataframe or list of trades
+    :param orders: dataframe or list of orders, e.g. OrderTable.frame()
+    :return: dataframe with one row per order_id found in either source:
+        the summed fills, the order's figures, their differences and a
+        status of 'ok', 'mismatch', 'missing_order' (fills of an order
+        not in orders) or 'no_trades' (an order with a filled amount but
+        no fills)
+    """
+    trades, orders = _frame(trades), _frame(orders)
+    fills = pd.DataFrame(_numbers(trades, AMOUNTS))
+    fills['order_id'] = trades['order_id'].values if len(trades) else []
+    fills['trades'] = 1
+    fills = fills.groupby('order_id', sort=False).sum()
+    book = pd.DataFrame(_numbers(orders, AMOUNTS))
+    book['order_id'] = orders['order_id'].values if len(orders) else []
+    book = book.drop_duplicates('order_id', keep='last') \
+        .set_index('order_id')
+    df = fills.join(book, how='outer', lsuffix='_trades',
+                    rsuffix='_order')
+    df['trades'] = df['trades'].fillna(0).astype(np.int64)
+    status = np.full(len(df), 'ok', dtype=object)
+    mismatch = np.zeros(len(df), dtype=bool)
+    for c in AMOUNTS:
+        diff = df[c + '_trades'].fillna(0) - df[c + '_order']
+        df[c + '_diff'] = diff
+        mismatch |= (diff.abs() > tolerance).values
+    status[mismatch] = 'mismatch'
+    filled = (df['base_order'].fillna(0) > tolerance).values
+    status[(df['trades'] == 0).values & filled] = 'no_trades'
+    status[df['base_order'].isnull().values] = 'missing_order'
+    df['status'] = status
+    return df
+
+
+def expected_movements(trades, currencies=None):
+    """Balance movements each trade should cause.
+
+    :param currencies: dict of pair to (base, counter) currency, pairs
+        not in it are split with arbitrage.split_pair
+    :return: dataframe with two rows per trade: trade (its position in
+        trades), order_id, timestamp, currency, amount and leg ('base' or
+        'counter')
+    """
+    trades = _frame(trades)
+    n = len(trades)
+    v = _numbers(trades, AMOUNTS)
+    is_buy = (trades['type'] == 'BID').values if n else np.zeros(0, bool)
+    base = np.where(is_buy, v['base'] - v['fee_base'],
+                    -(v['base'] + v['fee_base']))
+    counter = np.where(is_buy, -(v['counter'] + v['fee_counter']),
+                       v['counter'] - v['fee_counter'])
+    currencies = dict(currencies or {})
+    pairs = trades['pair'] if n else pd.Series([], dtype=object)
+    for pair in pairs.unique():
+        if pair not in currencies:
+            currencies[pair] = split_pair(pair)
+    base_ccy = pairs.map(dict((p, c[0]) for p, c in currencies.items()))
+    counter_ccy = pairs.map(dict((p, c[1]) for p, c in currencies.items()))
+    base_ccy = base_ccy.values.astype(object)
+    counter_ccy = counter_ccy.values.astype(object)
+    index = np.arange(n)
+    ts = _timestamps(trades) if n else np.zeros(0, dtype=np.int64)
+    order_ids = trades['order_id'].values if n else np.zeros(0, object)
+    return pd.DataFrame({
+        'trade': np.concatenate((index, index)),
+        'order_id': np.concatenate((order_ids, order_ids)),
+        'timestamp': np.concatenate((ts, ts)),
+        'currency': np.concatenate((base_ccy, counter_ccy)),
+        'amount': np.concatenate((base, counter)),
+        'leg': np.repeat(np.array(['base', 'counter'], dtype=object), n),
+    })
+
+
+def _groups(left, right, keys):
+    """Integer codes of the key values of left and right rows."""
+    keys = list(keys)
+    codes = pd.concat([left[keys], right[keys]], ignore_index=True) \
+        .groupby(keys, sort=False, dropna=False).ngroup().values
+    return codes[:len(left)], codes[len(left):]
+
+
+def _sweep(left, right, keys, window_ms):
+    """Pair rows of left and right with equal keys, in time order.
+
+    Both sides are sorted by key and timestamp and walked once. Each row
+    is paired with the earliest row of the other side still unpaired that
+    has its keys and is within window_ms, which pairs as many rows as
+    possible.
+
+    :return: tuple of arrays (left positions, right positions)
+    """
+    left_group, right_group = _groups(left, right, keys)
+    left_ts = left['timestamp'].values
+    right_ts = right['timestamp'].values
+    left_order = np.lexsort((left_ts, left_group))
+    right_order = np.lexsort((right_ts, right_group))
+    lg, lt = left_group[left_order].tolist(), left_ts[left_order].tolist()
+    rg, rt = right_group[right_order].tolist(), right_ts[right_order].tolist()
+    paired_left, paired_right = [], []
+    i = j = 0
+    while i < len(lg) and j < len(rg):
+        if lg[i] < rg[j] or (lg[i] == rg[j] and lt[i] < rt[j] - window_ms):
+            i += 1
+        elif rg[j] < lg[i] or rt[j] < lt[i] - window_ms:
+            j += 1
+        else:
+            paired_left.append(i)
+            paired_right.append(j)
+            i += 1
+            j += 1
+    return (left_order[np.array(paired_left, dtype=np.int64)],
+            right_order[np.array(paired_right, dtype=np.int64)])
+
+
+def match_transactions(trades, transactions, window_ms=2000,
+                       currencies=None, tolerance=1e-8):
+    """Match the movements of trades to account transactions.
+
+    :param transactions: dataframe or list of transactions with currency,
+        balance_delta and a timestamp column or datetime index
+    :param window_ms: largest time difference between a trade and its
+        transaction
+    :param currencies: see expected_movements
+    :return: tuple (movements, unmatched transactions). movements is
+        expected_movements with the matched tx (position in
+        transactions), its row_index, its balance_delta, the difference
+        and a status of 'matched', 'mismatched' or 'unmatched'
+    """
+    moves = expected_movements(trades, currencies)
+    moves['movement'] = np.arange(len(moves))
+    transactions = _frame(transactions)
+    txs = pd.DataFrame({
+        'tx': np.arange(len(transactions)),
+        'timestamp': _timestamps(transactions) if len(transactions)
+        else np.zeros(0, dtype=np.int64),
+        'currency': transactions['currency'].values
+        if len(transactions) else np.zeros(0, dtype=object),
+        'delta': _numbers(transactions, ('balance_delta',))['balance_delta'],
+    })
+    moves['units'] = np.round(moves['amount'].values * SCALE) \
+        .astype(np.int64)
+    txs['units'] = np.round(txs['delta'].values * SCALE).astype(np.int64)
+
+    exact_moves, exact_txs = _sweep(moves, txs, ('currency', 'units'),
+                                    window_ms)
+    rest_moves = np.setdiff1d(np.arange(len(moves)), exact_moves)
+    rest_txs = np.setdiff1d(np.arange(len(txs)), exact_txs)
+    near_moves, near_txs = _sweep(moves.iloc[rest_moves],
+                                  txs.iloc[rest_txs], ('currency',),
+                                  window_ms)
+    matches = pd.DataFrame({
+        'movement': np.concatenate((exact_moves, rest_moves[near_moves])),
+        'tx': np.concatenate((exact_txs, rest_txs[near_txs])),
+    })
+    moves = moves.merge(matches, on='movement', how='left')
+    matched = moves['tx'].notnull().values
+    tx = moves['tx'].fillna(-1).values.astype(np.int64)
+    moves['tx'] = tx
+    delta = np.where(matched, txs['delta'].values[np.maximum(tx, 0)]
+                     if len(txs) else 0.0, np.nan)
+    moves['balance_delta'] = delta
+    if 'row_index' in transactions and len(transactions):
+        rows = transactions['row_index'].values
+        moves['row_index'] = np.where(matched, rows[np.maximum(tx, 0)], -1)
+    moves['diff'] = delta - moves['amount'].values
+    status = np.full(len(moves), 'unmatched', dtype=object)
+    status[matched] = 'mismatched'
+    status[matched & (np.abs(moves['diff'].values) <= tolerance)] = \
+        'matched'
+    moves['status'] = status
+    moves = moves.drop(['movement', 'units'], axis=1) \
+        .sort_values(['trade', 'leg']).reset_index(drop=True)
+    used = np.zeros(len(transactions), dtype=bool)
+    used[tx[matched]] = True
+    return moves, transactions[~used]
+
+
+class Reconciliation(object):
+    """Result of reconciling trades, orders and transactions."""
+
+    def __init__(self, trades, orders, transactions, window_ms=2000,
+                 currencies=None, tolerance=1e-8):
+        """Reconcile the three sources.
+
+        :param trades: e.g. Orders.list_trades_frame or bulkload
+        :param orders: e.g. OrderTable.frame or Account.get_orders
+        :param transactions: transactions of the accounts of the traded
+            currencies, e.g. from the ledger
+        """
+        self.orders = match_orders(trades, orders, tolerance)
+        self.movements, self.unmatched_transactions = match_transactions(
+            trades, transactions, window_ms, currencies, tolerance)
+
+    def summary(self):
+        """Counts of each status."""
+        return {
+            'orders': self.orders['status'].value_counts().to_dict(),
+            'movements': self.movements['status'].value_counts().to_dict(),
+            'unmatched_transactions': len(self.unmatched_transactions),
+        }
+
+    def problems(self):
+        """Orders and movements that did not reconcile."""
+        return (self.orders[self.orders['status'] != 'ok'],
+                self.movements[self.movements['status'] != 'matched'])
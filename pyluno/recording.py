@@ -0,0 +1,165 @@
+"""Record and replay module.
+
+RecordingAdapter appends every request/response pair with its timing to a
+gzipped JSON lines file. ReplayAdapter serves such a file back, so parsing,
+frame building and strategies can be profiled on real payloads offline.
+
+Both are requests transport adapters; Luno mounts them with the 'record'
+and 'replay' options. Request headers are never recorded, so the file
+does not contain credentials.
+"""
+import gzip
+import io
+import json
+import logging
+import threading
+from time import sleep, time
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:
+    from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+except ImportError:  # pragma: no cover
+    from urllib import urlencode
+    from urlparse import parse_qsl, urlsplit, urlunsplit
+
+log = logging.getLogger(__name__)
+
+
+def _body(request):
+    body = request.body
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    return body
+
+
+def request_key(method, url, body):
+    """Key matching a replayed request to a recorded one.
+
+    The query string and form body are compared with their parameters
+    sorted, so parameter order does not matter.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, True)))
+    url = urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))
+    if body:
+        body = urlencode(sorted(parse_qsl(body, True)))
+    return (method.upper(), url, body or '')
+
+
+def read_recording(path):
+    """Yield the records of a recording file in order."""
+    with gzip.open(path, 'rt') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class RecordingAdapter(BaseAdapter):
+    """Transport adapter that records traffic passing through another."""
+
+    def __init__(self, path, adapter=None):
+        """Initialise with the recording file and the adapter to wrap.
+
+        :param path: gzipped JSON lines file, appended to
+        :param adapter: the adapter doing the actual requests, defaults to
+            a new HTTPAdapter
+        """
+        super(RecordingAdapter, self).__init__()
+        self.path = path
+        self.adapter = adapter if adapter is not None else HTTPAdapter()
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'ab')
+
+    def send(self, request, **kwargs):
+        """Send the request through the wrapped adapter and record it."""
+        start = time()
+        response = self.adapter.send(request, **kwargs)
+        content = response.content
+        record = {
+            't': start,
+            'elapsed': time() - start,
+            'method': request.method,
+            'url': request.url,
+            'body': _body(request),
+            'status': response.status_code,
+            'headers': {'Content-Type':
+                        response.headers.get('Content-Type', '')},
+            'content': content.decode(response.encoding or 'utf-8'),
+        }
+        line = (json.dumps(record, separators=(',', ':')) + '\n')
+        with self._lock:
+            self._file.write(line.encode('utf-8'))
+            self._file.flush()
+        return response
+
+    def close(self):
+        """Close the recording file and the wrapped adapter."""
+        with self._lock:
+            self._file.close()
+        self.adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that answers requests from a recording."""
+
+    def __init__(self, path, speed=None, strict=True):
+        """Load a recording.
+
+        :param path: file written by RecordingAdapter
+        :param speed: None to answer as fast as possible, or a factor on
+            the recorded response times, e.g. 1.0 for recorded speed
+        :param strict: raise for requests that were not recorded. If
+            False, recorded responses are reused once exhausted
+        """
+        super(ReplayAdapter, self).__init__()
+        self.speed = speed
+        self.strict = strict
+        self._lock = threading.Lock()
+        self.records = {}
+        self.served = 0
+        for record in read_recording(path):
+            key = request_key(record['method'], record['url'],
+                              record['body'])
+            self.records.setdefault(key, []).append(record)
+        self._next = dict((k, 0) for k in self.records)
+
+    def _take(self, key):
+        with self._lock:
+            records = self.records.get(key)
+            if not records:
+                return None
+            i = self._next[key]
+            if i >= len(records):
+                if self.strict:
+                    return None
+                i = len(records) - 1
+            self._next[key] = i + 1
+            self.served += 1
+            return records[i]
+
+    def send(self, request, **kwargs):
+        """Serve the next recorded response for the request."""
+        record = self._take(request_key(request.method, request.url,
+                                        _body(request)))
+        if record is None:
+            raise requests.exceptions.ConnectionError(
+                'No recorded response for %s %s' % (request.method,
+                                                    request.url),
+                request=request)
+        if self.speed:
+            sleep(record['elapsed'] * self.speed)
+        response = requests.Response()
+        response.status_code = record['status']
+        response.headers = CaseInsensitiveDict(record['headers'])
+        response.encoding = 'utf-8'
+        response.raw = io.BytesIO(record['content'].encode('utf-8'))
+        response.url = request.url
+        response.request = request
+        response.reason = 'Replayed'
+        return response
+
+    def close(self):
+        """Nothing to release."""
@@ -0,0 +1,205 @@
+"""Reference data module.
+
+Keeps slow-changing reference data (fee info, the account list, the pair
+list and the withdrawal beneficiaries) in a JSON file with a TTL per item.
+A client created with the referenceCache option loads the file at
+construction, so the first calls of a short-lived process are served
+locally, and refreshes items in the background before they expire.
+"""
+import logging
+import threading
+from time import time
+
+import requests
+
+from .utils import (LunoAPIError, LunoAPIRateLimitError, atomic_write_json,
+                    read_json)
+
+log = logging.getLogger(__name__)
+
+
+def _fetch_fee_info(main, pair):
+    return main.api_request('fee_info', {'pair': pair})
+
+
+def _fetch_accounts(main, arg):
+    fetched_at = time()
+    result = main.api_request('balance', None)
+    main.balance_cache.store(result, fetched_at)
+    # Only the account metadata is reference data, amounts are not
+    return [{'account_id': b['account_id'], 'asset': b['asset'],
+             'name': b.get('name')} for b in result.get('balance') or []]
+
+
+def _fetch_pairs(main, arg):
+    tickers = main.api_request('tickers', None, kind='basic')
+    return sorted(t['pair'] for t in tickers.get('tickers') or [])
+
+
+def _fetch_beneficiaries(main, arg):
+    return main.api_request('beneficiaries', None).get('beneficiaries') or []
+
+
+# Item name: (fetch function taking (main, arg), default TTL in seconds)
+ITEMS = {
+    'fee_info': (_fetch_fee_info, 3600.0),
+    'accounts': (_fetch_accounts, 3600.0),
+    'pairs': (_fetch_pairs, 86400.0),
+    'beneficiaries': (_fetch_beneficiaries, 3600.0),
+}
+
+# Calls after which an item can no longer be trusted
+INVALIDATED_BY = {
+    'accounts': 'accounts',
+}
+
+
+def lookup(main, name, arg=None):
+    """Get an item through the client's reference cache, if it has one."""
+    cache = getattr(main, 'reference', None)
+    if cache is None:
+        return ITEMS[name][0](main, arg)
+    return cache.get(name, arg)
+
+
+class ReferenceCache(object):
+    """On-disk cache of reference data with a TTL per item."""
+
+    def __init__(self, main, path, ttls=None, refresh_at=0.8):
+        """Initialise with super's main and load the cache file.
+
+        :param path: JSON file holding the cache
+        :param ttls: dict of item name to TTL in seconds, overriding ITEMS
+        :param refresh_at: fraction of the TTL after which the background
+            refresh fetches an item again
+        """
+        self.main = main
+        self.path = path
+        self.ttls = dict((name, ttl) for name, (_, ttl) in ITEMS.items())
+        self.ttls.update(ttls or {})
+        self.refresh_at = refresh_at
+        self.stats = {'hits': 0, 'misses': 0, 'refreshes': 0, 'errors': 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.entries = self._load()
+
+    @staticmethod
+    def _key(name, arg):
+        return name if arg is None else '%s/%s' % (name, arg)
+
+    def _load(self):
+        """Read the cache file, ignoring one written for another key."""
+        data = read_json(self.path, {})
+        if data.get('key') != self.main.auth[0]:
+            return {}
+        return data.get('entries') or {}
+
+    def save(self):
+        """Write the cache file.
+
+        The write happens under the lock, so an older snapshot never
+        replaces a newer one.
+        """
+        with self._lock:
+            data = {'key': self.main.auth[0], 'entries': dict(self.entries)}
+            atomic_write_json(self.path, data)
+
+    def age(self, name, arg=None):
+        """Seconds since an item was fetched, or None if never."""
+        entry = self.entries.get(self._key(name, arg))
+        return None if entry is None else time() - entry['fetched_at']
+
+    def refresh(self, name, arg=None):
+        """Fetch an item, store it and save the cache file.
+
+        :return: the fetched value
+        """
+        fetch = ITEMS[name][0]
+        value = fetch(self.main, arg)
+        with self._lock:
+            self.entries[self._key(name, arg)] = {
+                'name': name, 'arg': arg, 'value': value,
+                'fetched_at': time()}
+            self.stats['refreshes'] += 1
+        self.save()
+        return value
+
+    def get(self, name, arg=None, max_age=None):
+        """Get an item, from the cache when it is fresh enough.
+
+        :param arg: item argument, e.g. the pair of fee_info
+        :param max_age: maximum age in seconds, defaults to the item's TTL
+        """
+        max_age = self.ttls[name] if max_age is None else max_age
+        entry = self.entries.get(self._key(name, arg))
+        if entry is not None and time() - entry['fetched_at'] <= max_age:
+            self.stats['hits'] += 1
+            return entry['value']
+        self.stats['misses'] += 1
+        return self.refresh(name, arg)
+
+    def invalidate(self, name=None):
+        """Drop one item, with all its arguments, or everything."""
+        with self._lock:
+            for key in list(self.entries):
+                if name is None or self.entries[key]['name'] == name:
+                    del self.entries[key]
+        self.save()
+
+    def on_write(self, call):
+        """Invalidate the items a write made through the client changes."""
+        for name, prefix in INVALIDATED_BY.items():
+            if call.split('/')[0] == prefix:
+                self.invalidate(name)
+
+    def refresh_due(self):
+        """Refresh, concurrently, the items past refresh_at of their TTL.
+
+        :return: number of items refreshed
+        """
+        now = time()
+        due = [(e['name'], e['arg']) for e in list(self.entries.values())
+               if now - e['fetched_at'] >
+               self.ttls[e['name']] * self.refresh_at]
+        futures = [self.main._executor.submit(self.refresh, name, arg)
+                   for name, arg in due]
+        refreshed = 0
+        for f in futures:
+            try:
+                f.result()
+                refreshed += 1
+            except (LunoAPIError, LunoAPIRateLimitError, IOError, OSError,
+                    requests.exceptions.RequestException) as e:
+                self.stats['errors'] += 1
+                log.warning('Reference data refresh failed: %s', e)
+        return refreshed
+
+    def _run(self, interval):
+        while True:
+            try:
+                self.refresh_due()
+            except Exception:
+                # Keep refreshing, a dead thread would leave the cache stale
+                self.stats['errors'] += 1
+                log.exception('Reference data refresh failed')
+            if self._stop.wait(interval):
+                return
+
+    def start(self, interval=60.0):
+        """Refresh due items in a background thread every interval seconds.
+
+        The first pass runs straight away, so items that went stale while
+        no process was running are fetched without blocking the caller.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background refresh."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,793 @@
+"""Simulated exchange module.
+
+A local stand-in for the Luno API for offline load testing. It keeps
+accounts, balances and order books in memory and matches orders with
+price-time priority. It can be driven in-process through a transport
+adapter, or over HTTP on localhost:
+
+    sim = SimulatedExchange(pairs=('XBTZAR',))
+    sim.seed_book('XBTZAR', mid=100000, step=10, levels=20, volume='1')
+
+    api = Luno(key, secret, {'maxRate': None, 'maxBurst': None})
+    sim.install(api)
+
+    server = sim.serve(port=0)
+    api = Luno(key, secret, {'scheme': 'http', 'hostname': '127.0.0.1',
+                             'port': server.server_port})
+
+Accounts are created on first use for every API key, funded with
+initial_balances. Only the endpoints used by this client are implemented.
+"""
+import base64
+import bisect
+import io
+import json
+import logging
+import random
+import threading
+from collections import deque
+from decimal import ROUND_DOWN, Decimal, InvalidOperation
+from time import sleep, time
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlsplit
+except ImportError:  # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qsl, urlsplit
+
+log = logging.getLogger(__name__)
+
+ZERO = Decimal(0)
+DAY_MS = 24 * 3600 * 1000
+MAX_LIST = 100
+VOLUME_STEP = Decimal('1e-8')
+
+
+class SimulatorError(Exception):
+    """Error returned to the client as a JSON error response."""
+
+    def __init__(self, error, error_code, status=400):
+        self.error = error
+        self.error_code = error_code
+        self.status = status
+
+
+def _now_ms():
+    return int(time() * 1000)
+
+
+def _dec(value, name):
+    try:
+        d = Decimal(str(value))
+    except (InvalidOperation, TypeError):
+        raise SimulatorError('Invalid %s' % (name,), 'ErrInvalidParameter')
+    if not d.is_finite() or d <= 0:
+        raise SimulatorError('Invalid %s' % (name,), 'ErrInvalidParameter')
+    return d
+
+
+def _fmt(d):
+    return '{:f}'.format(d.normalize()) if d else '0.00'
+
+
+class _Order(object):
+    __slots__ = ('order_id', 'key', 'pair', 'type', 'price', 'volume',
+                 'remaining', 'base', 'counter', 'fee_base', 'fee_counter',
+                 'state', 'created', 'completed', 'base_account',
+                 'counter_account', 'reserved')
+
+    def to_dict(self):
+        return {
+            'order_id': self.order_id,
+            'creation_timestamp': self.created,
+            'expiration_timestamp': 0,
+            'completed_timestamp': self.completed,
+            'type': self.type,
+            'state': self.state,
+            'limit_price': _fmt(self.price) if self.price else '0.00',
+            'limit_volume': _fmt(self.volume),
+            'base': _fmt(self.base),
+            'counter': _fmt(self.counter),
+            'fee_base': _fmt(self.fee_base),
+            'fee_counter': _fmt(self.fee_counter),
+            'pair': self.pair,
+        }
+
+
+class _Account(object):
+    __slots__ = ('account_id', 'key', 'asset', 'balance', 'reserved',
+                 'transactions')
+
+    def available(self):
+        return self.balance - self.reserved
+
+    def post(self, balance_delta, available_delta, description):
+        self.balance += balance_delta
+        self.transactions.append({
+            'row_index': len(self.transactions) + 1,
+            'timestamp': _now_ms(),
+            'balance': float(self.balance),
+            'available': float(self.available()),
+            'balance_delta': float(balance_delta),
+            'available_delta': float(available_delta),
+            'currency': self.asset,
+            'description': description,
+        })
+
+
+class _Book(object):
+    """One side of an order book: price levels of FIFO queues."""
+
+    def __init__(self, descending):
+        self.descending = descending
+        self.prices = []
+        self.levels = {}
+
+    def _sort_key(self, price):
+        return -price if self.descending else price
+
+    def add(self, order):
+        level = self.levels.get(order.price)
+        if level is None:
+            level = self.levels[order.price] = deque()
+            bisect.insort(self.prices, self._sort_key(order.price))
+        level.append(order)
+
+    def best(self):
+        if not self.prices:
+            return None
+        price = self.prices[0]
+        return -price if self.descending else price
+
+    def remove(self, order):
+        level = self.levels.get(order.price)
+        if level is None:
+            return
+        try:
+            level.remove(order)
+        except ValueError:
+            return
+        if not level:
+            self._drop(order.price)
+
+    def _drop(self, price):
+        del self.levels[price]
+        i = bisect.bisect_left(self.prices, self._sort_key(price))
+        del self.prices[i]
+
+    def depth(self, limit=None):
+        out = []
+        for key in self.prices[:limit]:
+            price = -key if self.descending else key
+            volume = sum((o.remaining for o in self.levels[price]), ZERO)
+            out.append({'price': _fmt(price), 'volume': _fmt(volume)})
+        return out
+
+
+class SimulatedExchange(object):
+    """In-memory exchange implementing the endpoints used by Luno."""
+
+    def __init__(self, pairs=('XBTZAR',), initial_balances=None,
+                 maker_fee='0', taker_fee='0.001', latency=0.0,
+                 rate_limit=None, error_rate=0.0, seed=None):
+        """Initialise the exchange.
+
+        :param pairs: currency pairs traded, e.g. ('XBTZAR', 'ETHXBT')
+        :param initial_balances: dict of asset to balance given to every
+            new API key, defaults to 10 of every asset
+        :param maker_fee: fee fraction charged to resting orders
+        :param taker_fee: fee fraction charged to incoming orders
+        :param latency: seconds added to each request, or a callable
+            returning them
+        :param rate_limit: (rate per second, burst) allowed per key before
+            answering 429, or None
+        :param error_rate: fraction of requests answered with 429 at random
+        :param seed: seed for the random 429s
+        """
+        self.pairs = tuple(pairs)
+        assets = set(p[:3] for p in pairs) | set(p[3:] for p in pairs)
+        if initial_balances is None:
+            initial_balances = dict((a, '10') for a in assets)
+        self.initial_balances = dict(
+            (a, Decimal(str(v))) for a, v in initial_balances.items())
+        self.maker_fee = Decimal(str(maker_fee))
+        self.taker_fee = Decimal(str(taker_fee))
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._buckets = {}
+        self.accounts = {}
+        self.key_accounts = {}
+        self.orders = {}
+        self.key_orders = {}
+        self.key_trades = {}
+        self.books = dict((p, (_Book(True), _Book(False))) for p in pairs)
+        self.trades = dict((p, []) for p in pairs)
+        self._volume_24h = dict((p, [deque(), ZERO]) for p in pairs)
+        self._next_id = 1
+        self.request_count = 0
+
+    # Accounts
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def _accounts_for(self, key):
+        accounts = self.key_accounts.get(key)
+        if accounts is None:
+            accounts = self.key_accounts[key] = {}
+            for asset in sorted(self.initial_balances):
+                self._open_account(key, asset)
+        return accounts
+
+    def _open_account(self, key, asset):
+        a = _Account()
+        a.account_id = str(1000000 + self._new_id())
+        a.key = key
+        a.asset = asset
+        a.balance = ZERO
+        a.reserved = ZERO
+        a.transactions = []
+        self.accounts[a.account_id] = a
+        self.key_accounts[key][asset] = a
+        amount = self.initial_balances.get(asset, ZERO)
+        if amount:
+            a.post(amount, amount, 'Simulator funding')
+        return a
+
+    def _account(self, key, asset, account_id=None):
+        accounts = self._accounts_for(key)
+        if account_id:
+            a = self.accounts.get(str(account_id))
+            if a is None or a.key != key or a.asset != asset:
+                raise SimulatorError('Account not found',
+                                     'ErrAccountNotFound')
+            return a
+        a = accounts.get(asset)
+        if a is None:
+            a = self._open_account(key, asset)
+        return a
+
+    def fund(self, key, asset, amount):
+        """Credit an amount to a key's account for an asset."""
+        with self._lock:
+            amount = Decimal(str(amount))
+            self._account(key, asset).post(amount, amount, 'Deposit')
+
+    # Matching
+
+    def _pair(self, params):
+        pair = params.get('pair') or self.pairs[0]
+        if pair not in self.books:
+            raise SimulatorError('Invalid currency pair.', 'ErrInvalidPair')
+        return pair
+
+    def _record_trade(self, pair, price, volume, is_buy, ts):
+        self.trades[pair].append({'timestamp': ts, 'price': _fmt(price),
+                                  'volume': _fmt(volume), 'is_buy': is_buy})
+        window, total = self._volume_24h[pair]
+        window.append((ts, volume))
+        self._volume_24h[pair][1] = total + volume
+
+    def _settle(self, taker, maker, price, volume, ts):
+        """Move the funds of one fill between taker and maker."""
+        counter = price * volume
+        for order, fee_rate in ((taker, self.taker_fee),
+                                (maker, self.maker_fee)):
+            base_acc = self.accounts[order.base_account]
+            counter_acc = self.accounts[order.counter_account]
+            if order.type in ('BID', 'BUY'):
+                fee = volume * fee_rate
+                if order.reserved is not None:
+                    release = volume * order.price
+                    counter_acc.reserved -= release
+                    order.reserved -= release
+                    counter_acc.post(-counter, release - counter,
+                                     'Bought %s %s' % (_fmt(volume),
+                                                       base_acc.asset))
+                else:
+                    counter_acc.post(-counter, -counter,
+                                     'Bought %s %s' % (_fmt(volume),
+                                                       base_acc.asset))
+                base_acc.post(volume - fee, volume - fee,
+                              'Bought %s %s' % (_fmt(volume),
+                                                base_acc.asset))
+                order.fee_base += fee
+            else:
+                fee = counter * fee_rate
+                if order.reserved is not None:
+                    base_acc.reserved -= volume
+                    order.reserved -= volume
+                    base_acc.post(-volume, ZERO,
+                                  'Sold %s %s' % (_fmt(volume),
+                                                  base_acc.asset))
+                else:
+                    base_acc.post(-volume, -volume,
+                                  'Sold %s %s' % (_fmt(volume),
+                                                  base_acc.asset))
+                counter_acc.post(counter - fee, counter - fee,
+                                 'Sold %s %s' % (_fmt(volume),
+                                                 base_acc.asset))
+                order.fee_counter += fee
+            order.base += volume
+            order.counter += counter
+            self.key_trades.setdefault(order.key, []).append({
+                'order_id': order.order_id,
+                'pair': order.pair,
+                'type': 'BID' if order.type in ('BID', 'BUY') else 'ASK',
+                'price': _fmt(price),
+                'volume': _fmt(volume),
+                'base': _fmt(volume),
+                'counter': _fmt(counter),
+                'fee_base': _fmt(fee) if order.type in ('BID', 'BUY')
+                else '0.00',
+                'fee_counter': '0.00' if order.type in ('BID', 'BUY')
+                else _fmt(fee),
+                'is_buy': taker.type in ('BID', 'BUY'),
+                'timestamp': ts,
+            })
+
+    def _match(self, order, budget=None):
+        """Match an incoming order against the opposite side of its book.
+
+        :param budget: counter amount to spend for a market buy
+        """
+        bids, asks = self.books[order.pair]
+        is_buy = order.type in ('BID', 'BUY')
+        book = asks if is_buy else bids
+        ts = _now_ms()
+        while book.prices:
+            price = book.best()
+            if order.price is not None and (
+                    (is_buy and price > order.price) or
+                    (not is_buy and price < order.price)):
+                break
+            level = book.levels[price]
+            maker = level[0]
+            if budget is None:
+                volume = min(maker.remaining, order.remaining)
+            else:
+                volume = min(maker.remaining, (budget / price).quantize(
+                    VOLUME_STEP, ROUND_DOWN))
+            if volume <= 0:
+                break
+            self._settle(order, maker, price, volume, ts)
+            self._record_trade(order.pair, price, volume, is_buy, ts)
+            maker.remaining -= volume
+            if budget is None:
+                order.remaining -= volume
+            else:
+                budget -= volume * price
+            if maker.remaining <= 0:
+                level.popleft()
+                maker.state = 'COMPLETE'
+                maker.completed = ts
+                if not level:
+                    book._drop(price)
+            if (budget is None and order.remaining <= 0) or \
+                    (budget is not None and budget <= 0):
+                break
+
+    def _new_order(self, key, pair, otype, price, volume, params):
+        base_asset, counter_asset = pair[:3], pair[3:]
+        o = _Order()
+        o.order_id = 'BXSIM%d' % (self._new_id(),)
+        o.key = key
+        o.pair = pair
+        o.type = otype
+        o.price = price
+        o.volume = volume
+        o.remaining = volume
+        o.base = o.counter = o.fee_base = o.fee_counter = ZERO
+        o.state = 'PENDING'
+        o.created = _now_ms()
+        o.completed = 0
+        o.base_account = self._account(
+            key, base_asset, params.get('base_account_id')).account_id
+        o.counter_account = self._account(
+            key, counter_asset, params.get('counter_account_id')).account_id
+        o.reserved = None
+        self.orders[o.order_id] = o
+        self.key_orders.setdefault(key, []).append(o)
+        return o
+
+    def _post_order(self, key, params):
+        pair = self._pair(params)
+        otype = params.get('type')
+        if otype not in ('BID', 'ASK'):
+            raise SimulatorError('Invalid order type', 'ErrInvalidType')
+        volume = _dec(params.get('volume'), 'volume')
+        price = _dec(params.get('price'), 'price')
+        base_asset, counter_asset = pair[:3], pair[3:]
+        if otype == 'BID':
+            acc = self._account(key, counter_asset,
+                                params.get('counter_account_id'))
+            needed = volume * price
+        else:
+            acc = self._account(key, base_asset,
+                                params.get('base_account_id'))
+            needed = volume
+        if acc.available() < needed:
+            raise SimulatorError('Insufficient balance',
+                                 'ErrInsufficientBalance')
+        o = self._new_order(key, pair, otype, price, volume, params)
+        acc.reserved += needed
+        o.reserved = needed
+        self._match(o)
+        if o.remaining > 0:
+            bids, asks = self.books[pair]
+            (bids if otype == 'BID' else asks).add(o)
+        else:
+            self._close(o, 'COMPLETE')
+        return {'order_id': o.order_id}
+
+    def _close(self, o, state):
+        """Finish an order and release what is left of its reservation."""
+        if o.reserved:
+            if o.type == 'BID':
+                self.accounts[o.counter_account].reserved -= o.reserved
+            else:
+                self.accounts[o.base_account].reserved -= o.reserved
+            o.reserved = ZERO
+        o.state = state
+        o.completed = _now_ms()
+
+    def _market_order(self, key, params):
+        pair = self._pair(params)
+        otype = params.get('type')
+        base_asset, counter_asset = pair[:3], pair[3:]
+        if otype == 'BUY':
+            budget = _dec(params.get('counter_volume') or
+                          params.get('volume'), 'counter_volume')
+            acc = self._account(key, counter_asset,
+                                params.get('counter_account_id'))
+            if acc.available() < budget:
+                raise SimulatorError('Insufficient balance',
+                                     'ErrInsufficientBalance')
+            o = self._new_order(key, pair, otype, None, ZERO, params)
+            self._match(o, budget)
+        elif otype == 'SELL':
+            volume = _dec(params.get('base_volume') or
+                          params.get('volume'), 'base_volume')
+            acc = self._account(key, base_asset,
+                                params.get('base_account_id'))
+            if acc.available() < volume:
+                raise SimulatorError('Insufficient balance',
+                                     'ErrInsufficientBalance')
+            o = self._new_order(key, pair, otype, None, volume, params)
+            self._match(o)
+        else:
+            raise SimulatorError('Invalid order type', 'ErrInvalidType')
+        o.volume = o.base
+        o.remaining = ZERO
+        self._close(o, 'COMPLETE')
+        return {'order_id': o.order_id}
+
+    def _stop_order(self, key, params):
+        o = self.orders.get(params.get('order_id'))
+        if o is None or o.key != key:
+            raise SimulatorError('Order not found', 'ErrOrderNotFound')
+        if o.state == 'PENDING':
+            bids, asks = self.books[o.pair]
+            (bids if o.type == 'BID' else asks).remove(o)
+            self._close(o, 'COMPLETE')
+        return {'success': True}
+
+    def seed_book(self, pair, mid, step, levels=10, volume='1',
+                  key='simulator-maker'):
+        """Place resting orders around mid from a well funded key.
+
+        :param mid: mid price
+        :param step: price distance between levels
+        :param levels: levels per side
+        :param volume: base volume per level
+        """
+        mid, step = Decimal(str(mid)), Decimal(str(step))
+        volume = Decimal(str(volume))
+        base_asset, counter_asset = pair[:3], pair[3:]
+        with self._lock:
+            self.fund(key, base_asset, volume * levels)
+            self.fund(key, counter_asset, volume * levels * mid)
+            for i in range(1, levels + 1):
+                for otype, price in (('BID', mid - step * i),
+                                     ('ASK', mid + step * i)):
+                    if price > 0:
+                        self._post_order(key, {
+                            'pair': pair, 'type': otype,
+                            'volume': volume, 'price': price})
+
+    # Read endpoints
+
+    def _ticker(self, pair):
+        bids, asks = self.books[pair]
+        window, total = self._volume_24h[pair]
+        cutoff = _now_ms() - DAY_MS
+        while window and window[0][0] < cutoff:
+            total -= window.popleft()[1]
+        self._volume_24h[pair][1] = total
+        trades = self.trades[pair]
+        bid, ask = bids.best(), asks.best()
+        return {
+            'pair': pair,
+            'timestamp': _now_ms(),
+            'bid': _fmt(bid) if bid is not None else '0.00',
+            'ask': _fmt(ask) if ask is not None else '0.00',
+            'last_trade': trades[-1]['price'] if trades else '0.00',
+            'rolling_24_hour_volume': _fmt(total),
+        }
+
+    def _orderbook(self, pair, limit=None):
+        bids, asks = self.books[pair]
+        return {'timestamp': _now_ms(), 'bids': bids.depth(limit),
+                'asks': asks.depth(limit)}
+
+    def _public_trades(self, pair, since):
+        trades = self.trades[pair]
+        out = []
+        for t in reversed(trades):
+            if since is not None and t['timestamp'] < since:
+                break
+            out.append(t)
+            if len(out) >= MAX_LIST:
+                break
+        return {'trades': out}
+
+    def _list_orders(self, key, params):
+        pair = params.get('pair')
+        state = params.get('state')
+        before = int(params.get('created_before') or 0)
+        limit = int(params.get('limit') or MAX_LIST)
+        out = []
+        for o in reversed(self.key_orders.get(key, [])):
+            if (pair and o.pair != pair) or (state and o.state != state) or \
+                    (before and o.created >= before):
+                continue
+            out.append(o.to_dict())
+            if len(out) >= limit:
+                break
+        return {'orders': out}
+
+    def _list_trades(self, key, params):
+        pair = self._pair(params)
+        since = int(params.get('since') or 0)
+        limit = int(params.get('limit') or MAX_LIST)
+        out = [t for t in self.key_trades.get(key, [])
+               if t['pair'] == pair and t['timestamp'] >= since]
+        return {'trades': out[:limit]}
+
+    def _balance(self, key):
+        out = []
+        for asset, a in sorted(self._accounts_for(key).items()):
+            out.append({'account_id': a.account_id, 'asset': asset,
+                        'balance': _fmt(a.balance),
+                        'reserved': _fmt(a.reserved),
+                        'unconfirmed': '0.00',
+                        'name': '%s Account' % (asset,)})
+        return {'balance': out}
+
+    def _transactions(self, key, account_id, params):
+        a = self.accounts.get(account_id)
+        if a is None or a.key != key:
+            raise SimulatorError('Account not found', 'ErrAccountNotFound')
+        # Like the exchange, max_row is exclusive
+        min_row = max(int(params.get('min_row') or 1), 1)
+        max_row = int(params.get('max_row') or min_row + 1000)
+        if max_row - min_row > 1000:
+            raise SimulatorError('max_row - min_row must be at most 1000',
+                                 'ErrInvalidParameter')
+        rows = a.transactions[min_row - 1:max(max_row - 1, min_row - 1)]
+        return {'id': account_id, 'transactions': rows[::-1]}
+
+    # Dispatch
+
+    def _throttled(self, key):
+        if self.error_rate and self._random.random() < self.error_rate:
+            return True
+        if self.rate_limit is None:
+            return False
+        rate, burst = self.rate_limit
+        now = time()
+        tokens, updated = self._buckets.get(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return True
+        self._buckets[key] = (tokens - 1, now)
+        return False
+
+    def handle(self, method, path, params, key=None):
+        """Answer one API request.
+
+        :param method: HTTP method
+        :param path: path below /api/1/, e.g. 'ticker'
+        :param params: dict of query and form parameters
+        :param key: API key of the caller, or None if unauthenticated
+        :return: tuple of (status code, response dict)
+        """
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            sleep(latency)
+        method = method.upper()
+        parts = path.strip('/').split('/')
+        with self._lock:
+            self.request_count += 1
+            if self._throttled(key):
+                return 429, {'error': 'Too many requests',
+                             'error_code': 'ErrTooManyRequests'}
+            try:
+                return 200, self._dispatch(method, parts, params, key)
+            except SimulatorError as e:
+                return e.status, {'error': e.error,
+                                  'error_code': e.error_code}
+
+    def _dispatch(self, method, parts, params, key):
+        call = parts[0]
+        if method == 'GET' and call == 'ticker':
+            return self._ticker(self._pair(params))
+        if method == 'GET' and call == 'tickers':
+            return {'tickers': [self._ticker(p) for p in self.pairs]}
+        if method == 'GET' and call == 'orderbook':
+            return self._orderbook(self._pair(params))
+        if method == 'GET' and call == 'orderbook_top':
+            return self._orderbook(self._pair(params), 100)
+        if method == 'GET' and call == 'trades':
+            since = params.get('since')
+            return self._public_trades(self._pair(params),
+                                       int(since) if since else None)
+        if key is None:
+            raise SimulatorError('Unauthorized', 'ErrUnauthorised', 401)
+        if method == 'POST' and call == 'postorder':
+            return self._post_order(key, params)
+        if method == 'POST' and call == 'marketorder':
+            return self._market_order(key, params)
+        if method == 'POST' and call == 'stoporder':
+            return self._stop_order(key, params)
+        if method == 'GET' and call == 'listorders':
+            return self._list_orders(key, params)
+        if method == 'GET' and call == 'orders' and len(parts) == 2:
+            o = self.orders.get(parts[1])
+            if o is None or o.key != key:
+                raise SimulatorError('Order not found', 'ErrOrderNotFound')
+            return o.to_dict()
+        if method == 'GET' and call == 'listtrades':
+            return self._list_trades(key, params)
+        if method == 'GET' and call == 'balance':
+            return self._balance(key)
+        if method == 'GET' and call == 'fee_info':
+            return {'maker_fee': _fmt(self.maker_fee),
+                    'taker_fee': _fmt(self.taker_fee),
+                    'thirty_day_volume': '0'}
+        if method == 'GET' and call == 'accounts' and len(parts) == 3 and \
+                parts[2] == 'transactions':
+            return self._transactions(key, parts[1], params)
+        raise SimulatorError('Not found', 'ErrNotFound', 404)
+
+    # Transports
+
+    def adapter(self):
+        """Transport adapter answering requests in-process."""
+        return SimulatorAdapter(self)
+
+    def install(self, main):
+        """Route all requests of a Luno instance to this exchange."""
+        # Proxy lookups from the environment cost more than the simulated
+        # request itself and do not apply here
+        main._requests_session.trust_env = False
+        main._requests_session.mount('https://', self.adapter())
+        main._requests_session.mount('http://', self.adapter())
+
+    def serve(self, host='127.0.0.1', port=0):
+        """Serve the API over HTTP from a background thread.
+
+        :param port: TCP port, 0 picks a free one
+        :return: the server; its server_port attribute is the port and
+            shutdown() stops it
+        """
+        exchange = self
+
+        class Handler(_Handler):
+            pass
+
+        Handler.exchange = exchange
+        server = _Server((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+
+def _parse_key(authorization):
+    if not authorization or not authorization.startswith('Basic '):
+        return None
+    try:
+        decoded = base64.b64decode(authorization[6:]).decode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        return None
+    key = decoded.split(':', 1)[0]
+    return key or None
+
+
+def _split_request(method, url, body, content_type):
+    parts = urlsplit(url)
+    path = parts.path
+    if path.startswith('/api/1/'):
+        path = path[len('/api/1/'):]
+    params = dict(parse_qsl(parts.query, True))
+    if body:
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        if 'json' in (content_type or ''):
+            params.update(json.loads(body))
+        else:
+            params.update(dict(parse_qsl(body, True)))
+    return path, params
+
+
+class SimulatorAdapter(BaseAdapter):
+    """Transport adapter that sends requests to a SimulatedExchange."""
+
+    def __init__(self, exchange):
+        """Initialise with the exchange to answer from."""
+        super(SimulatorAdapter, self).__init__()
+        self.exchange = exchange
+
+    def send(self, request, **kwargs):
+        """Answer the request from the exchange."""
+        path, params = _split_request(
+            request.method, request.url, request.body,
+            request.headers.get('Content-Type'))
+        status, result = self.exchange.handle(
+            request.method, path, params,
+            _parse_key(request.headers.get('Authorization')))
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(
+            {'Content-Type': 'application/json'})
+        response.encoding = 'utf-8'
+        response.raw = io.BytesIO(json.dumps(result).encode('utf-8'))
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        """Nothing to release."""
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    exchange = None
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        path, params = _split_request(self.command, self.path, body,
+                                      self.headers.get('Content-Type'))
+        status, result = self.exchange.handle(
+            self.command, path, params,
+            _parse_key(self.headers.get('Authorization')))
+        payload = json.dumps(result).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
@@ -0,0 +1,126 @@
+"""Streaming JSON module.
+
+Parses a JSON object response while it downloads and yields the items of
+its list members one at a time, so large list responses never have to be
+held in memory as a whole.
+"""
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class StreamError(ValueError):
+    """The streamed body is not the expected JSON object."""
+
+
+class _Buffer(object):
+    """Text buffer that pulls decoded chunks from an iterator on demand."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decode = codecs.getincrementaldecoder('utf-8')().decode
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """Read another chunk, return False at the end of the stream."""
+        if self.eof:
+            return False
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.eof = True
+            self.text = self.text[self.pos:] + self.decode(b'', True)
+            self.pos = 0
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self.decode(chunk)
+        # Drop what has been consumed so the buffer stays small
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.text) and \
+                    self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.more():
+                raise StreamError('Unexpected end of JSON stream')
+
+    def expect(self, chars):
+        c = self.peek()
+        if c not in chars:
+            raise StreamError('Expected %r but found %r' % (chars, c))
+        self.pos += 1
+        return c
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                if not self.more():
+                    raise StreamError('Truncated JSON value')
+                continue
+            # A number at the end of the buffer may continue in the next
+            # chunk, so only trust a value that is followed by something
+            if end == len(self.text) and self.more():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_json_items(chunks, keys, chunk_size=None, head=None):
+    """Yield the items of list members of a streamed JSON object.
+
+    :param chunks: iterable of bytes or str, e.g. response.iter_content()
+    :param keys: name, or tuple of names, of the list members to stream
+    :param chunk_size: if given, yield lists of up to this many items
+    :param head: optional dict that receives the other top level members
+    :return: generator of items, or (key, item) pairs if several keys
+        were given. Chunks never span two keys.
+    """
+    single = not isinstance(keys, (tuple, list, set, frozenset))
+    wanted = (keys,) if single else tuple(keys)
+    head = {} if head is None else head
+    buf = _Buffer(chunks)
+    buf.expect('{')
+    if buf.peek() == '}':
+        return
+    while True:
+        key = buf.value()
+        buf.expect(':')
+        if key in wanted and buf.peek() == '[':
+            buf.expect('[')
+            batch = []
+            if buf.peek() != ']':
+                while True:
+                    item = buf.value()
+                    if chunk_size is None:
+                        yield item if single else (key, item)
+                    else:
+                        batch.append(item)
+                        if len(batch) >= chunk_size:
+                            yield batch if single else (key, batch)
+                            batch = []
+                    if buf.expect(',]') == ']':
+                        break
+            else:
+                buf.expect(']')
+            if batch:
+                yield batch if single else (key, batch)
+        else:
+            head[key] = buf.value()
+            if key == 'error':
+                raise StreamError(head[key])
+        if buf.expect(',}') == '}':
+            return
@@ -1,14 +1,26 @@
 
 
 import functools
+import hashlib
 import inspect
+import json
 import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
 import traceback
 import warnings
 # class BaseClass(object):
 #     def __init__(self):
 from time import sleep, time
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
 log = logging.getLogger(__name__)
 
 
@@ -18,6 +30,17 @@ def RateLimiter(f):
     burst_count, first_burst = ([0], [0.0])
 
     def wrapper(*args, **kwargs):
+        deadline = None
+        resolve = getattr(args[0], 'current_deadline', None)
+        if resolve is not None:
+            deadline = resolve(kwargs.get('deadline'))
+            kwargs['deadline'] = deadline
+            if deadline is not None:
+                deadline.check(args[1] if len(args) > 1 else '')
+        limiter = getattr(args[0], 'rate_limiter', None)
+        if limiter is not None:
+            limiter.acquire(deadline)
+            return f(*args, **kwargs)
         max_rate = args[0].maxRate
         burst = args[0].maxBurst
         cur_time = time()
@@ -38,21 +61,163 @@ def RateLimiter(f):
             wait_time = burst*min_interval - elapsed
             if wait_time > 0:
                 log.warning('Rate limited! Waiting {:.2f}s'.format(wait_time))
-                sleep(wait_time)
+                if deadline is None:
+                    sleep(wait_time)
+                else:
+                    try:
+                        deadline.sleep(wait_time)
+                    except LunoDeadlineError:
+                        # The call was not made, leave the burst as it was
+                        burst_count[0] = burst
+                        raise
         if burst_count[0] == 1:
             first_burst[0] = time()
         return f(*args, **kwargs)
     return wrapper
 
 
+class TokenBucket(object):
+    """Token bucket of one client, independent of any other instance."""
+
+    def __init__(self, max_rate, max_burst):
+        """Initialise a full bucket.
+
+        :param max_rate: calls per second
+        :param max_burst: bucket capacity
+        """
+        self.max_rate = float(max_rate)
+        self.max_burst = float(max_burst)
+        self._tokens = self.max_burst
+        self._updated = time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time()
+        self._tokens = min(self.max_burst, self._tokens +
+                           max(now - self._updated, 0) * self.max_rate)
+        self._updated = now
+
+    def tokens(self):
+        """Number of calls that can be made right now without waiting."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self):
+        """Take a token if one is available.
+
+        :return: 0 if a token was taken, else the seconds to wait for one
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.max_rate
+
+    def acquire(self, deadline=None):
+        """Block until a token is available and take it.
+
+        :param deadline: optional Deadline; the wait is abandoned up front
+            if it would miss it
+        """
+        wait = self.try_acquire()
+        while wait > 0:
+            log.warning('Rate limited! Waiting {:.2f}s'.format(wait))
+            if deadline is None:
+                sleep(wait)
+            else:
+                deadline.sleep(wait)
+            wait = self.try_acquire()
+
+
+class SharedRateLimiter(TokenBucket):
+    """Token bucket shared by all processes on a host.
+
+    The bucket lives in a small memory mapped file that is locked with
+    flock while it is updated, so every process using the same file draws
+    from the same allowance. flock does not exclude threads sharing the
+    descriptor, so a thread lock is held around it as well.
+    """
+
+    _format = 'dd'
+
+    def __init__(self, path, max_rate, max_burst):
+        """Open or create the bucket file.
+
+        :param path: bucket file, shared by the processes
+        :param max_rate: calls per second
+        :param max_burst: bucket capacity
+        """
+        if fcntl is None:
+            raise RuntimeError('SharedRateLimiter needs fcntl (POSIX only)')
+        self.path = path
+        self.max_rate = float(max_rate)
+        self.max_burst = float(max_burst)
+        self._lock = threading.Lock()
+        size = struct.calcsize(self._format)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+                os.write(self._fd, struct.pack(
+                    self._format, self.max_burst, time()))
+            self._map = mmap.mmap(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def default_path(key):
+        """Bucket file shared by every client using the same API key."""
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(tempfile.gettempdir(),
+                            'pyluno-%s.bucket' % (digest,))
+
+    def _update(self, take):
+        """Refill the bucket, taking a token if asked and available."""
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                tokens, updated = struct.unpack_from(self._format, self._map)
+                now = time()
+                tokens = min(self.max_burst,
+                             tokens + max(now - updated, 0) * self.max_rate)
+                wait = 0.0
+                if take and tokens >= 1:
+                    tokens -= 1
+                elif take:
+                    wait = (1 - tokens) / self.max_rate
+                struct.pack_into(self._format, self._map, 0, tokens, now)
+                return tokens, wait
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def tokens(self):
+        """Number of calls that can be made right now without waiting."""
+        return self._update(False)[0]
+
+    def try_acquire(self):
+        """Take a token if one is available.
+
+        :return: 0 if a token was taken, else the seconds to wait for one
+        """
+        return self._update(True)[1]
+
+    def close(self):
+        """Release the mapping and the file."""
+        self._map.close()
+        os.close(self._fd)
+
+
 class LunoAPIError(ValueError):
     """Generic Error Class."""
 
-    def __init__(self, response):
+    def __init__(self, response, message=None):
         """Instatiate with an error response."""
         self.url = response.url
         self.code = response.status_code
-        self.message = response.text
+        self.message = response.text if message is None else message
 
     def __str__(self):
         """Return a string error message."""
@@ -73,3 +238,114 @@ class LunoAPIRateLimitError(ValueError):
         """Return a string error message."""
         return "Rate Limit Error.\nLuno request %s failed with %d: %s" % (
             self.url, self.code, self.message)
+
+
+def atomic_write_json(path, obj):
+    """Write obj as JSON to path, replacing any existing file atomically.
+
+    Each write goes through its own temporary file, so concurrent writers
+    never rename each other's files away.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               prefix=os.path.basename(path) + '.',
+                               suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(obj, f)
+        getattr(os, 'replace', os.rename)(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def read_json(path, default=None):
+    """Read JSON from path, returning default if the file does not exist."""
+    if path is None or not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+class AddressPoolEmptyError(LookupError):
+    """No unused receive address is available for an asset."""
+
+    def __init__(self, asset):
+        """Instantiate with the asset that ran out."""
+        self.asset = asset
+
+    def __str__(self):
+        """Return a string error message."""
+        return "No unused %s receive address in the pool" % (self.asset,)
+
+
+class LunoDeadlineError(ValueError):
+    """A call could not complete within its deadline."""
+
+    def __init__(self, call, needed=0.0, remaining=None):
+        """Instantiate with the call and the time it needed and had."""
+        self.call = call
+        self.needed = needed
+        self.remaining = remaining
+
+    def __str__(self):
+        """Return a string error message."""
+        return "Luno request %s would miss its deadline " \
+            "(needed %.3fs, %.3fs left)" % (
+                self.call, self.needed, self.remaining or 0.0)
+
+
+class LunoCancelledError(LunoDeadlineError):
+    """A call was cancelled through its deadline."""
+
+    def __str__(self):
+        """Return a string error message."""
+        return "Luno request %s was cancelled" % (self.call,)
+
+
+class LunoPagingError(ValueError):
+    """A page of results cannot be followed by the next one."""
+
+    def __init__(self, call, since, page_size):
+        """Instantiate with the call and the page that stalled."""
+        self.call = call
+        self.since = since
+        self.page_size = page_size
+
+    def __str__(self):
+        """Return a string error message."""
+        return "Luno request %s returned a full page of %d results all at " \
+            "timestamp %d, paging cannot move past it; use a larger " \
+            "page size" % (self.call, self.page_size, self.since)
+
+
+def next_trade_page(timestamps, since, page_size, call='listtrades'):
+    """Cursor of the trade page after one requested from since.
+
+    Trade pages are chained by timestamp: the next page starts at the
+    newest timestamp of this one, so it repeats the trades at that time
+    and the caller skips that many of them, see skip_trade_overlap.
+
+    :param timestamps: ascending timestamps in ms of the page's trades
+    :return: tuple (since, skip) of the next page, or None after the last
+    :raises LunoPagingError: if a full page does not move past since
+    """
+    if len(timestamps) < page_size:
+        return None
+    last = int(timestamps[-1])
+    if last <= since:
+        raise LunoPagingError(call, since, page_size)
+    return last, sum(1 for t in timestamps if int(t) == last)
+
+
+def skip_trade_overlap(trades, since, skip):
+    """Drop the trades a page repeats from the previous one.
+
+    :param trades: the page's trades sorted by timestamp with a stable sort
+    :param since: the timestamp the page was requested from
+    :param skip: number of trades at since already seen
+    """
+    n = 0
+    while n < min(skip, len(trades)) and int(trades[n]['timestamp']) == since:
+        n += 1
+    return trades[n:]
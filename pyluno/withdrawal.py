@@ -1,4 +1,5 @@
 """withdrawal Module."""
+from .reference import lookup
 
 
 class withdrawal(object):
@@ -8,18 +9,41 @@ class withdrawal(object):
         """Initialise with super's main."""
         self.main = main
 
-    def list_withdrawal_requests(self):
-        """Get list of withdrawal requests."""
-        trades = self.main.api_request('withdrawals')
+    def list_withdrawal_requests(self, limit=None, before_id=None):
+        """Get list of withdrawal requests, newest first.
+
+        :param limit: optional number of withdrawals listed
+        :param before_id: optional cursor, list withdrawals older than
+            this id
+        """
+        params = None
+        if limit is not None or before_id is not None:
+            params = {'limit': limit, 'before_id': before_id}
+        trades = self.main.api_request('withdrawals', params)
         return trades
 
-    def create_withdrawal_request(self, wtype, amount, beneficiary_id=None):
-        """Create a new withdrawal request."""
+    def list_beneficiaries(self):
+        """Get the list of withdrawal beneficiaries.
+
+        Served from the reference data cache when the client has one.
+        """
+        return lookup(self.main, 'beneficiaries')
+
+    def create_withdrawal_request(self, wtype, amount, beneficiary_id=None,
+                                  external_id=None):
+        """Create a new withdrawal request.
+
+        :param external_id: optional unique id; the exchange rejects a
+            second withdrawal with the same id, so a retry cannot withdraw
+            twice
+        """
         data = {
             'type': wtype,
             'amount': amount,
             'beneficiary_id': beneficiary_id,
         }
+        if external_id is not None:
+            data['external_id'] = external_id
         result = self.main.api_request('withdrawals',
                                        data=data, http_call='post')
         return result
@@ -0,0 +1,50 @@
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+
+from pyluno.api import Luno
+from pyluno.bookrecorder import BookRecorder
+
+
+def runRecorder():
+    parser = argparse.ArgumentParser(
+        description='Record Luno order books with delta compression')
+    parser.add_argument('pairs', nargs='+', help='pairs to record, e.g. '
+                        'XBTZAR ETHXBT')
+    parser.add_argument('--dir', default='books',
+                        help='output directory (default: books)')
+    parser.add_argument('--interval', type=float, default=5.0,
+                        help='seconds between snapshots (default: 5)')
+    parser.add_argument('--keyframe-every', type=int, default=300,
+                        help='store every n-th snapshot in full '
+                        '(default: 300)')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='stop after this many seconds')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    user = os.environ.get('BITX_KEY', '')
+    password = os.environ.get('BITX_SECRET', '')
+    # One snapshot per pair per interval, with some room for retries
+    api = Luno(user, password, {'maxRate': 2.0 * len(args.pairs) /
+                                args.interval,
+                                'maxBurst': len(args.pairs)})
+    recorder = BookRecorder(api, args.dir, args.pairs, args.keyframe_every,
+                            kind='auth' if user else 'basic')
+    try:
+        recorder.run(args.interval, args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.stop()
+        api.close()
+    print('Recorded %d snapshots, %d errors' % (
+        recorder.stats['snapshots'], recorder.stats['errors']))
+    for pair, writer in sorted(recorder.writers.items()):
+        print('%s: %d bytes' % (pair, writer.bytes))
+
+
+if __name__ == '__main__':
+    runRecorder()
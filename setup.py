@@ -9,12 +9,13 @@ setup(
     description='A Luno API for Python',
     author='Cayle Sharrock/Grant Stephens',
     author_email='grant@stephens.co.za',
-    scripts=['demo.py'],
+    scripts=['demo.py', 'record_books.py'],
     install_requires=[
         'futures>=3.0.3',
         'nose>=1.3.7',
         'requests>=2.8.1',
         'pandas>=0.17.0',
+        'numpy>=1.9.0',
     ],
     license='MIT',
     url='https://github.com/grantstephens/pyluno',
@@ -40,5 +41,6 @@ setup(
     test_suite='tests',
     extras_require={
         'test':  ['requests-mock>=0.7.0', 'nose'],
+        'export': ['pyarrow'],
         }
 )
@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+from pyluno.arbitrage import ArbitrageScanner, floyd_warshall, split_pair
+
+
+def ticker(pair, bid, ask):
+    return {'pair': pair, 'bid': str(bid), 'ask': str(ask),
+            'last_trade': str(bid), 'rolling_24_hour_volume': '1.0',
+            'timestamp': 1448572753005}
+
+
+TICKERS = {'tickers': [ticker('XBTZAR', 1000, 1001),
+                       ticker('ETHXBT', 0.1, 0.1001),
+                       ticker('ETHZAR', 99, 100),
+                       ticker('USDCZAR', 18, 18.1),
+                       ticker('XBTNGN', 0, 0)]}
+
+
+class TestArbitrageScanner(unittest.TestCase):
+
+    def testSplitPair(self):
+        self.assertEqual(split_pair('XBTZAR'), ('XBT', 'ZAR'))
+        self.assertEqual(split_pair('ETHXBT'), ('ETH', 'XBT'))
+        self.assertEqual(split_pair('USDCZAR'), ('USDC', 'ZAR'))
+        self.assertEqual(split_pair('XBTUSDC'), ('XBT', 'USDC'))
+
+    def testMatricesAndBestPath(self):
+        scanner = ArbitrageScanner()
+        scanner.update(TICKERS)
+        self.assertEqual(scanner.names, ['ETH', 'NGN', 'USDC', 'XBT', 'ZAR'])
+        i, j = scanner.index['XBT'], scanner.index['ZAR']
+        self.assertEqual(scanner.bid[i, j], 1000)
+        self.assertTrue(np.isnan(scanner.bid[j, i]))
+        self.assertEqual(scanner.triangles().shape[0], 0)
+        self.assertEqual(scanner.negative_cycles(), [])
+        rate, path = scanner.best_path('USDC', 'ETH')
+        self.assertEqual(path, ['USDC', 'ZAR', 'ETH'])
+        self.assertAlmostEqual(rate, 18 / 100.)
+        self.assertEqual(scanner.best_path('USDC', 'NGN'), (0.0, []))
+
+    def testCyclesAndIncrementalUpdate(self):
+        scanner = ArbitrageScanner(fee=0.001)
+        scanner.update(TICKERS)
+        scanner.best_rates()
+        changed = scanner.update([ticker('ETHZAR', 110, 111),
+                                  ticker('XBTZAR', 1000, 1001)])
+        self.assertEqual(changed, ['ETHZAR'])
+        profit = 110 / 1001. / 0.1001 * 0.999 ** 3 - 1
+        df = scanner.triangles()
+        self.assertEqual(list(df.iloc[0][['a', 'b', 'c']]),
+                         ['ETH', 'ZAR', 'XBT'])
+        self.assertAlmostEqual(df.profit.iloc[0], profit)
+        cycles = scanner.negative_cycles()
+        self.assertAlmostEqual(cycles[0][0], profit)
+        self.assertEqual(cycles[0][1], ['ETH', 'ZAR', 'XBT', 'ETH'])
+        self.assertEqual(scanner.triangles(min_profit=0.1).shape[0], 0)
+        # The ETHZAR ask got worse, so the paths were recomputed
+        self.assertEqual(scanner.incremental_updates, 0)
+        self.assertEqual(scanner.full_updates, 2)
+
+    def testIncrementalMatchesFull(self):
+        scanner = ArbitrageScanner(fee=0.001)
+        scanner.update(TICKERS)
+        scanner.best_rates()
+        scanner.update([ticker('ETHXBT', 0.1, 0.1000001),
+                        ticker('USDCZAR', 18.05, 18.1)])
+        self.assertEqual(scanner.incremental_updates, 1)
+        dist, _ = floyd_warshall(scanner.weights)
+        np.testing.assert_allclose(scanner._dist, dist)
+        # A worse rate falls back to a full recomputation
+        scanner.update([ticker('XBTZAR', 900, 1100)])
+        dist, _ = floyd_warshall(scanner.weights)
+        np.testing.assert_allclose(scanner.best_rates().values,
+                                   np.exp(-dist))
+        self.assertEqual(scanner.full_updates, 2)
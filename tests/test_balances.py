@@ -0,0 +1,83 @@
+import unittest
+from time import time
+
+import requests_mock
+
+from pyluno.api import Luno
+
+BALANCE = {
+    "balance": [
+        {"account_id": "1224342323", "asset": "XBT", "balance": "1.00",
+         "reserved": "0.10", "unconfirmed": "0.00", "name": "XBT Account"},
+        {"account_id": "2997473", "asset": "ZAR", "balance": "1000.00",
+         "reserved": "0.00", "unconfirmed": "0.00", "name": "ZAR Account"}
+    ]
+}
+
+
+class TestBalanceCache(unittest.TestCase):
+
+    def setUp(self):
+        options = {
+            'hostname': 'api.dummy.com',
+            'maxRate': None,
+            'maxBurst': None,
+            'balanceMaxAge': 60,
+        }
+        self.api = Luno('mykey', 'mysecret', options)
+
+    @requests_mock.Mocker()
+    def testCacheServesWithinMaxAge(self, m):
+        m.get('https://api.dummy.com/api/1/balance', json=BALANCE)
+        self.api.account.get_balance()
+        self.assertEqual(self.api.account.get_available(asset='XBT'), 0.9)
+        self.assertEqual(m.call_count, 1)
+        self.api.account.get_balance(max_age=0)
+        self.assertEqual(m.call_count, 2)
+
+    @requests_mock.Mocker()
+    def testLimitOrderReservesLocally(self, m):
+        m.get('https://api.dummy.com/api/1/balance', json=BALANCE)
+        m.post('https://api.dummy.com/api/1/postorder',
+               json={'order_id': 'BXMC2CJ7HNB88U4'})
+        self.api.account.get_balance()
+        self.api.orders.create_limit_order('buy', 0.5, 1000,
+                                           '1224342323', '2997473')
+        self.assertEqual(self.api.account.get_available('2997473'), 500.0)
+        self.assertEqual(m.call_count, 2)
+
+    @requests_mock.Mocker()
+    def testTransferInvalidates(self, m):
+        m.get('https://api.dummy.com/api/1/balance', json=BALANCE)
+        m.post('https://api.dummy.com/api/1/transfers', json={'id': '1'})
+        self.api.account.get_balance()
+        self.api.account.create_transfer(1, 'XBT', '', '1', '2')
+        self.api.account.get_balance(max_age=60)
+        self.assertEqual(m.call_count, 3)
+
+    @requests_mock.Mocker()
+    def testQuoteExecutionInvalidates(self, m):
+        m.get('https://api.dummy.com/api/1/balance', json=BALANCE)
+        m.put('https://api.dummy.com/api/1/quotes', json={'id': '1'})
+        self.api.account.get_balance()
+        self.api.quotes.execute_quote('1')
+        self.api.account.get_balance(max_age=60)
+        self.assertEqual(m.call_count, 3)
+
+    @requests_mock.Mocker()
+    def testQuoteCreationKeepsCache(self, m):
+        m.get('https://api.dummy.com/api/1/balance', json=BALANCE)
+        m.post('https://api.dummy.com/api/1/quotes', json={'id': '1'})
+        self.api.account.get_balance()
+        self.api.quotes.get_quote('BUY', 0.1, 'XBTZAR')
+        self.api.account.get_balance(max_age=60)
+        self.assertEqual(m.call_count, 2)
+
+    def testFetchStartedBeforeInvalidationIsIgnored(self):
+        cache = self.api.balance_cache
+        fetched_at = time()
+        cache.invalidate()
+        cache.store(BALANCE, fetched_at)
+        self.assertIsNone(cache.age())
+        cache.store(BALANCE)
+        self.assertIsNotNone(cache.age())
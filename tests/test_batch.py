@@ -0,0 +1,186 @@
+import json
+import unittest
+from time import time
+
+import requests
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.batch import BatchExecutor
+
+try:
+    from urllib.parse import parse_qs
+except ImportError:  # pragma: no cover
+    from urlparse import parse_qs
+
+BASE = 'https://api.dummy.com/api/1/'
+
+
+class FakeTreasury(object):
+    """Transfers and withdrawals that honour idempotency keys."""
+
+    def __init__(self, m, drop_first_create=False, hidden_lists=0):
+        self.transfers = {}
+        self.withdrawals = {}
+        self.creates = 0
+        self.started = int(time() * 1000)
+        self.drop_first_create = drop_first_create
+        # Listings that do not show new items yet
+        self.hidden_lists = hidden_lists
+        m.post(BASE + 'transfers', json=self.create_transfer)
+        m.put(requests_mock.ANY, json=self.confirm)
+        m.get(BASE + 'transfers/', json=self.list_transfers)
+        m.get(BASE + 'withdrawals', json=self.withdrawal_status)
+        m.post(BASE + 'withdrawals', json=self.create_withdrawal)
+
+    def list_transfers(self, request, context):
+        if self.hidden_lists:
+            self.hidden_lists -= 1
+            return {'transfers': []}
+        transfers = sorted(self.transfers.values(),
+                           key=lambda t: -t['created_at'])
+        if 'before' in request.qs:
+            before = int(request.qs['before'][0])
+            transfers = [t for t in transfers if t['created_at'] < before]
+        if 'limit' in request.qs:
+            transfers = transfers[:int(request.qs['limit'][0])]
+        return {'transfers': transfers}
+
+    def add_transfer(self, key, amount='1'):
+        tid = 'T%d' % (len(self.transfers) + 1)
+        self.transfers[tid] = {'id': tid, 'state': 'AWAITING_CONFIRMATION',
+                               'client_transfer_id': key, 'amount': amount,
+                               'created_at': self.started +
+                               len(self.transfers)}
+        return self.transfers[tid]
+
+    def create_transfer(self, request, context):
+        data = dict((k, v[0]) for k, v in parse_qs(request.body).items())
+        self.creates += 1
+        key = data['client_transfer_id']
+        if any(t['client_transfer_id'] == key
+               for t in self.transfers.values()):
+            context.status_code = 409
+            return {'error': 'duplicate client_transfer_id'}
+        transfer = self.add_transfer(key, data['amount'])
+        if self.drop_first_create and self.creates == 1:
+            raise requests.exceptions.ConnectionError('connection reset')
+        return transfer
+
+    def confirm(self, request, context):
+        tid = request.path.rsplit('/', 1)[-1].upper()
+        self.transfers[tid]['state'] = 'COMPLETE'
+        return self.transfers[tid]
+
+    def create_withdrawal(self, request, context):
+        data = dict((k, v[0]) for k, v in parse_qs(request.body).items())
+        if any(w['external_id'] == data['external_id']
+               for w in self.withdrawals.values()):
+            context.status_code = 409
+            return {'error': 'duplicate external_id'}
+        wid = 'W%d' % (len(self.withdrawals) + 1)
+        self.withdrawals[wid] = {'id': wid, 'status': 'PENDING',
+                                 'external_id': data['external_id'],
+                                 'created_at': int(time() * 1000),
+                                 'polls': 0}
+        return self.withdrawals[wid]
+
+    def withdrawal_status(self, request, context):
+        if 'id' not in request.qs:
+            withdrawals = sorted(self.withdrawals.values(),
+                                 key=lambda w: -int(w['id'][1:]))
+            if 'before_id' in request.qs:
+                before = int(request.qs['before_id'][0][1:])
+                withdrawals = [w for w in withdrawals
+                               if int(w['id'][1:]) < before]
+            if 'limit' in request.qs:
+                withdrawals = withdrawals[:int(request.qs['limit'][0])]
+            return {'withdrawals': withdrawals}
+        w = self.withdrawals[request.qs['id'][0].upper()]
+        w['polls'] += 1
+        if w['polls'] >= 2:
+            w['status'] = 'COMPLETED'
+        return w
+
+
+ITEMS = [{'type': 'transfer', 'amount': '1.5', 'currency': 'ZAR',
+          'note': 'rebalance', 'source_account_id': '1',
+          'target_account_id': '2'},
+         {'type': 'withdrawal', 'wtype': 'ZAR_EFT', 'amount': '100',
+          'beneficiary_id': '7'},
+         {'type': 'transfer', 'amount': '2', 'currency': 'XBT',
+          'source_account_id': '3', 'target_account_id': '4'}]
+
+
+class TestBatchExecutor(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hostname': 'api.dummy.com',
+                   'maxRate': None, 'maxBurst': None}
+        self.api = Luno('mykey', 'mysecret', options)
+        self.batch = BatchExecutor(self.api, backoff=0, poll_interval=0)
+
+    @requests_mock.Mocker()
+    def testPipelines(self, m):
+        treasury = FakeTreasury(m)
+        results = self.batch.run(ITEMS, batch_id='eod')
+        self.assertEqual([r['status'] for r in results], ['done'] * 3)
+        self.assertEqual([r['state'] for r in results],
+                         ['COMPLETE', 'COMPLETED', 'COMPLETE'])
+        self.assertEqual(sorted(treasury.transfers), ['T1', 'T2'])
+        keys = [r['key'] for r in results]
+        self.assertEqual(len(set(keys)), 3)
+        self.assertTrue(all(k.startswith('eod-') for k in keys))
+        df = BatchExecutor.frame(results)
+        self.assertTrue((df.elapsed >= 0).all())
+        # Running the batch again finds the items instead of creating them
+        for i in range(5):
+            treasury.add_transfer('other%d' % i)
+        batch = BatchExecutor(self.api, backoff=0, poll_interval=0,
+                              page_size=2)
+        rerun = batch.run(ITEMS, batch_id='eod')
+        self.assertEqual([r['status'] for r in rerun], ['done'] * 3)
+        self.assertEqual([r['id'] for r in rerun],
+                         [r['id'] for r in results])
+        self.assertEqual(len(treasury.transfers), 7)
+        self.assertEqual(len(treasury.withdrawals), 1)
+
+    @requests_mock.Mocker()
+    def testRetryFindsCreatedItem(self, m):
+        treasury = FakeTreasury(m, drop_first_create=True)
+        result = self.batch.run(ITEMS[:1])[0]
+        self.assertEqual(result['status'], 'done')
+        self.assertEqual(result['id'], 'T1')
+        self.assertEqual(result['attempts'], 1)
+        self.assertEqual(treasury.creates, 1)
+        self.assertEqual(len(treasury.transfers), 1)
+
+    @requests_mock.Mocker()
+    def testRetryFindsItemListedLate(self, m):
+        treasury = FakeTreasury(m, drop_first_create=True, hidden_lists=1)
+        result = self.batch.run(ITEMS[:1])[0]
+        self.assertEqual(result['status'], 'done')
+        self.assertEqual(result['id'], 'T1')
+        self.assertEqual(result['attempts'], 2)
+        self.assertEqual(len(treasury.transfers), 1)
+
+    @requests_mock.Mocker()
+    def testLookupStopsAtLookbackAndPageCap(self, m):
+        treasury = FakeTreasury(m)
+        for i in range(10):
+            treasury.add_transfer('old%d' % i)['created_at'] -= 86400000
+        for i in range(3):
+            treasury.add_transfer('new%d' % i)
+        batch = BatchExecutor(self.api, page_size=2, max_pages=5)
+        since = treasury.started - 3600000
+        # Pages overlap by one transfer, the third reaches an old one
+        self.assertIsNone(batch._find_transfer('missing', since))
+        self.assertEqual(m.call_count, 3)
+        self.assertIsNone(batch._find_transfer('missing'))
+        self.assertEqual(m.call_count, 8)
+        self.assertEqual(batch._find_transfer('new1', since)['id'], 'T12')
+
+    def testUnknownType(self):
+        result = self.batch.run([{'type': 'loan'}])[0]
+        self.assertEqual(result['status'], 'failed')
+        self.assertIn('loan', result['error'])
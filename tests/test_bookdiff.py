@@ -0,0 +1,81 @@
+import random
+import unittest
+from time import time
+
+import numpy as np
+
+from pyluno.bookdiff import (ADDED, REMOVED, RESIZED, BookDiffer,
+                             aggregate, diff_side)
+
+
+def level(price, volume):
+    return {'price': '%.2f' % price, 'volume': '%.8f' % volume}
+
+
+OLD = {'timestamp': 1, 'bids': [level(100, 1), level(99, 2), level(99, 1),
+                                level(98, 5)],
+       'asks': [level(101, 1), level(102, 2)]}
+NEW = {'timestamp': 2, 'bids': [level(100.05, 0.5), level(100, 1),
+                                level(99, 1), level(90, 4)],
+       'asks': [level(102, 2)]}
+
+
+class TestBookDiff(unittest.TestCase):
+
+    def testDiffSide(self):
+        price, volume = aggregate(np.array([3., 1., 3.]),
+                                  np.array([1., 2., 0.5]))
+        np.testing.assert_array_equal(price, [1, 3])
+        np.testing.assert_array_equal(volume, [2, 1.5])
+        diff = diff_side(price, volume, np.array([2., 3.]),
+                         np.array([1., 2.]))
+        np.testing.assert_array_equal(diff['price'], [1, 2, 3])
+        np.testing.assert_array_equal(diff['kind'],
+                                      [REMOVED, ADDED, RESIZED])
+        np.testing.assert_array_equal(diff['change'], [-2, 1, 0.5])
+
+    def testUpdate(self):
+        differ = BookDiffer(near_bps=50)
+        self.assertIsNone(differ.update(OLD))
+        delta = differ.update(NEW)
+        self.assertEqual((delta['since'], delta['timestamp']), (1, 2))
+        np.testing.assert_allclose(delta['bids'], [[90, 4], [98, 0],
+                                                   [99, 1], [100.05, 0.5]])
+        np.testing.assert_allclose(delta['asks'], [[101, 0]])
+        stats = delta['bids_stats']
+        self.assertEqual((stats['added'], stats['removed'],
+                          stats['resized']), (2, 1, 1))
+        self.assertAlmostEqual(stats['volume_added'], 4.5)
+        self.assertAlmostEqual(stats['volume_removed'], 7)
+        # Only levels within 50bps of 100 or 100.05 count as near
+        self.assertAlmostEqual(stats['near_volume_added'], 0.5)
+        self.assertAlmostEqual(stats['near_volume_removed'], 0)
+        self.assertEqual(delta['best_bid'], (100.0, 100.05))
+        self.assertEqual(delta['best_ask'], (101.0, 102.0))
+        self.assertAlmostEqual(delta['asks_stats']['near_volume_removed'], 1)
+
+    def testApplyRebuildsDeepBooks(self):
+        rnd = random.Random(3)
+        book = dict((1000 + i * 0.01, 1.0) for i in range(5000))
+        snapshots = []
+        for t in range(20):
+            for _ in range(200):
+                price = round(1000 + rnd.randint(0, 6000) * 0.01, 2)
+                if rnd.random() < 0.3:
+                    book.pop(price, None)
+                else:
+                    book[price] = rnd.randint(1, 100) / 10.
+            snapshots.append({'timestamp': t, 'bids': [
+                level(p, v) for p, v in book.items()], 'asks': []})
+        differ = BookDiffer()
+        differ.update(snapshots[0])
+        sides = BookDiffer.arrays(snapshots[0])
+        start = time()
+        for snapshot in snapshots[1:]:
+            sides = BookDiffer.apply(sides, differ.update(snapshot))
+        self.assertLess(time() - start, 5)
+        expected = BookDiffer.arrays(snapshots[-1])
+        np.testing.assert_array_equal(sides['bids'][0],
+                                      expected['bids'][0])
+        np.testing.assert_array_equal(sides['bids'][1],
+                                      expected['bids'][1])
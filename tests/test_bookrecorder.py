@@ -0,0 +1,137 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import requests
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.bookrecorder import BookReader, BookRecorder, BookWriter
+
+
+def levels(book):
+    return [{'price': '%.2f' % p, 'volume': '%.8f' % v}
+            for p, v in sorted(book.items())]
+
+
+def random_books(n, seed=1):
+    rnd = random.Random(seed)
+    bids = dict((1000 - i, 0.5) for i in range(50))
+    asks = dict((1001 + i, 0.5) for i in range(50))
+    books = []
+    for t in range(n):
+        for book in (bids, asks):
+            price = rnd.choice(list(book))
+            if rnd.random() < 0.2 and len(book) > 1:
+                del book[price]
+            else:
+                book[price] = round(rnd.random(), 8)
+        books.append((1000 * t, dict(bids), dict(asks)))
+    return books
+
+
+class TestBookRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'XBTZAR.books')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assertBook(self, found, expected):
+        ts, bids, asks = found
+        self.assertEqual(ts, expected[0])
+        np.testing.assert_allclose(
+            bids, sorted(expected[1].items(), reverse=True))
+        np.testing.assert_allclose(asks, sorted(expected[2].items()))
+
+    def testRoundTripAndSeek(self):
+        books = random_books(100)
+        writer = BookWriter(self.path, keyframe_every=30)
+        for ts, bids, asks in books:
+            writer.write(ts, levels(bids), levels(asks))
+        writer.close()
+        full = writer.bytes
+        reader = BookReader(self.path)
+        self.assertEqual(reader.keyframe_times, [0, 30000, 60000, 90000])
+        for t in (0, 29000, 30000, 45500, 99000, 150000):
+            self.assertBook(reader.book_at(t), books[min(t // 1000, 99)])
+        self.assertIsNone(reader.book_at(-1))
+        replayed = list(reader.books(42000, 45000))
+        self.assertEqual([b[0] for b in replayed], [42000, 43000, 44000])
+        self.assertBook(replayed[-1], books[44])
+        reader.close()
+        # Deltas are far smaller than full books
+        writer = BookWriter(os.path.join(self.tmp, 'full'), keyframe_every=1)
+        for ts, bids, asks in books:
+            writer.write(ts, levels(bids), levels(asks))
+        writer.close()
+        self.assertLess(full * 3, writer.bytes)
+
+    def testIncompleteFrameAndMissingIndex(self):
+        books = random_books(10)
+        writer = BookWriter(self.path, keyframe_every=4)
+        for ts, bids, asks in books[:6]:
+            writer.write(ts, levels(bids), levels(asks))
+        writer.close()
+        with open(self.path, 'ab') as f:
+            f.write(b'\x01partial')
+        writer = BookWriter(self.path, keyframe_every=4)
+        for ts, bids, asks in books[6:]:
+            writer.write(ts, levels(bids), levels(asks))
+        writer.close()
+        os.remove(self.path + '.idx')
+        reader = BookReader(self.path)
+        self.assertEqual(reader.keyframe_times, [0, 4000, 6000])
+        self.assertEqual(len(list(reader.books())), 10)
+        self.assertBook(reader.book_at(9000), books[9])
+        self.assertBook(reader.book_at(5000), books[5])
+        reader.close()
+
+    def testTruncatedKeyframe(self):
+        ts, bids, asks = random_books(1)[0]
+        writer = BookWriter(self.path)
+        writer.write(ts, levels(bids), levels(asks))
+        writer.close()
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        reader = BookReader(self.path)
+        self.assertEqual(reader.keyframe_times, [0])
+        self.assertIsNone(reader.book_at(0))
+        reader.close()
+
+    @requests_mock.Mocker()
+    def testRecorderPollsPairs(self, m):
+        for pair in ('XBTZAR', 'ETHXBT'):
+            m.get('https://api.dummy.com/api/1/orderbook?pair=' + pair,
+                  json={'timestamp': 1000, 'bids': [
+                      {'price': '10.00', 'volume': '1.0'},
+                      {'price': '10.00', 'volume': '0.5'}],
+                      'asks': [{'price': '11.00', 'volume': '2.0'}]})
+        api = Luno('mykey', 'mysecret', {'hostname': 'api.dummy.com',
+                                         'maxRate': None, 'maxBurst': None})
+        recorder = BookRecorder(api, self.tmp, ['XBTZAR', 'ETHXBT'])
+        self.assertEqual(recorder.poll(), 2)
+        recorder.stop()
+        reader = BookReader(os.path.join(self.tmp, 'ETHXBT.books'))
+        ts, bids, asks = reader.book_at(1000)
+        np.testing.assert_allclose(bids, [[10.0, 1.5]])
+        np.testing.assert_allclose(asks, [[11.0, 2.0]])
+        reader.close()
+
+    @requests_mock.Mocker()
+    def testRecorderSurvivesNetworkErrors(self, m):
+        m.get('https://api.dummy.com/api/1/orderbook?pair=XBTZAR',
+              exc=requests.exceptions.ConnectionError)
+        m.get('https://api.dummy.com/api/1/orderbook?pair=ETHXBT',
+              json={'timestamp': 1000, 'bids': [], 'asks': []})
+        api = Luno('mykey', 'mysecret', {'hostname': 'api.dummy.com',
+                                         'maxRate': None, 'maxBurst': None})
+        recorder = BookRecorder(api, self.tmp, ['XBTZAR', 'ETHXBT'])
+        self.assertEqual(recorder.poll(), 1)
+        self.assertEqual(recorder.stats['errors'], 1)
+        recorder.stop()
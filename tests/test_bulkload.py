@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.bulkload import load_trades, load_transactions
+from pyluno.utils import LunoPagingError
+
+
+def tx(i):
+    return {"row_index": i, "timestamp": 1429908701000 + i,
+            "balance": 0.1 * i, "available": 0.1 * i,
+            "balance_delta": 0.1, "available_delta": 0.1,
+            "currency": "XBT", "description": "Bought 0.1 BTC"}
+
+
+def trade(i, pair='XBTZAR'):
+    return {"base": "0.1", "counter": "100", "fee_base": "0.00",
+            "fee_counter": "0.01", "is_buy": i % 2 == 0,
+            "order_id": "BX%d" % i, "pair": pair, "price": "1000",
+            "timestamp": 1000 + i // 2, "type": "BID", "volume": "0.1"}
+
+
+class TestBulkLoad(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hostname': 'api.dummy.com',
+                   'maxRate': None, 'maxBurst': None}
+        self.api = Luno('mykey', 'mysecret', options)
+
+    @requests_mock.Mocker()
+    def testTransactions(self, m):
+        rows = [tx(i) for i in range(1, 12)]
+
+        def page(request, context):
+            lo = int(request.qs['min_row'][0])
+            hi = int(request.qs['max_row'][0])
+            return {'id': '1', 'transactions': [
+                r for r in rows if lo <= r['row_index'] < hi]}
+
+        m.get('https://api.dummy.com/api/1/accounts/1/transactions',
+              json=page)
+        for processes in (0, 2):
+            df = load_transactions(self.api, 1, page_size=3, threads=3,
+                                   processes=processes)
+            self.assertEqual(list(df.row_index), list(range(1, 12)))
+            self.assertEqual(df.balance.dtype, np.float64)
+            self.assertAlmostEqual(df.balance.iloc[-1], 1.1)
+            self.assertEqual(df.index[0].value // 10 ** 6, 1429908701001)
+        df = load_transactions(self.api, 1, min_row=4, max_row=5,
+                               processes=0)
+        self.assertEqual(list(df.row_index), [4, 5])
+        rows[:] = []
+        self.assertEqual(len(load_transactions(self.api, 1, processes=0)),
+                         0)
+
+    @requests_mock.Mocker()
+    def testTrades(self, m):
+        trades = {'XBTZAR': [trade(i) for i in range(7)],
+                  'ETHXBT': [trade(i, 'ETHXBT') for i in range(2)]}
+
+        def page(request, context):
+            since = int(request.qs['since'][0])
+            limit = int(request.qs['limit'][0])
+            pair = request.qs['pair'][0].upper()
+            return {'trades': [t for t in trades[pair]
+                               if t['timestamp'] >= since][:limit]}
+
+        m.get('https://api.dummy.com/api/1/listtrades', json=page)
+        df = load_trades(self.api, ['XBTZAR', 'ETHXBT'], page_size=3,
+                         processes=2)
+        self.assertEqual(len(df), 9)
+        xbt = df[df.pair == 'XBTZAR']
+        self.assertEqual(list(xbt.order_id), ['BX%d' % i for i in range(7)])
+        self.assertEqual(list(xbt.is_buy[:2]), [True, False])
+        self.assertAlmostEqual(df.fee_counter.sum(), 0.09)
+        self.assertTrue(df.index.is_monotonic_increasing)
+        self.assertEqual(len(load_trades(self.api, since=5000,
+                                         processes=0)), 0)
+
+    @requests_mock.Mocker()
+    def testTradesSharingTimestamps(self, m):
+        # Identical fills of one order in one ms are all kept
+        trades = [dict(trade(i), order_id='BX1') for i in range(7)]
+
+        def page(request, context):
+            since = int(request.qs['since'][0])
+            limit = int(request.qs['limit'][0])
+            return {'trades': [t for t in trades
+                               if t['timestamp'] >= since][:limit]}
+
+        m.get('https://api.dummy.com/api/1/listtrades', json=page)
+        df = load_trades(self.api, page_size=3, processes=0)
+        self.assertEqual(len(df), 7)
+        trades.extend(dict(trade(8), timestamp=1004) for _ in range(3))
+        with self.assertRaises(LunoPagingError):
+            load_trades(self.api, page_size=3, processes=0)
@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from pyluno.candles import CandleAggregator, CandleSeries
+
+
+class TestCandles(unittest.TestCase):
+
+    def testSeriesOHLCV(self):
+        s = CandleSeries(60, size=3)
+        s.update(0, 10.0, 1.0)
+        s.update(1000, 12.0, 1.0)
+        s.update(2000, 9.0, 2.0)
+        s.update(60000, 11.0, 1.0)
+        view = s.latest()
+        self.assertListEqual(list(view['start']), [0, 60000])
+        self.assertListEqual(list(view['open']), [10.0, 11.0])
+        self.assertListEqual(list(view['high']), [12.0, 11.0])
+        self.assertListEqual(list(view['low']), [9.0, 11.0])
+        self.assertListEqual(list(view['close']), [9.0, 11.0])
+        self.assertListEqual(list(view['volume']), [4.0, 1.0])
+        self.assertAlmostEqual(view['vwap'][0], 40.0 / 4.0)
+
+    def testRingWrapAndViews(self):
+        s = CandleSeries(1, size=3)
+        for i in range(5):
+            s.update(i * 1000, float(i), 1.0)
+        view = s.latest(3)
+        self.assertListEqual(list(view['close']), [2.0, 3.0, 4.0])
+        self.assertTrue(np.shares_memory(view['close'], s.data['close']))
+        s.update(6000, 6.0, 1.0)
+        self.assertListEqual(list(s.latest(3)['close']), [4.0, 4.0, 6.0])
+        self.assertEqual(s.latest(3)['volume'][1], 0)
+
+    def testLateTradeUpdatesEarlierCandle(self):
+        s = CandleSeries(1, size=3)
+        s.update(0, 5.0, 1.0)
+        s.update(1000, 6.0, 1.0)
+        self.assertTrue(s.update(500, 9.0, 1.0))
+        self.assertEqual(s.latest()['high'][0], 9.0)
+        self.assertEqual(s.latest()['close'][0], 5.0)
+        self.assertFalse(s.update(-5000, 1.0, 1.0))
+
+    def testAggregatorDedupes(self):
+        agg = CandleAggregator(intervals=(60, 300))
+        trades = [{'timestamp': 2000, 'price': '11', 'volume': '1'},
+                  {'timestamp': 1000, 'price': '10', 'volume': '1'}]
+        self.assertEqual(agg.add_trades(trades), 2)
+        self.assertEqual(agg.add_trades(trades[:1]), 0)
+        self.assertEqual(agg.last_timestamp, 2000)
+        df = agg.frame(300)
+        self.assertEqual(df.close.iloc[-1], 11.0)
+        self.assertEqual(df['count'].iloc[-1], 2)
+
+    def testAggregatorKeepsIdenticalTrades(self):
+        agg = CandleAggregator(intervals=(60,))
+        same = {'timestamp': 1000, 'price': '10', 'volume': '1'}
+        self.assertEqual(agg.add_trades([same, dict(same)]), 2)
+        # The next poll repeats both and adds a third identical trade
+        self.assertEqual(agg.add_trades([same, dict(same), dict(same)]), 1)
+        self.assertEqual(agg.latest(60)['volume'][-1], 3.0)
+        self.assertEqual(agg.latest(60)['count'][-1], 3)
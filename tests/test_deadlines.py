@@ -0,0 +1,54 @@
+import threading
+import unittest
+from time import sleep, time
+
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.utils import LunoCancelledError, LunoDeadlineError
+
+
+class TestDeadlines(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hostname': 'api.dummy.com',
+                   'maxRate': None, 'maxBurst': None}
+        self.api = Luno('mykey', 'mysecret', options)
+
+    def tearDown(self):
+        self.api.close()
+
+    @requests_mock.Mocker()
+    def testExplicitAndBlockDeadlines(self, m):
+        m.get('https://api.dummy.com/api/1/ticker', json={'bid': '1'})
+        with self.api.deadline(5):
+            self.assertEqual(self.api.market.get_ticker()['bid'], '1')
+        self.assertEqual(
+            self.api.api_request('ticker', deadline=5)['bid'], '1')
+        with self.api.deadline(at=time() - 1):
+            self.assertRaises(LunoDeadlineError, self.api.market.get_ticker)
+        self.assertEqual(m.call_count, 2)
+
+    @requests_mock.Mocker()
+    def testRateLimitWaitRejectedUpFront(self, m):
+        m.get('https://api.dummy.com/api/1/ticker', json={'bid': '1'})
+        self.api.maxRate = 0.01
+        self.api.maxBurst = 2
+        self.api.market.get_ticker()
+        start = time()
+        with self.api.deadline(1):
+            self.assertRaises(LunoDeadlineError, self.api.market.get_ticker)
+        self.assertLess(time() - start, 0.5)
+
+    @requests_mock.Mocker()
+    def testCancelInFlight(self, m):
+        def slow(request, context):
+            sleep(0.3)
+            return {'bid': '1'}
+
+        m.get('https://api.dummy.com/api/1/ticker', json=slow)
+        start = time()
+        with self.api.deadline() as d:
+            threading.Timer(0.05, d.cancel).start()
+            self.assertRaises(LunoCancelledError, self.api.market.get_ticker)
+        self.assertLess(time() - start, 0.25)
@@ -0,0 +1,80 @@
+import unittest
+
+import requests
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.deposits import DepositWatcher
+
+
+def funding(address, received, unconfirmed='0.00'):
+    return {'json': {'asset': 'XBT', 'address': address,
+                     'total_received': received,
+                     'total_unconfirmed': unconfirmed}}
+
+
+class TestDepositWatcher(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hostname': 'api.dummy.com',
+                   'maxRate': None, 'maxBurst': None}
+        self.api = Luno('mykey', 'mysecret', options)
+
+    @requests_mock.Mocker()
+    def testCreditEventsAndScheduling(self, m):
+        url = 'https://api.dummy.com/api/1/funding_address'
+        m.get(url + '?asset=XBT&address=a1',
+              [funding('a1', '0.00'), funding('a1', '0.50', '0.10')])
+        m.get(url + '?asset=XBT&address=a2',
+              [funding('a2', '1.00'), funding('a2', '1.00')])
+        events = []
+        watcher = DepositWatcher(self.api, callback=events.append,
+                                 active_interval=10, dormant_interval=100,
+                                 budget=10)
+        watcher.add('a1')
+        watcher.add('a2')
+        self.assertEqual(watcher.poll(now=0), [])
+        self.assertEqual(watcher.poll(now=50), [])
+        result = watcher.poll(now=100)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(events, result)
+        self.assertEqual(result[0]['address'], 'a1')
+        self.assertEqual(result[0]['received_delta'], '0.50')
+        self.assertEqual(result[0]['unconfirmed_delta'], '0.10')
+        self.assertEqual(watcher.addresses['a1']['next_poll'], 110)
+        self.assertEqual(watcher.addresses['a2']['next_poll'], 200)
+
+    @requests_mock.Mocker()
+    def testRemoveWhilePolling(self, m):
+        url = 'https://api.dummy.com/api/1/funding_address'
+        watcher = DepositWatcher(self.api, budget=10)
+
+        def removed(address, status):
+            def respond(request, context):
+                watcher.remove(address)
+                context.status_code = status
+                return funding(address, '1.00')['json']
+            return respond
+
+        m.get(url + '?asset=XBT&address=a1', json=removed('a1', 200))
+        m.get(url + '?asset=XBT&address=a2', json=removed('a2', 429))
+        watcher.add('a1')
+        watcher.add('a2')
+        self.assertEqual(watcher.poll(now=0), [])
+        self.assertEqual(watcher.addresses, {})
+        self.assertEqual(watcher.poll(now=0), [])
+
+    @requests_mock.Mocker()
+    def testNetworkErrorsReschedule(self, m):
+        url = 'https://api.dummy.com/api/1/funding_address'
+        m.get(url + '?asset=XBT&address=a1',
+              [{'exc': requests.exceptions.ConnectTimeout},
+               funding('a1', '1.00')])
+        m.get(url + '?asset=XBT&address=a2', [funding('a2', '1.00')])
+        watcher = DepositWatcher(self.api, budget=10, dormant_interval=100)
+        watcher.add('a1')
+        watcher.add('a2')
+        self.assertEqual(watcher.poll(now=0), [])
+        self.assertEqual(sorted(a for _, a in watcher._queue), ['a1', 'a2'])
+        watcher.poll(now=100)
+        self.assertEqual(watcher.addresses['a1']['total_received'], '1.00')
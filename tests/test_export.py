@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import pyarrow.parquet as pq
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.export import (_last_value, export_trades, export_transactions,
+                           part_files)
+from pyluno.utils import LunoPagingError
+
+
+def trade(i, timestamp, order_id=None):
+    return {"base": "0.1", "counter": "100", "fee_base": "0.00",
+            "fee_counter": "0.00", "is_buy": False,
+            "order_id": order_id or "BX%d" % i, "pair": "XBTZAR",
+            "price": "1000", "timestamp": timestamp,
+            "type": "BID", "volume": "0.1"}
+
+
+def tx(i):
+    return {"row_index": i, "timestamp": 1429908701000 + i,
+            "balance": 0.1 * i, "available": 0.1 * i,
+            "balance_delta": 0.1, "available_delta": 0.1,
+            "currency": "XBT", "description": "Bought 0.1 BTC"}
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hostname': 'api.dummy.com',
+                   'maxRate': None, 'maxBurst': None}
+        self.api = Luno('mykey', 'mysecret', options)
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    @requests_mock.Mocker()
+    def testTransactionsResume(self, m):
+        url = 'https://api.dummy.com/api/1/accounts/1/transactions'
+        rows = [tx(i) for i in range(1, 6)]
+
+        def page(request, context):
+            lo = int(request.qs['min_row'][0])
+            hi = int(request.qs['max_row'][0])
+            return {'id': '1', 'transactions': [
+                r for r in rows if lo <= r['row_index'] < hi]}
+
+        m.get(url, json=page)
+        for fmt in ('parquet', 'arrow'):
+            path = '%s/%s' % (self.tmp, fmt)
+            n = export_transactions(self.api, '1', path, fmt, page_size=2,
+                                    batch_size=3)
+            self.assertEqual(n, 5)
+            rows.append(tx(6))
+            n = export_transactions(self.api, '1', path, fmt, page_size=2)
+            self.assertEqual(n, 1)
+            self.assertEqual(len(part_files(path, fmt)), 2)
+            rows.pop()
+        table = pq.read_table(part_files(self.tmp + '/parquet')[0])
+        self.assertEqual(table.column('row_index').to_pylist(),
+                         [1, 2, 3, 4, 5])
+        self.assertEqual(table.num_rows, 5)
+
+    def mock_trades(self, m, trades):
+        def page(request, context):
+            since = int(request.qs['since'][0])
+            limit = int(request.qs['limit'][0])
+            return {'trades': [t for t in trades
+                               if t['timestamp'] >= since][:limit]}
+
+        m.get('https://api.dummy.com/api/1/listtrades', json=page)
+
+    @requests_mock.Mocker()
+    def testTradesPaging(self, m):
+        trades = [trade(i, 1000 + i // 2) for i in range(5)]
+        self.mock_trades(m, trades)
+        path = self.tmp + '/trades'
+        self.assertEqual(export_trades(self.api, path, page_size=3), 5)
+        table = pq.read_table(part_files(path)[0])
+        self.assertEqual(table.column('order_id').to_pylist(),
+                         ['BX%d' % i for i in range(5)])
+        self.assertEqual(export_trades(self.api, path, page_size=3), 0)
+
+    @requests_mock.Mocker()
+    def testIdenticalFillsAcrossPages(self, m):
+        # Same-size fills of one order in one ms are distinct trades
+        trades = [trade(i, 1000 + i // 2, 'BX1') for i in range(8)]
+        self.mock_trades(m, trades)
+        path = self.tmp + '/trades'
+        self.assertEqual(export_trades(self.api, path, page_size=3), 8)
+
+    @requests_mock.Mocker()
+    def testFullPageAtOneTimestampRaises(self, m):
+        self.mock_trades(m, [trade(i, 1000) for i in range(4)] +
+                         [trade(4, 1001)])
+        with self.assertRaises(LunoPagingError):
+            export_trades(self.api, self.tmp + '/trades', page_size=3)
+
+    @requests_mock.Mocker()
+    def testResumeOutsideUTC(self, m):
+        tz = os.environ.get('TZ')
+        os.environ['TZ'] = 'Africa/Johannesburg'
+        time.tzset()
+        try:
+            self.mock_trades(m, [trade(0, 1000000)])
+            path = self.tmp + '/trades'
+            self.assertEqual(export_trades(self.api, path), 1)
+            self.assertEqual(_last_value(path, 'parquet', 'timestamp'),
+                             1000000)
+            self.assertEqual(export_trades(self.api, path), 0)
+        finally:
+            if tz is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = tz
+            time.tzset()
@@ -0,0 +1,57 @@
+import unittest
+from time import sleep, time
+
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.hedging import HedgePolicy
+
+
+class TestHedging(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hostname': 'api.dummy.com', 'maxRate': None,
+                   'maxBurst': None,
+                   'hedge': {'initial_delay': 0.05, 'min_samples': 2}}
+        self.api = Luno('mykey', 'mysecret', options)
+
+    def tearDown(self):
+        self.api.close()
+
+    def testSlowPrimaryIsHedged(self):
+        policy = HedgePolicy()
+
+        def slow():
+            sleep(0.5)
+            return 'slow'
+
+        start = time()
+        self.assertEqual(policy.run(slow, lambda: 'fast', 0.05), 'fast')
+        self.assertLess(time() - start, 0.4)
+        self.assertEqual(policy.run(lambda: 'quick', slow, 0.05), 'quick')
+        self.assertEqual(policy.stats, {'requests': 2, 'hedged': 1,
+                                        'hedge_wins': 1, 'primary_wins': 0})
+        policy.shutdown()
+
+    @requests_mock.Mocker()
+    def testReadsGoThroughPolicy(self, m):
+        m.get('https://api.dummy.com/api/1/ticker', json={'bid': '1'})
+        self.assertEqual(self.api.market.get_ticker()['bid'], '1')
+        self.assertEqual(self.api.hedge_policy.stats['requests'], 1)
+        self.assertEqual(len(self.api.hedge_policy.latencies['ticker']), 1)
+
+    @requests_mock.Mocker()
+    def testWritesAreNotHedged(self, m):
+        m.post('https://api.dummy.com/api/1/postorder',
+               json={'order_id': '1'})
+        self.api.orders.create_limit_order('buy', 0.1, 500, 1, 2)
+        self.assertEqual(self.api.hedge_policy.stats['requests'], 0)
+
+    def testDelayPercentile(self):
+        policy = HedgePolicy(percentile=90, min_samples=10, min_delay=0.01)
+        self.assertEqual(policy.delay('ticker'), policy.initial_delay)
+        for i in range(1, 11):
+            policy.record('ticker', i / 10.0)
+        self.assertEqual(policy.delay('ticker'), 1.0)
+        self.assertTrue(policy.applies('orderbook', 'GET'))
+        self.assertFalse(policy.applies('balance', 'get'))
@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.impact import market_impact
+
+BOOK = {
+    "timestamp": 1366305398592,
+    "bids": [
+        {"volume": "1.00", "price": "1100.00"},
+        {"volume": "2.00", "price": "1000.00"},
+    ],
+    "asks": [
+        {"volume": "1.00", "price": "1200.00"},
+        {"volume": "1.00", "price": "1300.00"},
+    ]
+}
+
+
+class TestMarketImpact(unittest.TestCase):
+
+    def testBuyBase(self):
+        df = market_impact(BOOK, [0.5, 1.5, 3.0], 'buy')
+        np.testing.assert_allclose(df.counter.values, [600, 1850, 2500])
+        np.testing.assert_allclose(df.avg_price.values[:2],
+                                   [1200, 1850 / 1.5])
+        self.assertListEqual(list(df.levels), [1, 2, 2])
+        self.assertListEqual(list(df.worst_price), [1200, 1300, 1300])
+        self.assertListEqual(list(df.filled), [True, True, False])
+
+    def testBuyCounter(self):
+        df = market_impact(BOOK, [600, 1850], 'buy', size_in='counter')
+        np.testing.assert_allclose(df.base.values, [0.5, 1.5])
+
+    def testSellWithFee(self):
+        df = market_impact(BOOK, [2.0], 'sell', fee=0.01)
+        self.assertAlmostEqual(df.counter.iloc[0], 2100)
+        self.assertAlmostEqual(df.fee_counter.iloc[0], 21)
+        self.assertAlmostEqual(df.effective_price.iloc[0], 2079 / 2.0)
+        self.assertEqual(df.levels.iloc[0], 2)
+
+    @requests_mock.Mocker()
+    def testGetMarketImpact(self, m):
+        api = Luno('', '', {'hostname': 'api.dummy.com',
+                            'maxRate': None, 'maxBurst': None})
+        m.get('https://api.dummy.com/api/1/orderbook', json=BOOK)
+        m.get('https://api.dummy.com/api/1/fee_info',
+              json={'maker_fee': '0.00', 'taker_fee': '0.01'})
+        df = api.market.get_market_impact([1.0], include_fees=True)
+        self.assertAlmostEqual(df.fee_base.iloc[0], 0.01)
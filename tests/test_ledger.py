@@ -0,0 +1,97 @@
+import unittest
+
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.ledger import Ledger
+from pyluno.utils import LunoPagingError
+
+
+def tx(i):
+    return {"row_index": i, "timestamp": 1429908701000 + i,
+            "balance": 0.1 * i, "available": 0.1 * i,
+            "balance_delta": 0.1, "available_delta": 0.1,
+            "currency": "XBT", "description": "Bought 0.1 BTC"}
+
+
+def trade(i):
+    return {"base": "0.1", "counter": "100", "fee_base": "0.00",
+            "fee_counter": "0.00", "is_buy": i % 2 == 0,
+            "order_id": "BX%d" % i, "pair": "XBTZAR", "price": "1000",
+            "timestamp": 1000 + i // 2, "type": "BID", "volume": "0.1"}
+
+
+class TestLedger(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hostname': 'api.dummy.com',
+                   'maxRate': None, 'maxBurst': None}
+        self.api = Luno('mykey', 'mysecret', options)
+        self.ledger = Ledger(self.api, ':memory:', page_size=2)
+
+    def tearDown(self):
+        self.ledger.close()
+
+    @requests_mock.Mocker()
+    def testTransactionsSyncIncrementally(self, m):
+        rows = [tx(i) for i in range(1, 6)]
+
+        def page(request, context):
+            lo = int(request.qs['min_row'][0])
+            hi = int(request.qs['max_row'][0])
+            return {'id': '1', 'transactions': [
+                r for r in rows if lo <= r['row_index'] < hi]}
+
+        m.get('https://api.dummy.com/api/1/accounts/1/transactions',
+              json=page)
+        self.assertEqual(self.ledger.sync_transactions(1), 5)
+        self.assertEqual(self.ledger.last_row(1), 5)
+        rows.append(tx(6))
+        calls = m.call_count
+        self.assertEqual(self.ledger.sync({'1'})['1'], 1)
+        self.assertEqual(m.request_history[calls].qs['min_row'], ['6'])
+        df = self.ledger.transactions('1', start=1429908701003)
+        self.assertEqual(list(df.row_index), [3, 4, 5, 6])
+        self.assertAlmostEqual(df.balance.iloc[-1], 0.6)
+        self.assertEqual(len(self.ledger.transactions(currency='ZAR')), 0)
+
+    @requests_mock.Mocker()
+    def testTradesSyncIncrementally(self, m):
+        trades = [trade(i) for i in range(5)]
+
+        def page(request, context):
+            since = int(request.qs['since'][0])
+            limit = int(request.qs['limit'][0])
+            return {'trades': [t for t in trades
+                               if t['timestamp'] >= since][:limit]}
+
+        m.get('https://api.dummy.com/api/1/listtrades', json=page)
+        self.ledger.page_size = 3
+        self.assertEqual(self.ledger.sync_trades(), 5)
+        self.assertEqual(self.ledger.last_trade(), 1002)
+        self.assertEqual(self.ledger.sync_trades(), 0)
+        trades.append(trade(5))
+        self.assertEqual(self.ledger.sync_trades('XBTZAR'), 1)
+        df = self.ledger.trades('XBTZAR')
+        self.assertEqual(list(df.order_id), ['BX%d' % i for i in range(6)])
+        self.assertEqual(list(df.is_buy[:2]), [True, False])
+        df = self.ledger.trades(start=1001, end=1002)
+        self.assertEqual(list(df.order_id), ['BX2', 'BX3'])
+
+    @requests_mock.Mocker()
+    def testTradesSharingTimestamps(self, m):
+        # Identical fills of one order in one ms are all kept
+        trades = [dict(trade(i), order_id='BX1') for i in range(6)]
+
+        def page(request, context):
+            since = int(request.qs['since'][0])
+            limit = int(request.qs['limit'][0])
+            return {'trades': [t for t in trades
+                               if t['timestamp'] >= since][:limit]}
+
+        m.get('https://api.dummy.com/api/1/listtrades', json=page)
+        self.ledger.page_size = 3
+        self.assertEqual(self.ledger.sync_trades(), 6)
+        trades.extend(dict(trade(6), timestamp=1003) for _ in range(3))
+        with self.assertRaises(LunoPagingError):
+            self.ledger.sync_trades()
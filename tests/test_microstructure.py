@@ -0,0 +1,91 @@
+import math
+import random
+import unittest
+
+import numpy as np
+
+from pyluno.microstructure import MetricsEngine, RollingRings
+
+
+def level(price, volume):
+    return {'price': '%.2f' % price, 'volume': '%.4f' % volume}
+
+
+class TestMicrostructure(unittest.TestCase):
+
+    def testRings(self):
+        rings = RollingRings(2, 1, capacity=3)
+        for t in range(5):
+            rings.push(1, t, (float(t),))
+        # Full rings drop their oldest entry
+        self.assertEqual(rings.count[1], 3)
+        self.assertEqual(rings.sums[1, 0], 2 + 3 + 4)
+        rings.expire(1, 4)
+        ts, values = rings.latest(1)
+        self.assertListEqual(list(ts), [4])
+        self.assertEqual(rings.sums[1, 0], 4)
+        self.assertEqual(rings.count[0], 0)
+
+    def testBookAndTrades(self):
+        engine = MetricsEngine(['XBTZAR', 'ETHZAR'], window=10, depth=2)
+        engine.update_book('XBTZAR', {
+            'timestamp': 1000,
+            'bids': [level(99, 3), level(98, 1), level(97, 50)],
+            'asks': [level(101, 1), level(102, 1)]})
+        engine.update_book('XBTZAR', {
+            'timestamp': 2000, 'bids': [level(100, 1)],
+            'asks': [level(102, 1)]})
+        engine.add_trades('XBTZAR', [
+            {'timestamp': 3000, 'price': '101', 'volume': '3',
+             'is_buy': True},
+            {'timestamp': 2500, 'price': '100', 'volume': '1',
+             'is_buy': False}])
+        m = engine.metrics('XBTZAR')
+        self.assertEqual(m['timestamp'], 3000)
+        self.assertEqual((m['bid'], m['ask'], m['mid']), (100, 102, 101))
+        self.assertAlmostEqual(m['spread_bps'], 2 / 101. * 1e4)
+        self.assertEqual(m['imbalance'], 0)
+        self.assertAlmostEqual(m['volatility'], abs(math.log(101 / 100.)))
+        self.assertEqual((m['buy_volume'], m['sell_volume']), (3, 1))
+        self.assertAlmostEqual(m['flow_imbalance'], 0.5)
+        self.assertAlmostEqual(m['vwap'], 403 / 4.)
+        engine.advance(12600)
+        m = engine.metrics('XBTZAR')
+        self.assertEqual((m['trades'], m['returns']), (1, 0))
+        self.assertEqual(m['volatility'], 0)
+        df = engine.frame()
+        self.assertEqual(df.loc['XBTZAR', 'flow_imbalance'], 1)
+        self.assertTrue(np.isnan(df.loc['ETHZAR', 'mid']))
+
+    def testMatchesRecomputation(self):
+        rnd = random.Random(5)
+        pairs = ['P%d' % i for i in range(20)]
+        engine = MetricsEngine(pairs, window=30)
+        history = dict((p, {'mids': [], 'trades': []}) for p in pairs)
+        ts = 0
+        for _ in range(20000):
+            ts += rnd.randint(0, 50)
+            pair = rnd.choice(pairs)
+            if rnd.random() < 0.5:
+                mid = 100 + rnd.random()
+                engine.update_top(pair, ts, mid - 0.1, mid + 0.1, 1, 1)
+                history[pair]['mids'].append((ts, mid))
+            else:
+                volume = rnd.random()
+                is_buy = rnd.random() < 0.6
+                engine.update_trade(pair, ts, 100, volume, is_buy)
+                history[pair]['trades'].append((ts, volume, is_buy))
+        engine.advance(ts)
+        df = engine.frame()
+        for pair in pairs:
+            mids = history[pair]['mids']
+            r2 = sum(math.log(b / a) ** 2 for (_, a), (t, b) in
+                     zip(mids, mids[1:]) if t >= ts - 30000)
+            buy = sum(v for t, v, b in history[pair]['trades']
+                      if t >= ts - 30000 and b)
+            sell = sum(v for t, v, b in history[pair]['trades']
+                       if t >= ts - 30000 and not b)
+            self.assertAlmostEqual(df.loc[pair, 'volatility'],
+                                   math.sqrt(r2))
+            self.assertAlmostEqual(df.loc[pair, 'flow_imbalance'],
+                                   (buy - sell) / (buy + sell))
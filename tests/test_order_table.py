@@ -0,0 +1,43 @@
+import unittest
+
+from pyluno.api import Luno
+from pyluno.order_table import OrderTable
+from pyluno.simulator import SimulatedExchange
+
+
+class TestOrderTable(unittest.TestCase):
+
+    def setUp(self):
+        self.sim = SimulatedExchange(
+            initial_balances={'XBT': '1000', 'ZAR': '1000000'})
+        self.api = Luno('trader', 'secret',
+                        {'maxRate': None, 'maxBurst': None})
+        self.sim.install(self.api)
+
+    def tearDown(self):
+        self.api.close()
+
+    def testPagesPastCapAndTracksChanges(self):
+        ids = [self.api.orders.create_limit_order(
+            'buy', 0.01, 100 + i, None, None)['order_id']
+            for i in range(250)]
+        table = OrderTable(self.api)
+        self.assertEqual(table.sync(), 250)
+        self.assertEqual(len(table.rows), 250)
+        version = table.version
+
+        self.assertEqual(table.sync(), 0)
+        self.assertEqual(table.changed_since(version), [])
+
+        self.api.orders.stop_order(ids[0])
+        self.api.orders.stop_order(ids[1])
+        self.assertEqual(table.sync(), 2)
+        self.assertEqual(sorted(table.changed_since(version)),
+                         sorted(ids[:2]))
+        delta = table.frame(since=version)
+        self.assertEqual(list(delta.state), ['COMPLETE', 'COMPLETE'])
+
+        df = table.frame()
+        self.assertEqual(len(df), 250)
+        self.assertEqual(df.limit_price.dtype.kind, 'f')
+        self.assertIs(table.frame(), df)
@@ -0,0 +1,107 @@
+import base64
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+import requests_mock
+
+from pyluno.pool import LunoPool
+from pyluno.recording import RecordingAdapter
+from pyluno.utils import LunoAPIRateLimitError, TokenBucket
+
+CREDENTIALS = [('writer', 's0'), ('reader1', 's1'), ('reader2', 's2')]
+
+
+def key_of(request):
+    auth = request.headers['Authorization'].split()[1]
+    return base64.b64decode(auth).decode('utf-8').split(':')[0]
+
+
+class TestLunoPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = LunoPool(CREDENTIALS, {'hostname': 'api.dummy.com',
+                                           'maxRate': 0.1, 'maxBurst': 2})
+
+    def tearDown(self):
+        self.pool.close()
+
+    def testEachKeyHasItsOwnBucket(self):
+        limiters = [m.rate_limiter for m in self.pool.members]
+        self.assertTrue(all(isinstance(l, TokenBucket) for l in limiters))
+        self.assertEqual(len(set(map(id, limiters))), 3)
+        self.assertIs(self.pool.members[0], self.pool)
+
+    @requests_mock.Mocker()
+    def testReadsSpreadByBudget(self, m):
+        m.get('https://api.dummy.com/api/1/balance', json={'balance': []})
+        for _ in range(6):
+            self.pool.account.get_balance()
+        keys = [key_of(r) for r in m.request_history]
+        # Two tokens per key: six reads without waiting on any bucket
+        self.assertEqual(sorted(keys), sorted(
+            ['writer', 'reader1', 'reader2'] * 2))
+        for row in self.pool.utilization():
+            self.assertEqual(row['reads'], 2)
+            self.assertLess(row['tokens'], 1)
+
+    @requests_mock.Mocker()
+    def testWritesArePinned(self, m):
+        m.post('https://api.dummy.com/api/1/postorder',
+               json={'order_id': 'BX1'})
+        pool = LunoPool(CREDENTIALS, {'hostname': 'api.dummy.com',
+                                      'maxRate': None, 'maxBurst': None},
+                        write_key=2)
+        for _ in range(3):
+            pool.orders.create_limit_order('buy', 1, 100, 'b', 'c')
+        self.assertEqual([key_of(r) for r in m.request_history],
+                         ['reader2'] * 3)
+        report = pool.utilization()
+        self.assertEqual([r['writes'] for r in report], [0, 0, 3])
+        self.assertTrue(report[2]['write'])
+        self.assertIsNone(report[2]['tokens'])
+        pool.close()
+
+    @requests_mock.Mocker()
+    def testErrorsAreCounted(self, m):
+        m.get('https://api.dummy.com/api/1/ticker', status_code=429,
+              json={'error': 'slow down'})
+        pool = LunoPool(CREDENTIALS[1:], {'hostname': 'api.dummy.com',
+                                          'maxRate': None,
+                                          'maxBurst': None},
+                        write_reads=False)
+        with self.assertRaises(LunoAPIRateLimitError):
+            pool.market.get_ticker()
+        report = pool.utilization()
+        self.assertEqual(report[0]['requests'], 0)
+        self.assertEqual(report[1]['rate_limited'], 1)
+        pool.close()
+
+    def testMembersShareTheReplay(self):
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, 'traffic.jsonl.gz')
+        mock = requests_mock.Adapter()
+        mock.register_uri('GET', 'https://api.dummy.com/api/1/balance',
+                          json={'balance': []})
+        session = requests.Session()
+        session.mount('https://', RecordingAdapter(path, mock))
+        for _ in range(3):
+            session.get('https://api.dummy.com/api/1/balance')
+        session.close()
+        pool = LunoPool(CREDENTIALS, {'hostname': 'api.dummy.com',
+                                      'maxRate': 0.1, 'maxBurst': 1,
+                                      'replay': path})
+        replay = pool._requests_session.get_adapter(
+            'https://api.dummy.com/')
+        for member in pool.members:
+            self.assertIs(member._requests_session.get_adapter(
+                'https://api.dummy.com/'), replay)
+        for _ in range(3):
+            pool.account.get_balance()
+        self.assertEqual(replay.served, 3)
+        self.assertEqual([r['reads'] for r in pool.utilization()],
+                         [1, 1, 1])
+        pool.close()
+        shutil.rmtree(tmp)
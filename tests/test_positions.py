@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+
+from pyluno.positions import PositionEngine
+
+
+def trade(ts, side, base, price, fee_base='0.00', fee_counter='0.00'):
+    return {'timestamp': ts, 'type': side, 'base': str(base),
+            'counter': str(base * price), 'price': str(price),
+            'volume': str(base), 'fee_base': fee_base,
+            'fee_counter': fee_counter, 'order_id': 'BX%d' % ts,
+            'pair': 'XBTZAR', 'is_buy': False}
+
+
+TRADES = [trade(1, 'BID', 1.0, 100), trade(2, 'BID', 1.0, 200),
+          trade(3, 'ASK', 1.5, 300), trade(4, 'BID', 1.0, 400),
+          trade(5, 'ASK', 1.0, 500)]
+
+
+class TestPositionEngine(unittest.TestCase):
+
+    def testFifo(self):
+        engine = PositionEngine()
+        df = engine.update(TRADES)
+        # 1.5 sold at 300 against 1@100 + 0.5@200, then 1 at 500 against
+        # 0.5@200 + 0.5@400
+        np.testing.assert_allclose(df.realized_pnl.values,
+                                   [0, 0, 250, 0, 200])
+        np.testing.assert_allclose(df.position.values,
+                                   [1, 2, 0.5, 1.5, 0.5])
+        self.assertAlmostEqual(engine.position, 0.5)
+        self.assertAlmostEqual(engine.avg_cost, 400)
+        self.assertAlmostEqual(engine.unrealized(500), 50)
+
+    def testIncrementalMatchesSinglePass(self):
+        for method in ('fifo', 'average'):
+            whole = PositionEngine(method)
+            whole.update(TRADES)
+            parts = PositionEngine(method)
+            parts.update(TRADES[:3])
+            parts.update(TRADES[2:])
+            self.assertAlmostEqual(whole.realized, parts.realized)
+            self.assertAlmostEqual(whole.cost, parts.cost)
+            self.assertEqual(parts.trade_count, 5)
+
+    def testTradesInTheSameMillisecond(self):
+        trades = [trade(1, 'BID', 1.0, 100), trade(2, 'BID', 1.0, 200),
+                  trade(2, 'BID', 1.0, 200), trade(2, 'ASK', 1.0, 300)]
+        whole = PositionEngine()
+        whole.update(trades)
+        parts = PositionEngine()
+        parts.update(trades[:2])
+        # The next page starts at the last timestamp seen and repeats it
+        parts.update(trades[1:3])
+        parts.update(trades[1:])
+        self.assertEqual(parts.trade_count, 4)
+        self.assertAlmostEqual(parts.position, whole.position)
+        self.assertAlmostEqual(parts.realized, whole.realized)
+
+    def testAverageCost(self):
+        engine = PositionEngine('average')
+        engine.update(TRADES)
+        # avg 150 -> sell 1.5 @300 = 225, avg (0.5*150+400)/1.5 -> sell 1
+        self.assertAlmostEqual(engine.realized, 225 + 500 - 475 / 1.5)
+
+    def testFeesAndUnmatchedSells(self):
+        engine = PositionEngine()
+        df = engine.update([trade(1, 'ASK', 1.0, 100),
+                            trade(2, 'BID', 1.0, 100, fee_base='0.01'),
+                            trade(3, 'ASK', 1.0, 110, fee_counter='1')])
+        np.testing.assert_allclose(df.unmatched.values, [1, 0, 0.01])
+        self.assertAlmostEqual(df.realized_pnl.iloc[2],
+                               (110 - 1) * 0.99 - 100)
+        self.assertAlmostEqual(engine.position, 0)
@@ -0,0 +1,85 @@
+import itertools
+import threading
+import unittest
+from time import time
+
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.quotes import QuoteManager
+
+
+def make_quote(qid, expires_in):
+    return {"id": qid, "type": "BUY", "pair": "XBTZAR",
+            "base_amount": "0.1", "counter_amount": "1200",
+            "created_at": int(time() * 1000),
+            "expires_at": int((time() + expires_in) * 1000),
+            "discarded": False, "exercised": False}
+
+
+class TestQuoteManager(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hostname': 'api.dummy.com',
+                   'maxRate': None, 'maxBurst': None}
+        self.api = Luno('mykey', 'mysecret', options)
+        self.url = 'https://api.dummy.com/api/1/quotes'
+
+    @requests_mock.Mocker()
+    def testPrefetchedQuoteIsReused(self, m):
+        m.post(self.url, json=make_quote('1', 30))
+        m.put(self.url, json=dict(make_quote('1', 30), exercised=True))
+        qm = QuoteManager(self.api, [('BUY', '0.1', 'XBTZAR')])
+        self.assertEqual(qm.refresh(), 1)
+        self.assertEqual(qm.refresh(), 0)
+        result = qm.execute('buy', 0.1, 'XBTZAR')
+        self.assertTrue(result['exercised'])
+        self.assertEqual(qm.stats['hits'], 1)
+        self.assertEqual(m.call_count, 2)
+        self.assertEqual(m.request_history[-1].method, 'PUT')
+
+    @requests_mock.Mocker()
+    def testStaleQuoteIsReplacedAndDeleted(self, m):
+        m.post(self.url, [{'json': make_quote('1', 1)},
+                          {'json': make_quote('2', 30)}])
+        m.delete(self.url, json=make_quote('1', 1))
+        qm = QuoteManager(self.api, [('BUY', '0.1', 'XBTZAR')], margin=2)
+        qm.refresh()
+        self.assertEqual(qm.get('BUY', '0.1', 'XBTZAR')['id'], '2')
+        self.assertEqual(qm.stats['misses'], 1)
+        self.assertEqual(qm.stats['deleted'], 1)
+        self.assertIn('id=1', m.request_history[-1].url)
+
+    def testAmountsAreNormalised(self):
+        qm = QuoteManager(self.api, [('BUY', '0.10', 'XBTZAR')])
+        self.assertEqual(qm.targets, set([('BUY', '0.1', 'XBTZAR')]))
+        self.assertEqual(qm._key('buy', 0.1, 'XBTZAR'),
+                         qm._key('BUY', '0.100', 'XBTZAR'))
+
+    @requests_mock.Mocker()
+    def testQuotesAreExecutedOnce(self, m):
+        ids = itertools.count(1)
+        m.post(self.url, json=lambda r, c: make_quote(str(next(ids)), 30))
+        m.put(self.url, json=lambda r, c: dict(
+            make_quote(r.qs['id'][0], 30), exercised=True))
+        m.delete(self.url, json={})
+        qm = QuoteManager(self.api, [('BUY', '0.1', 'XBTZAR')])
+        qm.refresh()
+        results = []
+
+        def execute():
+            for _ in range(5):
+                results.append(qm.execute('BUY', '0.1', 'XBTZAR')['id'])
+                qm.refresh()
+
+        threads = [threading.Thread(target=execute) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 20)
+        self.assertEqual(len(set(results)), 20)
+        deleted = [r.qs['id'][0] for r in m.request_history
+                   if r.method == 'DELETE']
+        self.assertFalse(set(deleted) & set(results))
+        self.assertEqual(qm.stats['hits'] + qm.stats['misses'], 20)
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from time import time
+
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.utils import SharedRateLimiter
+
+
+class TestSharedRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'bucket')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testBucketIsShared(self):
+        a = SharedRateLimiter(self.path, 10, 2)
+        b = SharedRateLimiter(self.path, 10, 2)
+        self.assertEqual(a.try_acquire(), 0)
+        self.assertEqual(b.try_acquire(), 0)
+        self.assertGreater(a.try_acquire(), 0)
+        start = time()
+        b.acquire()
+        self.assertGreater(time() - start, 0.05)
+        a.close()
+        b.close()
+
+    def testThreadsShareOneBudget(self):
+        limiter = SharedRateLimiter(self.path, 0.001, 50)
+        taken = []
+
+        def take():
+            taken.append(sum(1 for _ in range(200)
+                             if limiter.try_acquire() == 0))
+
+        threads = [threading.Thread(target=take) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sum(taken), 50)
+        limiter.close()
+
+    @requests_mock.Mocker()
+    def testLunoOption(self, m):
+        options = {'hostname': 'api.dummy.com', 'maxRate': 0.1,
+                   'maxBurst': 1, 'rateLimiter': 'shared',
+                   'rateLimitPath': self.path}
+        api = Luno('mykey', 'mysecret', options)
+        self.assertIsInstance(api.rate_limiter, SharedRateLimiter)
+        m.get('https://api.dummy.com/api/1/ticker', json={'bid': '1'})
+        api.market.get_ticker()
+        self.assertGreater(api.rate_limiter.try_acquire(), 0)
+        api.close()
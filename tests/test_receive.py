@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from time import sleep, time
+
+import requests
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.receive import AddressPool
+from pyluno.utils import AddressPoolEmptyError, LunoAPIError
+
+
+class TestAddressPool(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hostname': 'api.dummy.com',
+                   'maxRate': None, 'maxBurst': None}
+        self.api = Luno('mykey', 'mysecret', options)
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'pool.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    @requests_mock.Mocker()
+    def testTopUpWithinBudgetAndPersist(self, m):
+        m.post('https://api.dummy.com/api/1/funding_address',
+               [{'json': {'asset': 'XBT', 'address': 'addr%d' % i}}
+                for i in range(5)])
+        pool = AddressPool(self.api, self.path, target=5, burst=3)
+        self.assertEqual(pool.top_up(), 3)
+        self.assertEqual(pool.level('XBT'), 3)
+        self.assertEqual(pool.acquire('XBT', owner='cust1'), 'addr0')
+
+        pool = AddressPool(self.api, self.path, target=5, burst=3)
+        self.assertEqual(pool.level(), {'XBT': 2})
+        self.assertEqual(pool.assigned['XBT'], {'addr0': 'cust1'})
+        self.assertEqual(pool.top_up(), 0)
+
+    @requests_mock.Mocker()
+    def testTopUpFailureKeepsCreatedAddresses(self, m):
+        m.post('https://api.dummy.com/api/1/funding_address',
+               [{'json': {'asset': 'XBT', 'address': 'addr0'}},
+                {'json': {'asset': 'XBT', 'address': 'addr1'}},
+                {'status_code': 500, 'text': 'error'}])
+        pool = AddressPool(self.api, self.path, target=5)
+        self.assertRaises(LunoAPIError, pool.top_up)
+        pool = AddressPool(self.api, self.path, target=5)
+        self.assertEqual(list(pool.free['XBT']), ['addr0', 'addr1'])
+
+    @requests_mock.Mocker()
+    def testRetiredAddressIsNotReused(self, m):
+        m.post('https://api.dummy.com/api/1/funding_address',
+               [{'json': {'asset': 'XBT', 'address': 'addr%d' % i}}
+                for i in range(2)])
+        pool = AddressPool(self.api, self.path, target=1)
+        pool.top_up()
+        address = pool.acquire('XBT', owner='cust1')
+        pool.retire('XBT', address)
+        pool.top_up()
+        self.assertEqual(pool.acquire('XBT'), 'addr1')
+        pool = AddressPool(self.api, self.path)
+        self.assertEqual(pool.retired['XBT'], {'addr0': 'cust1'})
+        self.assertRaises(AddressPoolEmptyError, pool.acquire, 'XBT')
+
+    def testEmptyPool(self):
+        pool = AddressPool(self.api)
+        self.assertRaises(AddressPoolEmptyError, pool.acquire, 'XBT')
+
+    @requests_mock.Mocker()
+    def testTopUpThreadSurvivesNetworkErrors(self, m):
+        m.post('https://api.dummy.com/api/1/funding_address',
+               [{'exc': requests.exceptions.ConnectTimeout},
+                {'json': {'asset': 'XBT', 'address': 'addr0'}}])
+        pool = AddressPool(self.api, self.path, target=1)
+        pool.start(interval=0.01)
+        deadline = time() + 5
+        while not pool.level('XBT') and time() < deadline:
+            sleep(0.01)
+        pool.stop()
+        self.assertEqual(pool.level('XBT'), 1)
+
+    def testConcurrentSaves(self):
+        pool = AddressPool(self.api, self.path)
+        errors = []
+
+        def churn(i):
+            try:
+                for j in range(100):
+                    with pool._lock:
+                        pool.free['XBT'].append('a%d-%d' % (i, j))
+                    pool.acquire('XBT', owner=i)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=churn, args=(i,))
+                   for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(AddressPool(self.api, self.path)
+                             .assigned['XBT']), 400)
@@ -0,0 +1,114 @@
+import unittest
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from pyluno.reconcile import (Reconciliation, expected_movements,
+                              match_orders)
+
+
+def trade(order_id, ts, side, base, price, fee_base=0.0, fee_counter=0.0):
+    return {'order_id': order_id, 'timestamp': ts, 'type': side,
+            'pair': 'XBTZAR', 'price': str(price), 'volume': str(base),
+            'base': str(base), 'counter': str(base * price),
+            'fee_base': str(fee_base), 'fee_counter': str(fee_counter),
+            'is_buy': False}
+
+
+def order(order_id, base, counter, fee_base=0.0, fee_counter=0.0):
+    return {'order_id': order_id, 'base': base, 'counter': counter,
+            'fee_base': fee_base, 'fee_counter': fee_counter,
+            'state': 'COMPLETE', 'type': 'BID'}
+
+
+def tx(row, ts, currency, delta):
+    return {'row_index': row, 'timestamp': ts, 'currency': currency,
+            'balance_delta': delta, 'balance': 0.0, 'available': 0.0,
+            'available_delta': delta, 'description': 'Trade'}
+
+
+TRADES = [trade('B1', 1000, 'BID', 0.1, 1000, fee_base=0.001),
+          trade('B1', 1500, 'BID', 0.2, 1000),
+          trade('B2', 9000, 'ASK', 0.3, 1100, fee_counter=1.0),
+          trade('B3', 20000, 'ASK', 0.5, 1000)]
+ORDERS = [order('B1', 0.3, 300.0, fee_base=0.001),
+          order('B2', 0.3, 330.0, fee_counter=2.0),
+          order('B4', 1.0, 1000.0)]
+TRANSACTIONS = [tx(1, 1001, 'XBT', 0.099), tx(2, 1001, 'ZAR', -100.0),
+                tx(3, 1502, 'ZAR', -200.0), tx(4, 1499, 'XBT', 0.2),
+                tx(5, 9003, 'XBT', -0.3), tx(6, 9003, 'ZAR', 328.0),
+                tx(7, 50000, 'ZAR', 5000.0)]
+
+
+class TestReconcile(unittest.TestCase):
+
+    def testMatchOrders(self):
+        df = match_orders(pd.DataFrame(TRADES), ORDERS)
+        self.assertEqual(df.status.to_dict(), {
+            'B1': 'ok', 'B2': 'mismatch', 'B3': 'missing_order',
+            'B4': 'no_trades'})
+        self.assertEqual(df.trades['B1'], 2)
+        self.assertAlmostEqual(df.fee_counter_diff['B2'], -1.0)
+
+    def testExpectedMovements(self):
+        moves = expected_movements(TRADES[2:3])
+        np.testing.assert_allclose(moves.amount, [-0.3, 329.0])
+        self.assertEqual(list(moves.currency), ['XBT', 'ZAR'])
+
+    def testTransactions(self):
+        rec = Reconciliation(TRADES, pd.DataFrame(ORDERS), TRANSACTIONS,
+                             window_ms=10)
+        moves = rec.movements.set_index(['order_id', 'leg', 'trade'])
+        self.assertEqual(list(rec.movements.status), [
+            'matched', 'matched', 'matched', 'matched',
+            'matched', 'mismatched', 'unmatched', 'unmatched'])
+        self.assertEqual(moves.row_index[('B1', 'base', 1)], 4)
+        self.assertAlmostEqual(moves['diff'][('B2', 'counter', 2)], -1.0)
+        self.assertEqual(list(rec.unmatched_transactions.row_index), [7])
+        summary = rec.summary()
+        self.assertEqual(summary['movements']['unmatched'], 2)
+        self.assertEqual(summary['unmatched_transactions'], 1)
+        orders, movements = rec.problems()
+        self.assertEqual(len(orders), 3)
+        self.assertEqual(len(movements), 3)
+
+    def testScalesLinearly(self):
+        n = 50000
+        ts = np.arange(n, dtype=np.int64) * 10
+        trades = pd.DataFrame({
+            'order_id': np.array(['B%d' % (i // 2) for i in range(n)],
+                                 dtype=object),
+            'timestamp': ts, 'type': np.where(ts % 20, 'ASK', 'BID'),
+            'pair': 'XBTZAR', 'base': 0.1, 'counter': 100.0,
+            'fee_base': 0.0, 'fee_counter': 0.0})
+        moves = expected_movements(trades)
+        txs = pd.DataFrame({'row_index': np.arange(2 * n),
+                            'timestamp': moves.timestamp + 1,
+                            'currency': moves.currency,
+                            'balance_delta': moves.amount})
+        rec = Reconciliation(trades, [], txs, window_ms=5)
+        self.assertEqual(rec.summary()['movements'], {'matched': 2 * n})
+        self.assertEqual(rec.summary()['orders'], {'missing_order': n // 2})
+
+    def testDenseIdenticalFills(self):
+        # Bursts of same-size fills compete for the same transactions
+        n = 20000
+        ts = np.arange(n, dtype=np.int64) // 100 * 16
+        trades = pd.DataFrame({
+            'order_id': 'B1', 'timestamp': ts, 'type': 'BID',
+            'pair': 'XBTZAR', 'base': 0.1, 'counter': 100.0,
+            'fee_base': 0.0, 'fee_counter': 0.0})
+        moves = expected_movements(trades)
+        txs = pd.DataFrame({'row_index': np.arange(2 * n),
+                            'timestamp': moves.timestamp + 3,
+                            'currency': moves.currency,
+                            'balance_delta': moves.amount})
+        txs.loc[0, 'balance_delta'] = 0.2
+        start = time()
+        rec = Reconciliation(trades, [], txs, window_ms=5000)
+        self.assertLess(time() - start, 10)
+        self.assertEqual(rec.summary()['movements'],
+                         {'matched': 2 * n - 1, 'mismatched': 1})
+        self.assertEqual(rec.summary()['unmatched_transactions'], 0)
+        self.assertEqual(rec.movements.tx.nunique(), 2 * n)
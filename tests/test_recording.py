@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+import requests_mock
+
+from pyluno.api import Luno
+from pyluno.recording import (RecordingAdapter, ReplayAdapter,
+                              read_recording)
+
+
+class TestRecordReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'traffic.jsonl.gz')
+        self.options = {'hostname': 'api.dummy.com',
+                        'maxRate': None, 'maxBurst': None}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testRecordThenReplay(self):
+        mock = requests_mock.Adapter()
+        mock.register_uri('GET', 'https://api.dummy.com/api/1/ticker',
+                          json={'bid': '924.00'})
+        mock.register_uri('POST', 'https://api.dummy.com/api/1/postorder',
+                          json={'order_id': 'BX1'})
+        api = Luno('mykey', 'mysecret', self.options)
+        recorder = RecordingAdapter(self.path, mock)
+        api._requests_session.mount('https://', recorder)
+        api.market.get_ticker(pair='XBTZAR')
+        api.orders.create_limit_order('buy', 0.1, 500, 123, 456)
+        api.close()
+
+        records = list(read_recording(self.path))
+        self.assertEqual([r['method'] for r in records], ['GET', 'POST'])
+        self.assertNotIn('mysecret', open(self.path, 'rb').read().decode(
+            'latin-1'))
+
+        options = dict(self.options, replay=self.path)
+        api = Luno('mykey', 'mysecret', options)
+        self.assertEqual(api.market.get_ticker()['bid'], '924.00')
+        result = api.orders.create_limit_order('buy', 0.1, 500, 123, 456)
+        self.assertEqual(result['order_id'], 'BX1')
+        self.assertRaises(requests.exceptions.ConnectionError,
+                          api.market.get_ticker)
+        api.close()
+
+    def testLenientReplayReusesLast(self):
+        mock = requests_mock.Adapter()
+        mock.register_uri('GET', 'https://api.dummy.com/api/1/tickers',
+                          json={'tickers': []})
+        session = requests.Session()
+        session.mount('https://', RecordingAdapter(self.path, mock))
+        session.get('https://api.dummy.com/api/1/tickers')
+        session.close()
+        replay = ReplayAdapter(self.path, strict=False)
+        session = requests.Session()
+        session.mount('https://', replay)
+        for _ in range(3):
+            r = session.get('https://api.dummy.com/api/1/tickers')
+            self.assertEqual(r.json(), {'tickers': []})
+        self.assertEqual(replay.served, 3)
+
+    def testReplayOverPlainHttp(self):
+        mock = requests_mock.Adapter()
+        mock.register_uri('GET', 'http://localhost:8080/api/1/ticker',
+                          json={'bid': '924.00'})
+        options = dict(self.options, hostname='localhost', port=8080,
+                       scheme='http')
+        api = Luno('mykey', 'mysecret', options)
+        api._requests_session.mount('http://',
+                                    RecordingAdapter(self.path, mock))
+        api.market.get_ticker(pair='XBTZAR')
+        api.close()
+        api = Luno('mykey', 'mysecret', dict(options, replay=self.path))
+        self.assertEqual(api.market.get_ticker(pair='XBTZAR')['bid'],
+                         '924.00')
+        api.close()
@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from time import sleep, time
+
+import requests_mock
+
+from pyluno.api import Luno
+
+BALANCE = {'balance': [{'account_id': '1', 'asset': 'XBT', 'balance': '1.0',
+                        'reserved': '0', 'unconfirmed': '0',
+                        'name': 'Bitcoin'}]}
+FEES = {'maker_fee': '0.00', 'taker_fee': '0.001',
+        'thirty_day_volume': '0.0'}
+
+
+class TestReferenceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'reference.json')
+        self.options = {'hostname': 'api.dummy.com', 'maxRate': None,
+                        'maxBurst': None, 'referenceCache': self.path}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def client(self, key='mykey'):
+        api = Luno(key, 'mysecret', self.options)
+        # Let the startup refresh pass finish
+        api.reference.stop()
+        return api
+
+    @requests_mock.Mocker()
+    def testWarmStart(self, m):
+        m.get('https://api.dummy.com/api/1/fee_info', json=FEES)
+        m.get('https://api.dummy.com/api/1/balance', json=BALANCE)
+        m.get('https://api.dummy.com/api/1/beneficiaries',
+              json={'beneficiaries': [{'id': '7'}]})
+        m.get('https://api.dummy.com/api/1/tickers', json={'tickers': [
+            {'pair': 'XBTZAR'}, {'pair': 'ETHXBT'}]})
+        api = self.client()
+        self.assertEqual(api.orders.get_fee_info(), FEES)
+        self.assertEqual(api.account.get_accounts(), [
+            {'account_id': '1', 'asset': 'XBT', 'name': 'Bitcoin'}])
+        self.assertEqual(api.market.get_pairs(), ['ETHXBT', 'XBTZAR'])
+        self.assertEqual(api.withdrawal.list_beneficiaries(), [{'id': '7'}])
+        self.assertEqual(api.balance_cache.get(60)['balance'][0]['balance'],
+                         '1.0')
+        api.close()
+        calls = m.call_count
+
+        api = self.client()
+        self.assertEqual(api.orders.get_fee_info(), FEES)
+        self.assertEqual(api.market.get_pairs(), ['ETHXBT', 'XBTZAR'])
+        self.assertEqual(m.call_count, calls)
+        self.assertEqual(api.reference.stats['hits'], 2)
+        api.close()
+
+        # A cache written for another key is ignored
+        api = self.client('otherkey')
+        api.orders.get_fee_info()
+        self.assertEqual(m.call_count, calls + 1)
+        api.close()
+
+    @requests_mock.Mocker()
+    def testRefreshAndInvalidate(self, m):
+        m.get('https://api.dummy.com/api/1/fee_info', json=FEES)
+        m.get('https://api.dummy.com/api/1/balance', json=BALANCE)
+        m.post('https://api.dummy.com/api/1/accounts', json={'id': '2'})
+        with open(self.path, 'w') as f:
+            json.dump({'key': 'mykey', 'entries': {'fee_info/XBTZAR': {
+                'name': 'fee_info', 'arg': 'XBTZAR', 'value': {},
+                'fetched_at': time() - 3500}}}, f)
+        api = self.client()
+        # The startup pass refreshed the entry that was close to its TTL
+        self.assertEqual(api.reference.stats['refreshes'], 1)
+        self.assertEqual(api.orders.get_fee_info(), FEES)
+        api.account.get_accounts()
+        api.account.create_account('XBT', 'Savings', 1, 2)
+        self.assertIsNone(api.reference.age('accounts'))
+        self.assertLess(api.reference.age('fee_info', 'XBTZAR'), 60)
+        api.close()
+
+    def testRefreshThreadSurvivesErrors(self):
+        api = self.client()
+        calls = []
+
+        def refresh_due():
+            calls.append(1)
+            if len(calls) == 1:
+                raise KeyError('fee_info')
+            return 0
+
+        api.reference.refresh_due = refresh_due
+        api.reference.start(interval=0.01)
+        deadline = time() + 5
+        while len(calls) < 2 and time() < deadline:
+            sleep(0.01)
+        api.reference.stop()
+        self.assertGreaterEqual(len(calls), 2)
+        self.assertEqual(api.reference.stats['errors'], 1)
+        api.close()
+
+    def testConcurrentSaves(self):
+        api = self.client()
+        errors = []
+
+        def save():
+            try:
+                for _ in range(50):
+                    api.reference.save()
+            except (IOError, OSError) as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=save) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(self.tmp), ['reference.json'])
+        api.close()
@@ -0,0 +1,92 @@
+import unittest
+
+from pyluno.api import Luno
+from pyluno.simulator import SimulatedExchange
+from pyluno.utils import LunoAPIError, LunoAPIRateLimitError
+
+OPTIONS = {'maxRate': None, 'maxBurst': None}
+
+
+class TestSimulatedExchange(unittest.TestCase):
+
+    def setUp(self):
+        self.sim = SimulatedExchange(
+            initial_balances={'XBT': '10', 'ZAR': '100000'},
+            taker_fee='0.01')
+        self.sim.seed_book('XBTZAR', mid=1000, step=10, levels=3,
+                           volume='1')
+        self.api = Luno('trader', 'secret', OPTIONS)
+        self.sim.install(self.api)
+
+    def tearDown(self):
+        self.api.close()
+
+    def testMarketData(self):
+        ticker = self.api.market.get_ticker()
+        self.assertEqual((ticker['bid'], ticker['ask']), ('990', '1010'))
+        book = self.api.market.get_order_book()
+        self.assertEqual([b['price'] for b in book['bids']],
+                         ['990', '980', '970'])
+        self.assertEqual(len(self.api.market.get_all_tickers()['tickers']),
+                         1)
+
+    def testLimitOrderMatchesWithPriceTimePriority(self):
+        result = self.api.orders.create_limit_order('buy', 1.5, 1020,
+                                                    None, None)
+        order = self.api.orders.get_order(result['order_id'])
+        self.assertEqual(order['state'], 'COMPLETE')
+        self.assertEqual(order['base'], '1.5')
+        self.assertEqual(order['counter'], '1520')
+        self.assertEqual(order['fee_base'], '0.015')
+        balances = dict((b['asset'], b)
+                        for b in self.api.account.get_balance()['balance'])
+        self.assertEqual(balances['XBT']['balance'], '11.485')
+        self.assertEqual(balances['ZAR']['balance'], '98480')
+        self.assertEqual(balances['ZAR']['reserved'], '0.00')
+        trades = self.api.market.get_trades()['trades']
+        self.assertEqual([t['price'] for t in trades], ['1020', '1010'])
+        self.assertTrue(trades[0]['is_buy'])
+        own = self.api.orders.list_trades()['trades']
+        self.assertEqual(len(own), 2)
+        rows = self.api.account.get_transactions(
+            balances['ZAR']['account_id'])['transactions']
+        self.assertEqual(rows[0]['balance'], 98480.0)
+
+    def testRestingOrderReservesAndStops(self):
+        result = self.api.orders.create_limit_order('sell', 2, 2000,
+                                                    None, None)
+        balances = self.api.account.get_balance()['balance']
+        xbt = [b for b in balances if b['asset'] == 'XBT'][0]
+        self.assertEqual(xbt['reserved'], '2')
+        self.api.orders.stop_order(result['order_id'])
+        orders = self.api.account.get_orders()['orders']
+        self.assertEqual(orders[0]['state'], 'COMPLETE')
+        self.assertRaises(LunoAPIError, self.api.orders.create_limit_order,
+                          'sell', 100, 2000, None, None)
+
+    def testMarketOrder(self):
+        self.api.orders.create_market_order('buy', 1520, None, None)
+        order = self.api.account.get_orders()['orders'][0]
+        self.assertEqual(order['base'], '1.5')
+
+    def testRateLimit(self):
+        self.sim.rate_limit = (0.001, 1)
+        self.api.market.get_ticker()
+        self.assertRaises(LunoAPIRateLimitError, self.api.market.get_ticker)
+
+    def testOverHTTP(self):
+        server = self.sim.serve(port=0)
+        try:
+            api = Luno('trader', 'secret', dict(
+                OPTIONS, scheme='http', hostname='127.0.0.1',
+                port=server.server_port))
+            self.assertEqual(api.market.get_ticker()['bid'], '990')
+            result = api.orders.create_limit_order('sell', 0.5, 990,
+                                                   None, None)
+            self.assertIn('order_id', result)
+            self.assertEqual(api.market.get_trades()['trades'][0]['price'],
+                             '990')
+            api.close()
+        finally:
+            server.shutdown()
+            server.server_close()
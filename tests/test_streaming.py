@@ -0,0 +1,66 @@
+import json
+import unittest
+
+import requests_mock
+
+from pyluno.api import Luno, LunoAPIError
+from pyluno.streaming import StreamError, iter_json_items
+
+
+def chunked(text, n):
+    data = text.encode('utf-8')
+    return [data[i:i + n] for i in range(0, len(data), n)]
+
+
+class TestIterJsonItems(unittest.TestCase):
+
+    def testSingleKeyAcrossChunkBoundaries(self):
+        body = json.dumps({'id': 'x', 'timestamp': 1366305398592,
+                           'trades': [{'price': '1.5', 'n': i}
+                                      for i in range(7)]})
+        for n in (1, 3, 64):
+            head = {}
+            items = list(iter_json_items(chunked(body, n), 'trades',
+                                         head=head))
+            self.assertEqual([t['n'] for t in items], list(range(7)))
+            self.assertEqual(head['timestamp'], 1366305398592)
+
+    def testChunksAndMultipleKeys(self):
+        body = json.dumps({'bids': [1, 2, 3], 'asks': [], 'other': [9]})
+        items = list(iter_json_items(chunked(body, 2), ('bids', 'asks'),
+                                     chunk_size=2))
+        self.assertEqual(items, [('bids', [1, 2]), ('bids', [3])])
+
+    def testErrorMember(self):
+        body = '{"error": "Invalid currency pair."}'
+        self.assertRaises(StreamError, list, iter_json_items([body], 'x'))
+
+
+class TestStreamingRequests(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hostname': 'api.dummy.com',
+                   'maxRate': None, 'maxBurst': None}
+        self.api = Luno('mykey', 'mysecret', options)
+
+    @requests_mock.Mocker()
+    def testIterTrades(self, m):
+        response = {'trades': [{'volume': '0.10', 'price': '1000.00',
+                                'timestamp': 1366052621774}] * 5}
+        m.get('https://api.dummy.com/api/1/trades', json=response)
+        chunks = list(self.api.market.iter_trades(chunk_size=2))
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+        m.get('https://api.dummy.com/api/1/orderbook',
+              json={'bids': [{'price': '1', 'volume': '2'}], 'asks': []})
+        self.assertEqual(list(self.api.market.iter_order_book()),
+                         [('bids', {'price': '1', 'volume': '2'})])
+
+    @requests_mock.Mocker()
+    def testStreamErrors(self, m):
+        url = 'https://api.dummy.com/api/1/accounts/1/transactions'
+        m.get(url, text='', status_code=401)
+        self.assertRaises(LunoAPIError, self.api.account.iter_transactions,
+                          '1')
+        m.get(url, json={'error': 'Bad', 'error_code': 'ErrBad'})
+        self.assertRaises(LunoAPIError, list,
+                          self.api.account.iter_transactions('1'))